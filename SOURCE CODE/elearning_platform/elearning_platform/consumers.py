@@ -1,6 +1,8 @@
 import json
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
+from webapp.models import CourseEnrollments
+from webapp.notifications import COURSE_MEMBER_STATUSES, USER_GROUP, COURSE_GROUP
 
 class MeetingConsumer(AsyncWebsocketConsumer):
     @database_sync_to_async
@@ -85,3 +87,52 @@ class MeetingConsumer(AsyncWebsocketConsumer):
         }))
         # close the connection (disconnect the client)
         await self.close()
+
+# pushes new notifications to a logged-in user's open pages (see webapp/notifications.py)
+# the connection joins the user's own group and the group of each course they are a member of
+# (courses joined later are picked up when the page is next loaded)
+class NotificationConsumer(AsyncWebsocketConsumer):
+    @database_sync_to_async
+    def get_groups(self, user):
+        if not hasattr(user, 'userinfo'):
+            return None
+
+        course_ids = CourseEnrollments.objects.filter(student=user, enrollment_status__in=COURSE_MEMBER_STATUSES) \
+                                              .values_list('course_id', flat=True)
+        return [USER_GROUP.format(user_id=user.id)] + [COURSE_GROUP.format(course_id=course_id) for course_id in course_ids]
+
+    async def connect(self):
+        user = self.scope["user"]
+
+        if not user.is_authenticated:
+            await self.close()
+            return
+
+        self.groups_joined = await self.get_groups(user)
+        if self.groups_joined is None:
+            await self.close()
+            return
+
+        # join the user's notification groups
+        for group in self.groups_joined:
+            await self.channel_layer.group_add(group, self.channel_name)
+
+        await self.accept()
+
+    async def disconnect(self, close_code):
+        for group in getattr(self, 'groups_joined', None) or []:
+            await self.channel_layer.group_discard(group, self.channel_name)
+
+    # receive a new notification from a group
+    async def notification_new(self, event):
+        # course-wide notifications are not shown to the user who caused them
+        if event.get('exclude_user') == self.scope["user"].id:
+            return
+
+        await self.send(text_data=json.dumps({
+            'type': 'notification',
+            'message': event['message'],
+            'notif_type': event['notif_type'],
+            'created_at': event['created_at'],
+        }))
+
@@ -53,15 +53,27 @@ REST_FRAMEWORK = {
 
 ASGI_APPLICATION = 'elearning_platform.asgi.application'
 
+# Redis server settings (localhost and default port)
+# shared by Channels, Celery and the maintenance job locks
+REDIS_URL = 'redis://localhost:6379/0'
+
 CHANNEL_LAYERS = {
     'default': {
         'BACKEND': 'channels_redis.core.RedisChannelLayer',
         'CONFIG': {
-            "hosts": [('127.0.0.1', 6379)],  # Redis server settings (localhost and default port)
+            "hosts": [REDIS_URL],
         },
     },
 }
 
+# Cache shared by all processes (e.g. the status checks and the student homepage cache)
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': REDIS_URL,
+    },
+}
+
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
@@ -89,6 +101,7 @@ TEMPLATES = [
                 "django.template.context_processors.request",
                 "django.contrib.auth.context_processors.auth",
                 "django.contrib.messages.context_processors.messages",
+                "webapp.context_processors.unread_notifications",
             ],
         },
     },
@@ -146,5 +159,122 @@ STATIC_ROOT = os.path.join(BASE_DIR, "staticfiles")
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
-CELERY_BROKER_URL = 'redis://localhost:6379/0'
-CELERY_RESULT_BACKEND = 'redis://localhost:6379/0'
+CELERY_BROKER_URL = REDIS_URL
+CELERY_RESULT_BACKEND = REDIS_URL
+
+# How often (in seconds) the status sweep runs
+# only one process in the cluster runs it per interval (see webapp/locks.py)
+STATUS_SWEEP_INTERVAL = 60
+
+# Notifications older than this many days are moved to the archive table, every NOTIFICATION_ARCHIVE_INTERVAL seconds
+# in batches of NOTIFICATION_ARCHIVE_BATCH_SIZE (see webapp/notifications.py)
+NOTIFICATION_RETENTION_DAYS = 180
+NOTIFICATION_ARCHIVE_INTERVAL = 86400
+NOTIFICATION_ARCHIVE_BATCH_SIZE = 1000
+
+# Email alerts are queued for the users who have them on, and each user is sent one email with their pending alerts
+# every EMAIL_DIGEST_INTERVAL seconds, EMAIL_DIGEST_BATCH_SIZE users at a time (see webapp/digests.py)
+# set to True to queue email alerts and emails (requires SENDGRID_API_KEY below)
+EMAIL_ALERTS_ENABLED = False
+EMAIL_DIGEST_INTERVAL = 900
+EMAIL_DIGEST_BATCH_SIZE = 500
+
+# Emails are written to an outbox table and sent every EMAIL_OUTBOX_INTERVAL seconds, at most
+# EMAIL_OUTBOX_BATCHES_PER_RUN batches of EMAIL_OUTBOX_BATCH_SIZE per run (see webapp/outbox.py)
+# each batch is leased by its dispatcher for EMAIL_OUTBOX_LEASE seconds, renewed before each request once half of it has passed
+# (so half the lease must be longer than one request can take with its retries, see EMAIL_MAX_RETRY_WAIT below)
+# emails that fail are retried after EMAIL_OUTBOX_RETRY_DELAY seconds (doubled each time), up to EMAIL_OUTBOX_MAX_ATTEMPTS times
+EMAIL_OUTBOX_INTERVAL = 10
+EMAIL_OUTBOX_BATCH_SIZE = 500
+EMAIL_OUTBOX_BATCHES_PER_RUN = 10
+EMAIL_OUTBOX_LEASE = 300
+EMAIL_OUTBOX_RETRY_DELAY = 60
+EMAIL_OUTBOX_MAX_ATTEMPTS = 5
+
+# Email transport used to send emails (see webapp/mail.py)
+# SendGridTransport, LocMemTransport (kept in memory) or FileTransport (appended to EMAIL_FILE_PATH)
+EMAIL_TRANSPORT = "webapp.mail.SendGridTransport"
+SENDGRID_API_KEY = "SENDGRID_API_KEY_HERE"
+EMAIL_FROM_ADDRESS = "charu.sgp@gmail.com"
+EMAIL_FILE_PATH = os.path.join(BASE_DIR, "sent_emails.jsonl")
+EMAIL_RATE_LIMIT = 10 # requests per second, across all processes
+EMAIL_RATE_BURST = 20
+EMAIL_RATE_SHARED = True # share the rate limit between processes through Redis
+EMAIL_MAX_ATTEMPTS = 4 # attempts per request, waiting EMAIL_RETRY_BACKOFF seconds and then twice as long each time
+EMAIL_RETRY_BACKOFF = 1.0
+# longest wait between two attempts, even if the server asks for longer
+# a request takes at most EMAIL_MAX_ATTEMPTS * EMAIL_REQUEST_TIMEOUT + (EMAIL_MAX_ATTEMPTS - 1) * EMAIL_MAX_RETRY_WAIT
+# seconds (130s), plus the wait for the rate limit, which must stay under half of EMAIL_OUTBOX_LEASE
+EMAIL_MAX_RETRY_WAIT = 30
+EMAIL_BATCH_SIZE = 1000 # recipients per request (SendGrid's limit)
+EMAIL_POOL_SIZE = 4 # kept-alive connections per process
+EMAIL_REQUEST_TIMEOUT = 10
+
+# Periodic tasks (run with 'celery -A elearning_platform.celery:app beat')
+CELERY_BEAT_SCHEDULE = {
+    'sweep-statuses': {
+        'task': 'webapp.tasks.sweep_statuses_task',
+        'schedule': float(STATUS_SWEEP_INTERVAL),
+    },
+    'archive-notifications': {
+        'task': 'webapp.tasks.archive_notifications_task',
+        'schedule': float(NOTIFICATION_ARCHIVE_INTERVAL),
+    },
+    'send-email-digests': {
+        'task': 'webapp.tasks.send_email_digests_task',
+        'schedule': float(EMAIL_DIGEST_INTERVAL),
+    },
+    'dispatch-email-outbox': {
+        'task': 'webapp.tasks.dispatch_email_outbox_task',
+        'schedule': float(EMAIL_OUTBOX_INTERVAL),
+    },
+}
+
+# Assignment and meeting statuses are updated by the scheduled sweeper above
+# set to True to also run the sweep on every request (e.g. when Celery beat is not running)
+# a process that finds the sweep's lease taken waits STATUS_SWEEP_RETRY_DELAY seconds before trying again
+STATUS_SWEEP_ON_REQUEST = False
+STATUS_SWEEP_RETRY_DELAY = 5
+
+# How long (in seconds) a student's homepage is cached for at most
+# it is also expired at the next deadline shown on it (see webapp/dashboard.py)
+HOMEPAGE_CACHE_TIMEOUT = 300
+
+# Number of upcoming assignments shown on the student homepage (read from the deadline index, see webapp/deadlines.py)
+UPCOMING_DEADLINES_LIMIT = 20
+
+# Number of rows per page on paginated list pages (e.g. the course catalog), see webapp/pagination.py
+PAGE_SIZE = 24
+
+# How long (in seconds) the total number of results shown on paginated pages is cached
+COUNT_CACHE_TIMEOUT = 60
+
+# Number of suggestions returned by the people search autocomplete
+AUTOCOMPLETE_LIMIT = 10
+
+# How long (in seconds) a course's outline (lessons, materials and assignments) is cached for at most
+# it is also invalidated whenever the course's content is changed (see webapp/outline.py)
+COURSE_OUTLINE_CACHE_TIMEOUT = 86400
+
+# Number of posts shown at a time in a course's feedback forum (older posts are loaded on demand)
+FORUM_PAGE_SIZE = 20
+
+# Courses with more students than this store one course event per forum post or new material,
+# which students read from their courses, instead of one notification per student (see webapp/notifications.py)
+COURSE_EVENT_FANOUT_THRESHOLD = 500
+
+# How long (in seconds) each user's unread notification counts are cached for at most (see webapp/notifications.py)
+UNREAD_COUNT_TIMEOUT = 86400
+
+# Number of notifications shown per page on each tab of the notification pages
+NOTIFICATION_PAGE_SIZE = 20
+
+# Submission rows of a new assignment are created in batches of SUBMISSION_BATCH_SIZE,
+# by a background task for courses with more than SUBMISSION_TASK_THRESHOLD students (see webapp/submissions.py)
+# the task's progress is kept in the cache for SUBMISSION_PROGRESS_TIMEOUT seconds
+SUBMISSION_BATCH_SIZE = 1000
+SUBMISSION_TASK_THRESHOLD = 500
+SUBMISSION_PROGRESS_TIMEOUT = 3600
+
+# Tests run without Redis or SendGrid, using an in-memory cache, channel layer and email transport (see elearning_platform/test_runner.py)
+TEST_RUNNER = "elearning_platform.test_runner.TestRunner"
@@ -0,0 +1,29 @@
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+# Test runner that replaces the services backed by Redis (and SendGrid) with in-memory ones for the whole run,
+# so the tests do not need a Redis server and never send real emails.
+# Code using the Redis client directly (see redis_client.py) is mocked by the tests that reach it.
+class TestRunner(DiscoverRunner):
+    test_settings = override_settings(
+        CACHES={
+            'default': {
+                'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            },
+        },
+        CHANNEL_LAYERS={
+            'default': {
+                'BACKEND': 'channels.layers.InMemoryChannelLayer',
+            },
+        },
+        EMAIL_TRANSPORT="webapp.mail.LocMemTransport",
+        EMAIL_RATE_SHARED=False,
+    )
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.test_settings.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.test_settings.disable()
+        super().teardown_test_environment(**kwargs)
@@ -6,6 +6,10 @@ admin.site.register(UserInfo)
 admin.site.register(CourseDetails)
 admin.site.register(CourseEnrollments)
 admin.site.register(Notification)
+admin.site.register(CourseEvent)
+admin.site.register(NotificationArchive)
+admin.site.register(EmailDigestEntry)
+admin.site.register(EmailOutbox)
 admin.site.register(AssignmentUpload)
 admin.site.register(AssignmentSubmission)
 admin.site.register(FeedbackForum)
@@ -3,3 +3,7 @@ from django.apps import AppConfig
 class WebappConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "webapp"
+
+    # connects the signal handlers (see signals.py)
+    def ready(self):
+        from . import signals
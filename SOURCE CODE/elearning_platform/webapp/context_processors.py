@@ -0,0 +1,11 @@
+from .notifications import get_unread_counts
+
+# adds the logged-in user's unread notification counts to every template (for the header badges)
+# the counts are cached (see notifications.py), so this does not count the notifications on every page
+def unread_notifications(request):
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated or not hasattr(user, 'userinfo'):
+        return {}
+
+    counts = get_unread_counts(user)
+    return {"unread_counts": counts, "unread_total": sum(counts.values())}
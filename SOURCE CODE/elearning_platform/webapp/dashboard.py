@@ -0,0 +1,89 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from redis.exceptions import RedisError
+from .models import CourseEnrollments
+import logging, time
+
+logger = logging.getLogger(__name__)
+
+# Per-student cache of the student homepage context.
+# Entries are never deleted: each key includes the student's version, and bumping it makes the old entries
+# unreachable (they then expire on their own).
+# The versions are bumped by the signals in signals.py and by the views that change rows with .update().
+# Changes to a course (e.g. a new assignment) bump the versions of the course's students only.
+
+HOMEPAGE_KEY = "homepage:{user_id}:{user_version}"
+USER_VERSION_KEY = "homepage:version:{user_id}"
+
+# starting value for a version key that is missing (e.g. evicted)
+# based on the current time, so it is always higher than any version used before
+def new_version():
+    return time.time_ns() // 1000
+
+# get the current value of a version key, creating it if it is missing
+def get_version(key):
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, new_version(), timeout=None)
+        version = cache.get(key)
+    return version
+
+# bump a version key, so that cache entries keyed by the old version are no longer read
+def bump_version(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, new_version(), timeout=None)
+
+# get the cache key of a student's homepage and its cached context (None if not cached)
+# the key should be passed to cache_homepage, so that a context built while the student's data
+# was changing is stored under the old (already invalidated) version
+def get_cached_homepage(user_id):
+    try:
+        key = HOMEPAGE_KEY.format(user_id=user_id, user_version=get_version(USER_VERSION_KEY.format(user_id=user_id)))
+        return key, cache.get(key)
+    except RedisError as e:
+        logger.warning("Could not read the homepage cache: %s", e)
+        return None, None
+
+# cache a student's homepage context until HOMEPAGE_CACHE_TIMEOUT
+# or the given expiry time (e.g. the next deadline shown on the page), whichever is sooner
+def cache_homepage(key, context, expires=None):
+    if key is None:
+        return
+
+    timeout = settings.HOMEPAGE_CACHE_TIMEOUT
+    if expires is not None:
+        timeout = min(timeout, (expires - timezone.now()).total_seconds())
+    if timeout <= 0:
+        return
+
+    try:
+        cache.set(key, context, timeout)
+    except RedisError as e:
+        logger.warning("Could not write the homepage cache: %s", e)
+
+# invalidate the cached homepage of the given students
+# the versions are replaced rather than incremented, so any number of students are invalidated in one call to the cache
+def invalidate_homepage(*user_ids):
+    if not user_ids:
+        return
+
+    version = new_version()
+    try:
+        cache.set_many({USER_VERSION_KEY.format(user_id=user_id): version for user_id in user_ids}, timeout=None)
+    except RedisError as e:
+        logger.warning("Could not invalidate the homepage cache: %s", e)
+
+# invalidate the cached homepage of every student of a course, batch_size students at a time
+def invalidate_course_homepages(course_id, batch_size=1000):
+    student_ids = (CourseEnrollments.objects.filter(course_id=course_id)
+                   .values_list('student_id', flat=True).distinct().order_by('student_id'))
+    last_id = 0
+    while True:
+        batch = list(student_ids.filter(student_id__gt=last_id)[:batch_size])
+        if not batch:
+            return
+        invalidate_homepage(*batch)
+        last_id = batch[-1]
@@ -0,0 +1,216 @@
+from collections import defaultdict
+from datetime import timedelta
+from django.db.models import F
+from django.utils import timezone
+from redis.exceptions import RedisError
+from .models import AssignmentUpload, AssignmentSubmission, CourseEnrollments
+from .redis_client import get_redis
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Upcoming-deadline index, stored in Redis.
+# Each student has a sorted set of the assignments shown in the 'Assignments Due' table of their homepage
+# (assignments of courses they are enrolled in whose deadline has not passed), scored by the deadline's timestamp.
+# The views update it as assignments are added and students enroll or leave a course,
+# and rebuild_deadline_index recomputes it from the database.
+#
+# entries whose deadline has passed are trimmed when the index is read;
+# entries of deleted assignments are skipped (and removed) by the homepage
+#
+# a student's index is built from the database the first time it is read, which also adds its 'built' marker:
+# a BUILT_MEMBER entry scored +inf, kept even if they have no upcoming deadlines (so the index is not rebuilt
+# on every read), and stored in the same key as the entries, so an evicted index loses its marker with them
+# the views only add entries to indexes that have been built: adding a course's deadlines to an index
+# that was never built would make it look complete, hiding the deadlines of the student's other courses
+#
+# assignments added while an index is rebuilt are missed by both the rebuild (which read the database before)
+# and index_assignment (which found no marker), so the rebuild adds the ones created since shortly before it started
+
+DEADLINES_KEY = "deadlines:{student_id}"
+BUILT_MEMBER = "built"
+
+# how long before a rebuild an assignment may have been created and still not be indexed
+# (it is created in a transaction, and indexed once that transaction commits)
+REBUILD_OVERLAP = timedelta(minutes=5)
+
+# adds entries (score, member, score, member, ...) to a student's index, only if it has been built
+ZADD_IF_BUILT_SCRIPT = """
+if redis.call('exists', KEYS[1]) == 1 then
+    return redis.call('zadd', KEYS[1], unpack(ARGV))
+end
+return 0
+"""
+
+def _key(student_id):
+    return DEADLINES_KEY.format(student_id=student_id)
+
+# queue adding entries ({assign_id: score}) to a student's index on a pipeline, if the index has been built
+def _zadd_if_built(pipe, student_id, mapping):
+    args = [value for assign_id, score in mapping.items() for value in (score, assign_id)]
+    pipe.eval(ZADD_IF_BUILT_SCRIPT, 1, _key(student_id), *args)
+
+# ids of the students that have an index in Redis
+def _indexed_students(client):
+    return {int(key.decode().split(":")[1]) for key in client.scan_iter(DEADLINES_KEY.format(student_id="*"))}
+
+# submissions that belong in the index: deadline not passed, in a course the student is enrolled in
+def _indexed_submissions(now=None):
+    return AssignmentSubmission.objects.open(now).filter(
+        assignment__lesson__course__enrollments__student=F('student'),
+        assignment__lesson__course__enrollments__enrollment_status="enrolled",
+    )
+
+# get each student's expected index entries from the database, as {student_id: {assign_id: score}}
+def _expected_entries(student_ids=None, now=None):
+    submissions = _indexed_submissions(now)
+    if student_ids is not None:
+        submissions = submissions.filter(student_id__in=student_ids)
+
+    entries = defaultdict(dict)
+    for student_id, assign_id, deadline in submissions.values_list('student', 'assignment', 'assignment__deadline') \
+                                                      .iterator():
+        entries[student_id][str(assign_id)] = deadline.timestamp()
+    return entries
+
+# add a new assignment to the index of every student enrolled in its course
+def index_assignment(assignment):
+    if assignment.deadline <= timezone.now():
+        return
+
+    student_ids = CourseEnrollments.objects.filter(course_id=assignment.lesson.course_id, enrollment_status="enrolled") \
+                                           .values_list('student', flat=True)
+    try:
+        pipe = get_redis().pipeline(transaction=False)
+        for student_id in student_ids.iterator():
+            _zadd_if_built(pipe, student_id, {str(assignment.assign_id): assignment.deadline.timestamp()})
+        pipe.execute()
+    except RedisError as e:
+        logger.warning("Could not index assignment %s: %s", assignment.assign_id, e)
+
+# add the upcoming assignments of a course to a student's index (e.g. when they enroll)
+def index_course_deadlines(student_id, course_id):
+    deadlines = AssignmentUpload.objects.filter(lesson__course_id=course_id, deadline__gt=timezone.now()) \
+                                        .values_list('assign_id', 'deadline')
+    mapping = {str(assign_id): deadline.timestamp() for assign_id, deadline in deadlines}
+    if not mapping:
+        return
+
+    try:
+        pipe = get_redis().pipeline(transaction=False)
+        _zadd_if_built(pipe, student_id, mapping)
+        pipe.execute()
+    except RedisError as e:
+        logger.warning("Could not index the deadlines of course %s: %s", course_id, e)
+
+# remove the assignments of a course from a student's index (e.g. when they leave the course)
+def unindex_course_deadlines(student_id, course_id):
+    assign_ids = [str(assign_id) for assign_id in
+                  AssignmentUpload.objects.filter(lesson__course_id=course_id).values_list('assign_id', flat=True)]
+    if not assign_ids:
+        return
+
+    try:
+        get_redis().zrem(_key(student_id), *assign_ids)
+    except RedisError as e:
+        logger.warning("Could not remove the deadlines of course %s: %s", course_id, e)
+
+# remove assignments from a student's index (e.g. ones that have been deleted)
+def unindex_assignments(student_id, assign_ids):
+    if not assign_ids:
+        return
+
+    try:
+        get_redis().zrem(_key(student_id), *[str(assign_id) for assign_id in assign_ids])
+    except RedisError as e:
+        logger.warning("Could not remove assignments from the deadline index: %s", e)
+
+# get the ids of a student's next assignments, in deadline order
+# returns None if Redis is unavailable, so callers can fall back to the database
+def get_upcoming_deadlines(student_id, limit, now=None):
+    now = (now or timezone.now()).timestamp()
+    key = _key(student_id)
+
+    try:
+        # builds the student's index if it has not been built (or has been evicted)
+        if not get_redis().exists(key):
+            rebuild_deadline_index([student_id])
+
+        pipe = get_redis().pipeline()
+        pipe.zremrangebyscore(key, "-inf", now)
+        pipe.zrangebyscore(key, f"({now}", "(+inf", start=0, num=limit) # without the marker
+        _, assign_ids = pipe.execute()
+    except RedisError as e:
+        logger.warning("Could not read the deadline index: %s", e)
+        return None
+
+    return [int(assign_id) for assign_id in assign_ids]
+
+# recompute the index of the given students (or of every student) from the database
+# returns the number of students whose index was written
+def rebuild_deadline_index(student_ids=None, now=None):
+    client = get_redis()
+    started = timezone.now()
+    entries = _expected_entries(student_ids, now)
+
+    # students who no longer have any entries are cleared as well
+    all_students = student_ids is None
+    if all_students:
+        student_ids = set(entries) | _indexed_students(client)
+
+    pipe = client.pipeline()
+    for student_id in student_ids:
+        pipe.delete(_key(student_id))
+        pipe.zadd(_key(student_id), {**entries.get(student_id, {}), BUILT_MEMBER: float("inf")})
+    pipe.execute()
+
+    # add the assignments that may have been created (and not indexed) while the database was read
+    recent = _recent_entries(started - REBUILD_OVERLAP, None if all_students else student_ids, now)
+    if recent:
+        pipe = client.pipeline(transaction=False)
+        for student_id, mapping in recent.items():
+            _zadd_if_built(pipe, student_id, mapping)
+        pipe.execute()
+
+    return len(student_ids)
+
+# get the entries of the upcoming assignments created since the given time, as {student_id: {assign_id: score}}
+# read like index_assignment does, from the enrollments (the submissions may still be being created)
+def _recent_entries(since, student_ids=None, now=None):
+    # the enrollment conditions are in one filter, so they apply to the same enrollment
+    enrollment = {"lesson__course__enrollments__enrollment_status": "enrolled"}
+    if student_ids is not None:
+        enrollment["lesson__course__enrollments__student_id__in"] = student_ids
+    assignments = AssignmentUpload.objects.filter(created_at__gte=since, deadline__gt=now or timezone.now(), **enrollment)
+
+    entries = defaultdict(dict)
+    for student_id, assign_id, deadline in assignments.values_list('lesson__course__enrollments__student', 'assign_id', 'deadline'):
+        entries[student_id][str(assign_id)] = deadline.timestamp()
+    return entries
+
+# compare the index with the database
+# returns {student_id: {"missing": [...], "unexpected": [...], "wrong_deadline": [...]}} for every inconsistent student
+# entries whose deadline has passed are ignored, as they are trimmed when the index is read
+def check_deadline_index(student_ids=None, now=None):
+    now = now or timezone.now()
+    client = get_redis()
+    entries = _expected_entries(student_ids, now)
+
+    if student_ids is None:
+        student_ids = set(entries) | _indexed_students(client)
+
+    problems = {}
+    for student_id in student_ids:
+        expected = entries.get(student_id, {})
+        actual = {assign_id.decode(): score for assign_id, score in
+                  client.zrangebyscore(_key(student_id), f"({now.timestamp()}", "(+inf", withscores=True)}
+
+        result = {
+            "missing": sorted(int(a) for a in expected.keys() - actual.keys()),
+            "unexpected": sorted(int(a) for a in actual.keys() - expected.keys()),
+            "wrong_deadline": sorted(int(a) for a in expected.keys() & actual.keys() if expected[a] != actual[a]),
+        }
+        if any(result.values()):
+            problems[student_id] = result
+
+    return problems
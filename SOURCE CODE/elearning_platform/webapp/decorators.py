@@ -42,6 +42,22 @@ def teacher_login(view_func):
     
     return _wrapped_view
 
+# decorator to ensure that only authenticated users (students or teachers) can access certain views
+def any_user_login(view_func):
+    def _wrapped_view(request, *args, **kwargs):
+        # check if the user is authenticated
+        if not request.user.is_authenticated:
+            return redirect('login')
+
+        # check if the user has the 'userinfo' attribute (custom user model check)
+        if not hasattr(request.user, 'userinfo'):
+            logout(request)
+            return redirect('login')
+
+        return view_func(request, *args, **kwargs)
+
+    return _wrapped_view
+
 # decorator to check login status and redirect accordingly
 def check_login(view_func):
     def _wrapped_view(request, *args, **kwargs):
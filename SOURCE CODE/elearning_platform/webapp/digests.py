@@ -0,0 +1,90 @@
+from django.conf import settings
+from django.core.exceptions import EmptyResultSet
+from django.db import connection, transaction
+from django.db.models import Value, CharField, DateTimeField
+from django.utils import timezone
+from django.utils.html import escape, format_html_join
+from itertools import groupby
+from .models import EmailDigestEntry, EmailOutbox, UserInfo
+
+# Email alerts, sent as one digest email per user.
+# Instead of sending an email per event (e.g. one per student for every forum post), the views and the
+# notification fan-outs queue the alert in the EmailDigestEntry table, for the users who have email alerts on.
+# A periodic task (send_email_digests_task, see tasks.py) then queues a single email listing them
+# for each user with pending alerts in the email outbox (see outbox.py), every EMAIL_DIGEST_INTERVAL seconds.
+# Time-sensitive emails (e.g. a meeting request being accepted) skip the digest and go straight to the outbox.
+#
+# Alerts are only queued when EMAIL_ALERTS_ENABLED is True.
+
+EMAIL_DIGEST_JOB = "send-email-digests" # name of the task's cluster-wide lease (see locks.py)
+
+# queue an email alert for each of the given users who have email alerts on, with one INSERT ... SELECT statement
+# user_ids can be a list or a queryset of user ids (e.g. the students of a course)
+# returns the number of alerts queued
+def queue_email_alerts(user_ids, subject, message):
+    if not settings.EMAIL_ALERTS_ENABLED:
+        return 0
+
+    # the rows are not created through the ORM, so created_at is set here rather than by auto_now_add
+    recipients = UserInfo.objects.filter(user_id__in=user_ids, email_alert=True).values_list(
+        'user_id',
+        Value(subject[:255], output_field=CharField()),
+        Value(message[:500], output_field=CharField()),
+        Value(timezone.now(), output_field=DateTimeField()),
+    )
+    try:
+        sql, params = recipients.query.sql_with_params()
+    except EmptyResultSet: # no user ids
+        return 0
+
+    with connection.cursor() as cursor:
+        cursor.execute(f"INSERT INTO {EmailDigestEntry._meta.db_table} (user_id, subject, message, created_at) {sql}", params)
+        return cursor.rowcount
+
+# queue an email alert for one user (if they have email alerts on)
+def queue_email_alert(user_id, subject, message):
+    return queue_email_alerts([user_id], subject, message)
+
+# subject and html content of the digest email of a user's pending alerts
+def build_digest(entries):
+    if len(entries) == 1:
+        return entries[0].subject, escape(entries[0].message)
+
+    return (f"You have {len(entries)} new notifications on Voyage",
+            "<ul>" + format_html_join("", "<li><b>{}</b>: {}</li>", ((e.subject, e.message) for e in entries)) + "</ul>")
+
+# write a digest email for every user with pending alerts to the email outbox (see outbox.py), which sends them
+# users are handled in batches of EMAIL_DIGEST_BATCH_SIZE, each batch's emails being queued in the same transaction
+# as its alerts are deleted
+# alerts of users who have turned email alerts off since they were queued are deleted without being sent
+# returns the number of emails queued
+def queue_email_digests(batch_size=None):
+    batch_size = batch_size or settings.EMAIL_DIGEST_BATCH_SIZE
+
+    # alerts queued while the digests are being built are left for the next run
+    last_entry = EmailDigestEntry.objects.order_by('-entry_id').values_list('entry_id', flat=True).first()
+    if last_entry is None:
+        return 0
+
+    pending = EmailDigestEntry.objects.filter(entry_id__lte=last_entry)
+    user_ids = list(pending.order_by('user_id').values_list('user_id', flat=True).distinct())
+
+    queued = 0
+    for start in range(0, len(user_ids), batch_size):
+        batch = pending.filter(user_id__in=user_ids[start:start + batch_size])
+        entries = batch.select_related('user__userinfo').order_by('user_id', 'entry_id')
+
+        emails = []
+        for _, user_entries in groupby(entries, key=lambda entry: entry.user_id):
+            user_entries = list(user_entries)
+            user_info = user_entries[0].user.userinfo
+            if user_info.email_alert:
+                subject, html_content = build_digest(user_entries)
+                emails.append(EmailOutbox(to_email=user_info.email, subject=subject, html_content=html_content))
+
+        with transaction.atomic():
+            EmailOutbox.objects.bulk_create(emails)
+            batch.delete()
+        queued += len(emails)
+
+    return queued
@@ -0,0 +1,107 @@
+from contextlib import contextmanager
+from django.utils import timezone
+from redis.exceptions import RedisError
+from .redis_client import get_redis
+import logging, time, uuid
+
+logger = logging.getLogger(__name__)
+
+LOCK_KEY = "maintenance:lock:{job}"
+METRICS_KEY = "maintenance:metrics:{job}"
+JOBS_KEY = "maintenance:jobs"
+
+# deletes the lock only if it is still held by the given token
+RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+# cluster-wide lease for maintenance jobs (e.g. the status sweep), stored in Redis
+# only one process across all workers and nodes gets the lease per interval; the others skip the run
+#
+# the lease is taken with SET NX PX and is not released when the job finishes, so it lasts for the
+# rest of the interval (slightly less, so that the next scheduled run is not skipped)
+# it is released early if the job fails, so that another process can retry
+#
+# if Redis is unavailable the job runs anyway, as the maintenance jobs are safe to run concurrently
+#
+# usage:
+#     with maintenance_lease("sweep-statuses", 60) as acquired:
+#         if acquired:
+#             ...
+@contextmanager
+def maintenance_lease(job, interval):
+    client = get_redis()
+    key = LOCK_KEY.format(job=job)
+    token = uuid.uuid4().hex
+
+    try:
+        acquired = client.set(key, token, nx=True, px=int(interval * 900))
+    except RedisError as e:
+        logger.warning("Could not take the lease for %s, running without it: %s", job, e)
+        yield True
+        return
+
+    if not acquired:
+        _record_skip(job)
+        yield False
+        return
+
+    started = time.monotonic()
+    try:
+        yield True
+    except Exception:
+        _release(key, token)
+        raise
+    finally:
+        held = time.monotonic() - started
+        _record_hold(job, held)
+
+        if held > interval:
+            logger.warning("%s held its lease for %.1fs, longer than its %ss interval", job, held, interval)
+
+# get the metrics recorded for a job
+# runs, skipped, hold_seconds_total, hold_seconds_max, last_hold_seconds and last_run_at
+def get_lease_metrics(job):
+    metrics = get_redis().hgetall(METRICS_KEY.format(job=job))
+    return {k.decode(): float(v) for k, v in metrics.items()}
+
+# get the names of all jobs that have recorded metrics
+def get_lease_jobs():
+    return sorted(job.decode() for job in get_redis().smembers(JOBS_KEY))
+
+def _release(key, token):
+    try:
+        get_redis().eval(RELEASE_SCRIPT, 1, key, token)
+    except RedisError as e:
+        logger.warning("Could not release lease %s: %s", key, e)
+
+def _record_skip(job):
+    logger.info("Skipped %s, another process holds the lease", job)
+    try:
+        pipe = get_redis().pipeline()
+        pipe.sadd(JOBS_KEY, job)
+        pipe.hincrby(METRICS_KEY.format(job=job), "skipped", 1)
+        pipe.execute()
+    except RedisError as e:
+        logger.warning("Could not record metrics for %s: %s", job, e)
+
+def _record_hold(job, held):
+    key = METRICS_KEY.format(job=job)
+    try:
+        client = get_redis()
+        # only the lease holder writes these fields, so reading the current maximum first is safe
+        current_max = float(client.hget(key, "hold_seconds_max") or 0)
+
+        pipe = client.pipeline()
+        pipe.sadd(JOBS_KEY, job)
+        pipe.hincrby(key, "runs", 1)
+        pipe.hincrbyfloat(key, "hold_seconds_total", held)
+        pipe.hset(key, mapping={"last_hold_seconds": held, "last_run_at": timezone.now().timestamp()})
+        if held > current_max:
+            pipe.hset(key, "hold_seconds_max", held)
+        pipe.execute()
+    except RedisError as e:
+        logger.warning("Could not record metrics for %s: %s", job, e)
@@ -0,0 +1,250 @@
+from abc import ABC, abstractmethod
+from django.conf import settings
+from django.utils.module_loading import import_string
+from itertools import groupby
+from redis.exceptions import RedisError
+from requests.adapters import HTTPAdapter
+from .redis_client import get_redis
+import json, logging, requests, threading, time
+
+logger = logging.getLogger(__name__)
+
+# Email transports, used by the email outbox's dispatcher to send the app's emails (see outbox.py).
+# Views never send emails themselves: they write them to the outbox, in the transaction of the change they are about.
+# settings.EMAIL_TRANSPORT is the transport class used, shared by every email sent from a process:
+#   - SendGridTransport sends them with SendGrid's API, over a pool of kept-alive HTTP connections
+#   - LocMemTransport keeps them in memory (for tests and load tests)
+#   - FileTransport appends them to a file, one JSON object per line
+#
+# Emails with the same subject and content are sent together, up to EMAIL_BATCH_SIZE recipients per request.
+# Requests are rate-limited to EMAIL_RATE_LIMIT per second (with bursts of up to EMAIL_RATE_BURST) by a token bucket
+# shared by every process through Redis, and failed requests that may succeed later (e.g. rate limited or server errors)
+# are retried up to EMAIL_MAX_ATTEMPTS times, waiting EMAIL_RETRY_BACKOFF seconds and then twice as long after each
+# attempt (or as long as the server asks), but never more than EMAIL_MAX_RETRY_WAIT seconds.
+#
+# A request refused with a permanent error (e.g. an invalid address) is sent again one recipient at a time,
+# so that only the recipients it is about fail.
+#
+# usage:
+#     get_transport().send_many([(email, subject, html_content), ...], on_sent=..., on_failed=...)
+
+# error raised when emails could not be sent
+class EmailDeliveryError(Exception):
+    pass
+
+# error raised by a transport when sending may succeed if retried
+class TransientEmailError(EmailDeliveryError):
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after # seconds to wait before retrying, if the server said so
+
+# token bucket rate limiter (thread-safe)
+# holds up to capacity tokens, refilled at rate tokens per second; acquire() waits until a token is available
+class TokenBucket:
+    def __init__(self, rate, capacity, clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.clock = clock
+        self.sleep = sleep
+        self.updated = clock()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = self.clock()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            self.sleep(wait)
+
+# takes a token from a token bucket stored in a Redis hash, using Redis' clock
+# returns 0 if a token was taken, or the number of seconds to wait for one
+TAKE_TOKEN_SCRIPT = """
+local rate, capacity = tonumber(ARGV[1]), tonumber(ARGV[2])
+local time = redis.call('time')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local bucket = redis.call('hmget', KEYS[1], 'tokens', 'updated')
+local tokens = math.min(capacity, (tonumber(bucket[1]) or capacity) + math.max(0, now - (tonumber(bucket[2]) or now)) * rate)
+
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = (1 - tokens) / rate
+end
+redis.call('hset', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+redis.call('expire', KEYS[1], math.ceil(capacity / rate) + 1)
+return tostring(wait)
+"""
+
+# token bucket shared by every process (e.g. all the outbox dispatchers), stored in Redis,
+# so that together they stay under the provider's rate limit
+# if Redis is unavailable, each process falls back to its own bucket
+class SharedTokenBucket(TokenBucket):
+    KEY = "email:rate"
+
+    def acquire(self):
+        while True:
+            try:
+                wait = float(get_redis().eval(TAKE_TOKEN_SCRIPT, 1, self.KEY, self.rate, self.capacity))
+            except RedisError as e:
+                logger.warning("Could not use the shared email rate limit, using this process' own: %s", e)
+                return super().acquire()
+
+            if wait <= 0:
+                return
+            self.sleep(wait)
+
+# base class of the transports, which implement deliver(recipients, subject, html_content)
+class BaseTransport(ABC):
+    def __init__(self, rate=None, burst=None, max_attempts=None, backoff=None, batch_size=None, shared_rate=None,
+                 sleep=time.sleep):
+        shared_rate = settings.EMAIL_RATE_SHARED if shared_rate is None else shared_rate
+        self.bucket = (SharedTokenBucket if shared_rate else TokenBucket)(rate or settings.EMAIL_RATE_LIMIT,
+                                                                          burst or settings.EMAIL_RATE_BURST, sleep=sleep)
+        self.max_attempts = max_attempts or settings.EMAIL_MAX_ATTEMPTS
+        self.backoff = settings.EMAIL_RETRY_BACKOFF if backoff is None else backoff
+        self.max_wait = settings.EMAIL_MAX_RETRY_WAIT
+        self.batch_size = batch_size or settings.EMAIL_BATCH_SIZE
+        self.sleep = sleep
+
+    # send one email
+    def send(self, email, subject, html_content):
+        self.send_many([(email, subject, html_content)])
+
+    # send a list of (email, subject, html_content) emails, with one request per batch of identical emails
+    # if given, on_sent(recipients, subject, html_content) is called as soon as each request succeeds, and
+    # on_failed(recipients, subject, html_content, error) for each request that failed (otherwise the error is raised)
+    # before_request(recipients, subject, html_content) is called before each request, and returns the recipients
+    # it should still be sent to
+    # returns the number of requests made (not counting retries)
+    def send_many(self, messages, on_sent=None, on_failed=None, before_request=None):
+        requests_made = 0
+        messages = sorted(messages, key=lambda message: (message[1], message[2]))
+
+        for (subject, html_content), group in groupby(messages, key=lambda message: (message[1], message[2])):
+            recipients = list(dict.fromkeys(email for email, _, _ in group)) # without duplicates
+            for start in range(0, len(recipients), self.batch_size):
+                requests_made += self._send_batch(recipients[start:start + self.batch_size], subject, html_content,
+                                                  on_sent, on_failed, before_request)
+
+        return requests_made
+
+    # send one batch of recipients, returning the number of requests made
+    # a batch refused with a permanent error (e.g. an invalid address) is sent again one recipient at a time,
+    # so only the recipients it is about fail
+    def _send_batch(self, recipients, subject, html_content, on_sent, on_failed, before_request):
+        if before_request is not None:
+            recipients = before_request(recipients, subject, html_content)
+            if not recipients:
+                return 0
+
+        try:
+            self._deliver_with_retries(recipients, subject, html_content)
+        except EmailDeliveryError as e:
+            if len(recipients) > 1 and not isinstance(e, TransientEmailError):
+                logger.warning("Could not send '%s' to %s recipients, sending them one at a time: %s", subject, len(recipients), e)
+                return 1 + sum(self._send_batch([email], subject, html_content, on_sent, on_failed, before_request)
+                               for email in recipients)
+            if on_failed is None:
+                raise
+            on_failed(recipients, subject, html_content, e)
+            return 1
+
+        if on_sent is not None:
+            on_sent(recipients, subject, html_content)
+        return 1
+
+    def _deliver_with_retries(self, recipients, subject, html_content):
+        for attempt in range(1, self.max_attempts + 1):
+            self.bucket.acquire()
+            try:
+                return self.deliver(recipients, subject, html_content)
+            except TransientEmailError as e:
+                if attempt == self.max_attempts:
+                    raise
+                # capped, so a request cannot take longer than the outbox's lease allows (see settings)
+                wait = min(e.retry_after if e.retry_after is not None else self.backoff * 2 ** (attempt - 1), self.max_wait)
+                logger.warning("Could not send '%s' to %s recipients (attempt %s), retrying in %ss: %s",
+                               subject, len(recipients), attempt, wait, e)
+                self.sleep(wait)
+
+    # send one request to the given recipients, raising EmailDeliveryError (or TransientEmailError) if it fails
+    @abstractmethod
+    def deliver(self, recipients, subject, html_content):
+        pass
+
+# transport sending emails with SendGrid's v3 mail API
+# each recipient gets their own personalization, so they do not see each other's addresses
+class SendGridTransport(BaseTransport):
+    API_URL = "https://api.sendgrid.com/v3/mail/send"
+
+    def __init__(self, api_key=None, from_email=None, **kwargs):
+        super().__init__(**kwargs)
+        self.from_email = from_email or settings.EMAIL_FROM_ADDRESS
+        self.timeout = settings.EMAIL_REQUEST_TIMEOUT
+
+        # one session per transport, so connections are kept alive and reused between requests
+        self.session = requests.Session()
+        self.session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=settings.EMAIL_POOL_SIZE))
+        self.session.headers.update({"Authorization": f"Bearer {api_key or settings.SENDGRID_API_KEY}"})
+
+    def deliver(self, recipients, subject, html_content):
+        body = {
+            "personalizations": [{"to": [{"email": email}]} for email in recipients],
+            "from": {"email": self.from_email},
+            "subject": subject,
+            "content": [{"type": "text/html", "value": html_content}],
+        }
+
+        try:
+            response = self.session.post(self.API_URL, json=body, timeout=self.timeout)
+        except requests.RequestException as e:
+            raise TransientEmailError(f"SendGrid request failed: {e}")
+
+        if response.status_code == 429 or response.status_code >= 500:
+            retry_after = response.headers.get("Retry-After")
+            raise TransientEmailError(f"SendGrid returned {response.status_code}",
+                                      float(retry_after) if retry_after and retry_after.isdigit() else None)
+        if response.status_code >= 400:
+            raise EmailDeliveryError(f"SendGrid returned {response.status_code}: {response.text}")
+
+# transport keeping the emails it sends in memory, as dicts with "to", "subject" and "html_content"
+# each request is one entry of 'requests', and every email is also added to 'outbox'
+class LocMemTransport(BaseTransport):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.requests = []
+        self.outbox = []
+
+    def deliver(self, recipients, subject, html_content):
+        self.requests.append(recipients)
+        self.outbox.extend({"to": email, "subject": subject, "html_content": html_content} for email in recipients)
+
+# transport appending the emails it sends to EMAIL_FILE_PATH, one JSON object per line
+class FileTransport(BaseTransport):
+    def __init__(self, path=None, **kwargs):
+        super().__init__(**kwargs)
+        self.path = path or settings.EMAIL_FILE_PATH
+        self.lock = threading.Lock()
+
+    def deliver(self, recipients, subject, html_content):
+        lines = "".join(json.dumps({"to": email, "subject": subject, "html_content": html_content}) + "\n"
+                        for email in recipients)
+        with self.lock, open(self.path, "a") as file:
+            file.write(lines)
+
+_transport = None
+
+# shared transport of the process, of the class set in settings.EMAIL_TRANSPORT
+def get_transport():
+    global _transport
+    if _transport is None:
+        _transport = import_string(settings.EMAIL_TRANSPORT)()
+    return _transport
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+from webapp.deadlines import check_deadline_index, rebuild_deadline_index
+
+# management command to compare each student's upcoming-deadline index in Redis with the database
+class Command(BaseCommand):
+    help = "Reports students whose upcoming-deadline index does not match their assignment submissions."
+
+    def add_arguments(self, parser):
+        parser.add_argument('student_ids', nargs='*', type=int, help="Only check these students (defaults to all students).")
+        parser.add_argument('--fix', action='store_true', help="Rebuild the index of the inconsistent students.")
+
+    def handle(self, *args, **options):
+        problems = check_deadline_index(options['student_ids'] or None)
+
+        for student_id, result in sorted(problems.items()):
+            self.stdout.write(f"student {student_id}: missing={result['missing']} "
+                              f"unexpected={result['unexpected']} wrong_deadline={result['wrong_deadline']}")
+
+        if not problems:
+            self.stdout.write("The deadline index is consistent.")
+        elif options['fix']:
+            rebuild_deadline_index(list(problems))
+            self.stdout.write(f"Rebuilt the deadline index of {len(problems)} students.")
+        else:
+            raise CommandError(f"{len(problems)} students have an inconsistent deadline index.")
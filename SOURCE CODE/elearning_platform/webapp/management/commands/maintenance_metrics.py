@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from webapp.locks import get_lease_jobs, get_lease_metrics
+
+# management command to show the lease metrics of the maintenance jobs (e.g. the status sweep)
+class Command(BaseCommand):
+    help = "Shows how often each maintenance job ran or was skipped, and how long it held its lease."
+
+    def handle(self, *args, **options):
+        for job in get_lease_jobs():
+            metrics = get_lease_metrics(job)
+            runs = int(metrics.get("runs", 0))
+            average = metrics.get("hold_seconds_total", 0) / runs if runs else 0
+
+            self.stdout.write(f"{job}: runs={runs} skipped={int(metrics.get('skipped', 0))} "
+                              f"avg_hold={average:.3f}s max_hold={metrics.get('hold_seconds_max', 0):.3f}s "
+                              f"last_hold={metrics.get('last_hold_seconds', 0):.3f}s")
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from webapp.progress import rebuild_course_progress
+
+# management command to recompute the stored course progress of every student
+# used to backfill the progress table or to repair it after changes made outside the views
+class Command(BaseCommand):
+    help = "Recomputes each student's course progress from their assignment submissions."
+
+    def add_arguments(self, parser):
+        parser.add_argument('course_ids', nargs='*', type=int, help="Only rebuild these courses (defaults to all courses).")
+
+    def handle(self, *args, **options):
+        course_ids = options['course_ids'] or None
+        count = rebuild_course_progress(course_ids)
+        self.stdout.write(f"Rebuilt {count} course progress rows.")
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from webapp.deadlines import rebuild_deadline_index
+
+# management command to recompute every student's upcoming-deadline index in Redis from the database
+# used to backfill the index or to repair it after changes made outside the views (e.g. deadlines edited in the admin)
+class Command(BaseCommand):
+    help = "Rebuilds each student's upcoming-deadline index in Redis from their assignment submissions."
+
+    def add_arguments(self, parser):
+        parser.add_argument('student_ids', nargs='*', type=int, help="Only rebuild these students (defaults to all students).")
+
+    def handle(self, *args, **options):
+        count = rebuild_deadline_index(options['student_ids'] or None)
+        self.stdout.write(f"Rebuilt the deadline index of {count} students.")
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from webapp.search import rebuild_search_index, search_index_available, rebuild_name_index
+
+# management command to rebuild the course catalog's full-text search index and the people search's name index
+# used to repair the index after changes made outside the app (e.g. raw SQL or data imports)
+class Command(BaseCommand):
+    help = "Rebuilds the full-text search index of the course catalog and the name index of the people search."
+
+    def handle(self, *args, **options):
+        if search_index_available():
+            count = rebuild_search_index()
+            self.stdout.write(f"Indexed {count} courses.")
+        else:
+            self.stdout.write("This database has no course search index; the catalog search uses icontains filters.")
+
+        count = rebuild_name_index()
+        self.stdout.write(f"Indexed the names of {count} users.")
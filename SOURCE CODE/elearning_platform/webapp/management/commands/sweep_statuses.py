@@ -0,0 +1,20 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from webapp.locks import maintenance_lease
+from webapp.status import STATUS_SWEEP_JOB, sweep_statuses
+
+# management command to update assignment and meeting statuses
+# can be run on a schedule (e.g. cron) as an alternative to Celery beat
+class Command(BaseCommand):
+    help = "Marks overdue assignments and opens/expires meetings based on the current time."
+
+    def handle(self, *args, **options):
+        # skip if another process has already run the sweep in this interval
+        with maintenance_lease(STATUS_SWEEP_JOB, settings.STATUS_SWEEP_INTERVAL) as acquired:
+            if not acquired:
+                self.stdout.write("Skipped: the sweep has already run in this interval.")
+                return
+
+            changes = sweep_statuses()
+            for name, count in changes.items():
+                self.stdout.write(f"{name}: {count}")
@@ -1,49 +1,44 @@
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
 from django.utils import timezone
-from webapp.models import AssignmentSubmission, MeetingDetails
 from datetime import timedelta
+from webapp.locks import maintenance_lease
+from webapp.status import STATUS_SWEEP_JOB, sweep_assignments, sweep_meetings, transition_due, schedule_next_transition
 
 # Middleware class to check deadlines and meeting status on each request
+# statuses are normally kept up to date by the scheduled 'sweep_statuses' task (see settings.CELERY_BEAT_SCHEDULE),
+# so this middleware removes itself unless STATUS_SWEEP_ON_REQUEST is enabled
 class DeadlineCheckMiddleware:
     def __init__(self, get_response):
+        if not getattr(settings, 'STATUS_SWEEP_ON_REQUEST', False):
+            raise MiddlewareNotUsed("Statuses are updated by the scheduled sweeper.")
+
         self.get_response = get_response
+        self.not_before = None # time before which this process does not try to take the lease again
 
     def __call__(self, request):
-        # call deadline and meeting status check on every request
-        self.check_deadlines() # check and update assignment submission statuses
-        self.check_meetings() # check and update meeting statuses
+        # only check statuses once the next deadline or meeting time has been reached
+        # (requests before then skip the database entirely)
+        # and only in one process across the cluster per sweep interval
+        now = timezone.now()
+        if (self.not_before is None or now >= self.not_before) and transition_due(now):
+            with maintenance_lease(STATUS_SWEEP_JOB, settings.STATUS_SWEEP_INTERVAL) as acquired:
+                if acquired:
+                    self.check_deadlines() # check and update assignment submission statuses
+                    self.check_meetings() # check and update meeting statuses
+                    schedule_next_transition()
+                else:
+                    # another process holds the lease, so wait a little before trying again
+                    # rather than asking Redis for it on every request until it expires
+                    self.not_before = now + timedelta(seconds=settings.STATUS_SWEEP_RETRY_DELAY)
+
         response = self.get_response(request)  # get the response after processing the request
         return response
 
     # check and update the status of assignment submissions based on their deadlines
     def check_deadlines(self):
-        # get all assignment submissions
-        deadlines = AssignmentSubmission.objects.filter()
-        
-        # loop through each submission and check if it is overdue
-        for d in deadlines:
+        sweep_assignments()
 
-            # if the deadline has passed
-            if d.assignment.deadline < timezone.now():
-                d.submission_status = "overdue"
-                d.assignment.assignment_status = False
-                d.assignment.save()
-    
     # check and update the status of meetings based on their timing
     def check_meetings(self):
-        # get all meetings with the status 'closed' and check if they are now in progress
-        meetings_closed = MeetingDetails.objects.filter(meeting_status='closed')
-
-        # loop through each meeting that was closed and check if it's within the meeting duration
-        for m in meetings_closed:
-            if m.start_datetime <= timezone.now() <= m.start_datetime + timedelta(minutes=m.duration_minutes):
-                m.meeting_status = 'open'
-                m.save()
-
-        # get all meetings with the status 'open' and check if they have expired
-        meetings_opened = MeetingDetails.objects.filter(meeting_status='open')
-
-        # loop through each open meeting and check if it has passed the duration
-        for m in meetings_opened:
-            if m.start_datetime + timedelta(minutes=m.duration_minutes) < timezone.now():
-                m.meeting_status = 'expired'
-                m.save()
+        sweep_meetings()
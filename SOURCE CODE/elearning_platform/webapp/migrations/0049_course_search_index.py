@@ -0,0 +1,51 @@
+from django.db import migrations
+
+# creates the course catalog's full-text search index (see webapp/search.py) and fills it with the existing courses
+# SQLite: an FTS5 virtual table keyed by rowid = course_id
+# PostgreSQL: a side table of tsvector columns with GIN indexes
+# other databases have no index (the catalog search falls back to icontains filters)
+
+SEARCH_TEXT_SQL = """
+    SELECT c.course_id,
+           c.course_name || ' ' || c.course_description,
+           COALESCE(u.first_name, '') || ' ' || COALESCE(u.middle_name, '') || ' ' || COALESCE(u.last_name, '')
+    FROM webapp_coursedetails c
+    LEFT JOIN webapp_userinfo u ON u.user_id = c.teacher_id
+"""
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+
+    if vendor == "sqlite":
+        schema_editor.execute("CREATE VIRTUAL TABLE webapp_coursesearch USING fts5(content, instructor, tokenize = 'porter unicode61')")
+        schema_editor.execute(f"INSERT INTO webapp_coursesearch (rowid, content, instructor) {SEARCH_TEXT_SQL}")
+
+    elif vendor == "postgresql":
+        schema_editor.execute("""
+            CREATE TABLE webapp_coursesearch (
+                course_id integer PRIMARY KEY REFERENCES webapp_coursedetails (course_id) ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED,
+                content tsvector NOT NULL,
+                instructor tsvector NOT NULL
+            )
+        """)
+        schema_editor.execute("CREATE INDEX webapp_coursesearch_content_gin ON webapp_coursesearch USING GIN (content)")
+        schema_editor.execute("CREATE INDEX webapp_coursesearch_instructor_gin ON webapp_coursesearch USING GIN (instructor)")
+        schema_editor.execute(f"""
+            INSERT INTO webapp_coursesearch (course_id, content, instructor)
+            SELECT course_id, to_tsvector('english', content), to_tsvector('simple', instructor)
+            FROM ({SEARCH_TEXT_SQL}) AS t (course_id, content, instructor)
+        """)
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor in ("sqlite", "postgresql"):
+        schema_editor.execute("DROP TABLE IF EXISTS webapp_coursesearch")
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("webapp", "0048_courseprogress"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
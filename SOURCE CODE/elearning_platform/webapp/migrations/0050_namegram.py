@@ -0,0 +1,50 @@
+# Generated by Django 4.2.16 on 2026-10-18 12:09
+
+from django.db import migrations, models
+import django.db.models.deletion
+import re
+
+# trigrams of each word of a name, padded as in webapp/search.py
+def name_grams(text):
+    grams = set()
+    for word in re.findall(r"\w+", text.lower()):
+        padded = "  " + word + " "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+# index the names of the existing users
+def fill_name_grams(apps, schema_editor):
+    UserInfo = apps.get_model("webapp", "UserInfo")
+    NameGram = apps.get_model("webapp", "NameGram")
+
+    rows = []
+    for info in UserInfo.objects.iterator():
+        grams = set()
+        for name in (info.first_name, info.middle_name, info.last_name, info.display_name):
+            grams |= name_grams(name or "")
+        rows.extend(NameGram(user_info_id=info.id, gram=gram, user_type=info.user_type) for gram in grams)
+
+    NameGram.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webapp', '0049_course_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NameGram',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('gram', models.CharField(max_length=3)),
+                ('user_type', models.CharField(max_length=10)),
+                ('user_info', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='name_grams', to='webapp.userinfo')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['gram', 'user_type', 'user_info'], name='namegram_lookup')],
+            },
+        ),
+        migrations.RunPython(fill_name_grams, migrations.RunPython.noop),
+    ]
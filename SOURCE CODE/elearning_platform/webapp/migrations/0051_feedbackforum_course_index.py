@@ -0,0 +1,17 @@
+# Generated by Django 4.2.16 on 2026-10-18 12:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webapp', '0050_namegram'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='feedbackforum',
+            index=models.Index(fields=['course', 'created_at', 'feedback_id'], name='forum_course_created'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 4.2.16 on 2026-10-18 12:27
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('webapp', '0051_feedbackforum_course_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationWatermark',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='notification_watermark', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('last_read_at', models.DateTimeField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='CourseEvent',
+            fields=[
+                ('event_id', models.AutoField(primary_key=True, serialize=False)),
+                ('message', models.CharField(max_length=500)),
+                ('notif_type', models.CharField(choices=[('forum', 'Forum'), ('materials', 'Materials'), ('enrollment', 'Enrollment'), ('qna', 'QnA'), ('others', 'Others')], max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('actor', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='events', to='webapp.coursedetails')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['course', 'notif_type', 'created_at'], name='courseevent_feed')],
+            },
+        ),
+    ]
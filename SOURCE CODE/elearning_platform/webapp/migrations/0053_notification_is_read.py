@@ -0,0 +1,24 @@
+# Generated by Django 4.2.16 on 2026-10-18 12:32
+
+from django.db import migrations, models
+
+# notifications sent before read state was tracked are treated as read,
+# so that existing users do not start with their whole history unread
+def mark_existing_read(apps, schema_editor):
+    Notification = apps.get_model("webapp", "Notification")
+    Notification.objects.update(is_read=True)
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webapp', '0052_courseevent'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='is_read',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.RunPython(mark_existing_read, migrations.RunPython.noop),
+    ]
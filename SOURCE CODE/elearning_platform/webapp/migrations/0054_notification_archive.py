@@ -0,0 +1,36 @@
+# Generated by Django 4.2.16 on 2026-10-18 12:41
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('webapp', '0053_notification_is_read'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationArchive',
+            fields=[
+                ('notif_id', models.IntegerField(primary_key=True, serialize=False)),
+                ('message', models.CharField(max_length=500)),
+                ('notif_type', models.CharField(choices=[('forum', 'Forum'), ('materials', 'Materials'), ('enrollment', 'Enrollment'), ('qna', 'QnA'), ('others', 'Others')], max_length=20)),
+                ('is_read', models.BooleanField(default=False)),
+                ('created_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField()),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['user', 'notif_type', 'created_at'], name='notification_feed'),
+        ),
+        migrations.AddField(
+            model_name='notificationarchive',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_notifications', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 4.2.16 on 2026-10-18 12:48
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('webapp', '0054_notification_archive'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EmailDigestEntry',
+            fields=[
+                ('entry_id', models.AutoField(primary_key=True, serialize=False)),
+                ('subject', models.CharField(max_length=255)),
+                ('message', models.CharField(max_length=500)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='email_digest_entries', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.16 on 2026-10-18 12:56
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webapp', '0055_email_digest_entry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EmailOutbox',
+            fields=[
+                ('email_id', models.AutoField(primary_key=True, serialize=False)),
+                ('to_email', models.EmailField(max_length=254)),
+                ('subject', models.CharField(max_length=255)),
+                ('html_content', models.TextField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('next_attempt_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['next_attempt_at', 'email_id'], name='emailoutbox_due')],
+            },
+        ),
+    ]
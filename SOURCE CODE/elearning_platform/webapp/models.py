@@ -1,9 +1,61 @@
+from datetime import timedelta
 from django.contrib.auth.models import User
 from django.core.exceptions import ValidationError
 from django.db import models
+from django.db.models import Case, When, Value, F, ExpressionWrapper, BooleanField, CharField, DateTimeField, DurationField
+from django.db.models.lookups import LessThan
 from django.utils import timezone
 import secrets, string
 
+# expression for the time a meeting ends (start_datetime + duration_minutes)
+# prefix allows the expression to be used across a relation, e.g. 'meeting_details__'
+def meeting_end_expression(prefix=""):
+    duration = ExpressionWrapper(F(prefix + 'duration_minutes') * Value(timedelta(minutes=1)), output_field=DurationField())
+    return ExpressionWrapper(F(prefix + 'start_datetime') + duration, output_field=DateTimeField())
+
+# expression for a meeting's effective status, computed from its start time and duration
+# (meetings ended manually keep their stored 'expired' status)
+def meeting_status_expression(prefix="", now=None):
+    now = now or timezone.now()
+    return Case(
+        When(**{prefix + 'meeting_status': 'expired'}, then=Value('expired')),
+        When(LessThan(meeting_end_expression(prefix), now), then=Value('expired')),
+        When(**{prefix + 'start_datetime__lte': now}, then=Value('open')),
+        default=Value('closed'),
+        output_field=CharField(),
+    )
+
+# querysets that compute assignment, submission and meeting statuses when they are read,
+# so views show the correct status even before the status sweep has updated the stored fields
+
+class AssignmentUploadQuerySet(models.QuerySet):
+    # annotates 'is_open' (deadline has not passed)
+    def with_status(self, now=None):
+        now = now or timezone.now()
+        return self.annotate(is_open=Case(When(deadline__gt=now, then=Value(True)),
+                                          default=Value(False),
+                                          output_field=BooleanField()))
+
+class AssignmentSubmissionQuerySet(models.QuerySet):
+    # annotates 'effective_status' (submitted, overdue or due)
+    def with_status(self, now=None):
+        now = now or timezone.now()
+        return self.annotate(effective_status=Case(When(submission_status="submitted", then=Value("submitted")),
+                                                   When(assignment__deadline__lte=now, then=Value("overdue")),
+                                                   default=Value("due"),
+                                                   output_field=CharField()))
+
+    # submissions whose assignment is still open
+    def open(self, now=None):
+        now = now or timezone.now()
+        return self.filter(assignment__deadline__gt=now)
+
+class MeetingDetailsQuerySet(models.QuerySet):
+    # annotates 'end_datetime' and 'effective_status' (closed, open or expired)
+    def with_status(self, now=None):
+        return self.annotate(end_datetime=meeting_end_expression(),
+                             effective_status=meeting_status_expression(now=now))
+
 # model to store user information (for both students and teachers)
 class UserInfo(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
@@ -34,6 +86,21 @@ class UserInfo(models.Model):
     def __str__(self):
         return f"{self.first_name} {self.last_name} ({self.user.username}) - {self.user_type.capitalize()}"
 
+# model to store the trigrams of each user's names, used to search people by name (see search.py)
+# user_type is copied from the user's info so that searches filtered by user type only read the index
+class NameGram(models.Model):
+    user_info = models.ForeignKey(UserInfo, on_delete=models.CASCADE, related_name="name_grams")
+    gram = models.CharField(max_length=3)
+    user_type = models.CharField(max_length=10)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["gram", "user_type", "user_info"], name="namegram_lookup"),
+        ]
+
+    def __str__(self):
+        return f"'{self.gram}' - {self.user_info.first_name} {self.user_info.last_name}"
+
 # model to store course information
 # each course is associated with a teacher user
 class CourseDetails(models.Model):
@@ -106,6 +173,8 @@ class AssignmentUpload(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_on = models.DateTimeField(auto_now=True)
 
+    objects = AssignmentUploadQuerySet.as_manager()
+
     def clean(self):
         if not self.pk:
             # ensures that deadline set is in the future
@@ -130,11 +199,92 @@ class Notification(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="notifications")
     message = models.CharField(max_length=500)
     notif_type = models.CharField(max_length=20, choices=NOTIF_TYPE_CHOICES)
+    is_read = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # a user's notifications of one type, newest first (the notification page tabs)
+            models.Index(fields=["user", "notif_type", "created_at"], name="notification_feed"),
+        ]
     
     def __str__(self):
         return f"Notification for {self.user.first_name} {self.user.last_name}: [{self.get_notif_type_display()}] {self.message}"
 
+# model to store notifications older than NOTIFICATION_RETENTION_DAYS (see notifications.py)
+# they are moved here by a periodic task, so that the notification table only holds recent notifications
+class NotificationArchive(models.Model):
+    notif_id = models.IntegerField(primary_key=True) # id of the original notification
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="archived_notifications")
+    message = models.CharField(max_length=500)
+    notif_type = models.CharField(max_length=20, choices=Notification.NOTIF_TYPE_CHOICES)
+    is_read = models.BooleanField(default=False)
+    created_at = models.DateTimeField()
+    archived_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"Archived notification for {self.user.first_name} {self.user.last_name}: [{self.get_notif_type_display()}] {self.message}"
+
+# model to store course-wide notifications of large courses (see notifications.py)
+# each event is stored once for its course and shown to every student of the course when they read their notifications,
+# instead of being copied into a Notification for each student
+class CourseEvent(models.Model):
+    event_id = models.AutoField(primary_key=True)
+    course = models.ForeignKey(CourseDetails, on_delete=models.CASCADE, related_name="events")
+    actor = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True) # user who caused the event (not shown the event)
+    message = models.CharField(max_length=500)
+    notif_type = models.CharField(max_length=20, choices=Notification.NOTIF_TYPE_CHOICES)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["course", "notif_type", "created_at"], name="courseevent_feed"),
+        ]
+
+    def __str__(self):
+        return f"Event in {self.course.course_name}: [{self.get_notif_type_display()}] {self.message}"
+
+# model to store when each user last read their notifications
+# notifications and course events created after it are shown as new
+class NotificationWatermark(models.Model):
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name="notification_watermark")
+    last_read_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.user.first_name} {self.user.last_name} read notifications at {self.last_read_at}"
+
+# model to store the email alerts waiting to be sent to each user (see digests.py)
+# a periodic task sends each user one email with all of their pending alerts, then deletes them
+class EmailDigestEntry(models.Model):
+    entry_id = models.AutoField(primary_key=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="email_digest_entries")
+    subject = models.CharField(max_length=255)
+    message = models.CharField(max_length=500)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Pending email for {self.user.first_name} {self.user.last_name}: {self.subject}"
+
+# model to store the emails waiting to be sent (see outbox.py)
+# emails are written in the same transaction as the change they are about, and sent by a periodic dispatcher
+class EmailOutbox(models.Model):
+    email_id = models.AutoField(primary_key=True)
+    to_email = models.EmailField()
+    subject = models.CharField(max_length=255)
+    html_content = models.TextField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    attempts = models.PositiveSmallIntegerField(default=0) # failed attempts to send it
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            # the emails due to be sent, in the order the dispatcher sends them
+            models.Index(fields=["next_attempt_at", "email_id"], name="emailoutbox_due"),
+        ]
+
+    def __str__(self):
+        return f"Email to {self.to_email}: {self.subject}"
+
 # model to store feedbacks
 # each feedback is associated with a course (forum) and user (who posted the feedback)
 class FeedbackForum(models.Model):
@@ -144,6 +294,12 @@ class FeedbackForum(models.Model):
     feedback = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # a course's posts in the order the forum pages through them (newest first)
+            models.Index(fields=["course", "created_at", "feedback_id"], name="forum_course_created"),
+        ]
+
     def __str__(self):
         return f"Feedback by {self.user.userinfo.first_name} {self.user.userinfo.last_name} on {self.course.course_name}: {self.feedback[:20]}..."
 
@@ -181,10 +337,34 @@ class AssignmentSubmission(models.Model):
     upload_file = models.FileField(upload_to='uploaded_assignments/', null=True)
     submission_status = models.CharField(max_length=20, choices=SUBMISSION_STATUS, default="due")
     submitted_on = models.DateTimeField(auto_now=True) # updated if assignment is resubmitted
+
+    objects = AssignmentSubmissionQuerySet.as_manager()
     
     def __str__(self):
         return f"{self.student.userinfo.first_name} {self.student.userinfo.last_name} - {self.assignment.name} ({self.get_submission_status_display()})"
 
+# model to store each student's progress in a course
+# the counts are kept up to date by the views (see progress.py), so pages can read progress without re-counting submissions
+class CourseProgress(models.Model):
+    student = models.ForeignKey(User, on_delete=models.CASCADE, related_name="course_progress")
+    course = models.ForeignKey(CourseDetails, on_delete=models.CASCADE, related_name="student_progress")
+    submitted = models.PositiveIntegerField(default=0) # number of assignments submitted by the student
+    total = models.PositiveIntegerField(default=0) # number of assignments in the course
+    updated_on = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["student", "course"], name="unique_course_progress"),
+        ]
+
+    def __str__(self):
+        return f"{self.student.userinfo.first_name} {self.student.userinfo.last_name} - {self.course.course_name} ({self.submitted}/{self.total})"
+
+    # progress as a percentage of assignments submitted
+    @property
+    def progress(self):
+        return (self.submitted / self.total) * 100 if self.total > 0 else 0
+
 # model to store e-meeting request data
 # each request is associated with a student (who requested) and teacher (who receives the request)
 class RequestMeeting(models.Model):
@@ -221,6 +401,8 @@ class MeetingDetails(models.Model):
     meeting_status = models.CharField(max_length=20, choices=STATUS, default="closed")
     password = models.CharField(max_length=16, blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
+
+    objects = MeetingDetailsQuerySet.as_manager()
     
     def __str__(self):
         return f"Meeting: {self.request.student.userinfo.first_name} & {self.request.teacher.userinfo.first_name} on {self.start_datetime.strftime('%Y-%m-%d %H:%M')} ({self.get_meeting_status_display()})"
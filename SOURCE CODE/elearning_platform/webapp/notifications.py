@@ -0,0 +1,295 @@
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import F, Count
+from django.utils import timezone
+from datetime import timedelta
+from itertools import chain
+from redis.exceptions import RedisError
+from .models import CourseEnrollments, Notification, NotificationArchive, CourseEvent, NotificationWatermark
+from .pagination import KeysetPage, encode_cursor, decode_cursor, filter_after
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Course-wide notifications (e.g. a new forum post or new materials) sent to every student of a course.
+# Large courses have thousands of students, so the views do not create the notifications themselves:
+# they enqueue fanout_course_notification (see tasks.py), which calls notify_course.
+#
+# Courses with up to COURSE_EVENT_FANOUT_THRESHOLD students get one Notification per student (fan-out on write).
+# Larger courses store a single CourseEvent instead, which is merged into each student's notifications
+# when they are read (fan-out on read), so the notification table does not grow with posts x students.
+# Students see the events of the courses they are enrolled in, from when they enrolled.
+#
+# Notifications are unread until the user marks them all as read; course events are unread
+# if they were created after the user's watermark (the last time they marked everything as read).
+# The number of unread items of each type is cached per user (for the header badges), and kept up to date
+# by the signals in signals.py and by the fan-outs below, which clear the counts of the users they notify.
+#
+# New notifications are also pushed to the users' open pages over a WebSocket (NotificationConsumer):
+# each user's connection joins their own group and a group for each course they are a member of,
+# so a course-wide notification is pushed with one group_send to the course group.
+
+# enrollment statuses of the students who can see a course's content (and so are notified about it)
+COURSE_MEMBER_STATUSES = ("enrolled", "unenrolled")
+
+# create a notification for every student of a course with one INSERT ... SELECT statement
+# statuses limits it to enrollments with the given statuses (all enrollments if None),
+# and exclude_user_id leaves out one user (e.g. the poster)
+# returns the number of notifications created
+def notify_course_students(course_id, message, notif_type, exclude_user_id=None, statuses=None):
+    conditions, params = ["course_id = %s"], [course_id]
+    if statuses is not None:
+        if not statuses:
+            return 0
+        conditions.append(f"enrollment_status IN ({', '.join(['%s'] * len(statuses))})")
+        params.extend(statuses)
+    if exclude_user_id is not None:
+        conditions.append("student_id <> %s")
+        params.append(exclude_user_id)
+
+    # the rows are not created through the ORM, so created_at is set here rather than by auto_now_add
+    created_at = connection.ops.adapt_datetimefield_value(timezone.now())
+
+    with connection.cursor() as cursor:
+        cursor.execute(f"INSERT INTO {Notification._meta.db_table} (user_id, message, notif_type, is_read, created_at) "
+                       f"SELECT student_id, %s, %s, %s, %s FROM {CourseEnrollments._meta.db_table} "
+                       f"WHERE {' AND '.join(conditions)}",
+                       [message, notif_type, False, created_at] + params)
+        return cursor.rowcount
+
+# enrollments of a course's students with the given statuses (all enrollments if None)
+def course_enrollments(course_id, statuses=COURSE_MEMBER_STATUSES):
+    students = CourseEnrollments.objects.filter(course_id=course_id)
+    if statuses is not None:
+        students = students.filter(enrollment_status__in=statuses)
+    return students
+
+# ids of the students of a course notified about it: those with the given statuses, except exclude_user_id
+def course_student_ids(course_id, exclude_user_id=None, statuses=COURSE_MEMBER_STATUSES):
+    return course_enrollments(course_id, statuses).exclude(student_id=exclude_user_id).values_list('student_id', flat=True)
+
+# send a notification to every student of a course, as one CourseEvent for courses above COURSE_EVENT_FANOUT_THRESHOLD
+# the rows are created in a transaction, so the callbacks below only run once they are committed
+# returns the number of rows created
+def notify_course(course_id, message, notif_type, exclude_user_id=None, statuses=COURSE_MEMBER_STATUSES):
+    students = course_enrollments(course_id, statuses)
+    student_ids = course_student_ids(course_id, exclude_user_id, statuses)
+
+    # events are shown to the students with COURSE_MEMBER_STATUSES, so other audiences always get notifications
+    is_members = statuses is not None and set(statuses) == set(COURSE_MEMBER_STATUSES)
+    with transaction.atomic():
+        if is_members and students.count() > settings.COURSE_EVENT_FANOUT_THRESHOLD:
+            CourseEvent.objects.create(course_id=course_id, actor_id=exclude_user_id, message=message, notif_type=notif_type)
+            count = 1
+        else:
+            count = notify_course_students(course_id, message, notif_type, exclude_user_id, statuses)
+
+        # the notified students' unread counts are recounted the next time they are shown
+        transaction.on_commit(lambda: invalidate_unread_counts(student_ids.iterator()))
+
+        # the course group only holds the course's members, so other audiences are pushed to one by one
+        payload = notification_payload(message, notif_type, timezone.now(), exclude_user_id)
+        if is_members:
+            transaction.on_commit(lambda: push_notification(COURSE_GROUP.format(course_id=course_id), payload))
+        else:
+            transaction.on_commit(lambda: [push_notification(USER_GROUP.format(user_id=user_id), payload)
+                                           for user_id in student_ids.iterator()])
+    return count
+
+# course events shown to a user: events of the courses they are enrolled in, posted since they enrolled (not by themselves)
+def course_events_for(user):
+    return CourseEvent.objects.filter(
+        course__enrollments__student=user,
+        course__enrollments__enrollment_status__in=COURSE_MEMBER_STATUSES,
+        created_at__gte=F('course__enrollments__created_at'),
+    ).exclude(actor=user)
+
+# get a page of a user's notifications of one type, merged with their course events of that type, newest first
+# both lists are keyset-paginated (see pagination.py), and the page's cursor holds the position reached in each
+# each item has 'message' and 'created_at', and 'unread' is set on the unread ones
+# (course events are unread if they were created after last_read_at, the user's watermark)
+def paginate_notifications(request, user, notif_type, last_read_at=None, page_size=None):
+    page_size = page_size or settings.NOTIFICATION_PAGE_SIZE
+    positions = decode_cursor(request.GET.get('cursor'), 2)
+    is_first = positions is None
+    positions = positions or [None, None]
+
+    sources = [(Notification.objects.filter(user=user, notif_type=notif_type), [('created_at', True), ('notif_id', True)])]
+    if user.userinfo.user_type == "student":
+        sources.append((course_events_for(user).filter(notif_type=notif_type), [('created_at', True), ('event_id', True)]))
+
+    # the next page_size + 1 items of each list, of which the newest page_size are shown
+    candidates = []
+    for index, (queryset, ordering) in enumerate(sources):
+        queryset = queryset.order_by(*[f"-{field}" for field, _ in ordering])
+        if isinstance(positions[index], list) and len(positions[index]) == len(ordering):
+            page = filter_after(queryset, ordering, positions[index])
+            if page is None: # an invalid position starts the list from the newest item
+                positions[index] = None
+            else:
+                queryset = page
+        candidates.extend((item, index, ordering) for item in queryset[:page_size + 1])
+
+    candidates.sort(key=lambda candidate: candidate[0].created_at, reverse=True)
+    has_next = len(candidates) > page_size
+    items = []
+    for item, index, ordering in candidates[:page_size]:
+        item.unread = not item.is_read if index == 0 else (last_read_at is None or item.created_at > last_read_at)
+        positions[index] = [getattr(item, field) for field, _ in ordering]
+        items.append(item)
+
+    query = request.GET.copy()
+    query.pop('cursor', None)
+    first_query = query.urlencode()
+
+    next_query = next_cursor = None
+    if has_next:
+        next_cursor = query['cursor'] = encode_cursor(positions)
+        next_query = query.urlencode()
+
+    return KeysetPage(items, next_query, first_query, is_first, next_cursor)
+
+# get when a user last marked their notifications as read (None if they never have)
+def get_watermark(user):
+    watermark = NotificationWatermark.objects.filter(user=user).first()
+    return watermark.last_read_at if watermark else None
+
+# mark all of a user's notifications and course events as read (one UPDATE for the notifications)
+def mark_all_read(user):
+    Notification.objects.filter(user=user, is_read=False).update(is_read=True)
+    NotificationWatermark.objects.update_or_create(user=user, defaults={'last_read_at': timezone.now()})
+
+    try:
+        cache.set_many({_unread_key(user.id, notif_type): 0 for notif_type in NOTIF_TYPES}, settings.UNREAD_COUNT_TIMEOUT)
+    except RedisError as e:
+        logger.warning("Could not reset the unread notification counts: %s", e)
+
+# Retention: notifications older than NOTIFICATION_RETENTION_DAYS are moved to the archive table
+# by a periodic task, so the notification table (and each user's index range in it) stays small.
+
+NOTIFICATION_ARCHIVE_JOB = "archive-notifications" # name of the task's cluster-wide lease (see locks.py)
+
+# move notifications older than NOTIFICATION_RETENTION_DAYS into the archive table,
+# in batches of NOTIFICATION_ARCHIVE_BATCH_SIZE (each copied and deleted with one statement, in one transaction)
+# returns the number of notifications archived
+def archive_old_notifications(now=None, batch_size=None):
+    now = now or timezone.now()
+    batch_size = batch_size or settings.NOTIFICATION_ARCHIVE_BATCH_SIZE
+    cutoff = now - timedelta(days=settings.NOTIFICATION_RETENTION_DAYS)
+    archived_at = connection.ops.adapt_datetimefield_value(now)
+    table, archive_table = Notification._meta.db_table, NotificationArchive._meta.db_table
+
+    count = 0
+    while True:
+        rows = list(Notification.objects.filter(created_at__lt=cutoff).order_by('notif_id')
+                                        .values_list('notif_id', 'user_id', 'is_read')[:batch_size])
+        if not rows:
+            return count
+
+        ids = [notif_id for notif_id, _, _ in rows]
+        placeholders = ", ".join(["%s"] * len(ids))
+        with transaction.atomic(), connection.cursor() as cursor:
+            # notifications already archived (e.g. by an earlier run that failed before deleting them) are not copied again
+            cursor.execute(f"INSERT INTO {archive_table} (notif_id, user_id, message, notif_type, is_read, created_at, archived_at) "
+                           f"SELECT notif_id, user_id, message, notif_type, is_read, created_at, %s FROM {table} "
+                           f"WHERE notif_id IN ({placeholders}) "
+                           f"AND notif_id NOT IN (SELECT notif_id FROM {archive_table} WHERE notif_id IN ({placeholders}))",
+                           [archived_at] + ids + ids)
+            cursor.execute(f"DELETE FROM {table} WHERE notif_id IN ({placeholders})", ids)
+
+        # archived notifications are no longer counted as unread
+        invalidate_unread_counts({user_id for _, user_id, is_read in rows if not is_read})
+        count += len(rows)
+
+# Unread counts, cached as one key per user and type.
+
+UNREAD_KEY = "unread:{user_id}:{notif_type}"
+NOTIF_TYPES = [notif_type for notif_type, _ in Notification.NOTIF_TYPE_CHOICES]
+
+def _unread_key(user_id, notif_type):
+    return UNREAD_KEY.format(user_id=user_id, notif_type=notif_type)
+
+# count a user's unread notifications and course events of each type from the database
+def count_unread(user):
+    counts = dict.fromkeys(NOTIF_TYPES, 0)
+    unread = Notification.objects.filter(user=user, is_read=False).values_list('notif_type').annotate(count=Count('notif_id'))
+
+    events = course_events_for(user)
+    last_read_at = get_watermark(user)
+    if last_read_at is not None:
+        events = events.filter(created_at__gt=last_read_at)
+
+    for notif_type, count in chain(unread, events.values_list('notif_type').annotate(count=Count('event_id'))):
+        counts[notif_type] += count
+    return counts
+
+# get a user's unread counts as {notif_type: count}, from the cache if they are cached
+def get_unread_counts(user):
+    keys = {notif_type: _unread_key(user.id, notif_type) for notif_type in NOTIF_TYPES}
+
+    try:
+        cached = cache.get_many(keys.values())
+    except RedisError as e:
+        logger.warning("Could not read the unread notification counts: %s", e)
+        return count_unread(user)
+
+    if len(cached) == len(keys):
+        return {notif_type: cached[key] for notif_type, key in keys.items()}
+
+    counts = count_unread(user)
+    try:
+        cache.set_many({keys[notif_type]: count for notif_type, count in counts.items()}, settings.UNREAD_COUNT_TIMEOUT)
+    except RedisError as e:
+        logger.warning("Could not cache the unread notification counts: %s", e)
+    return counts
+
+# add a new notification to its user's cached unread count
+# counts that are not cached are left alone, as they are counted from the database when next shown
+def increment_unread_count(user_id, notif_type):
+    try:
+        cache.incr(_unread_key(user_id, notif_type))
+    except ValueError:
+        pass
+    except RedisError as e:
+        logger.warning("Could not update the unread notification count: %s", e)
+
+# clear the cached unread counts of the given users, so they are counted from the database when next shown
+def invalidate_unread_counts(user_ids, batch_size=1000):
+    batch = []
+    try:
+        for user_id in user_ids:
+            batch.extend(_unread_key(user_id, notif_type) for notif_type in NOTIF_TYPES)
+            if len(batch) >= batch_size:
+                cache.delete_many(batch)
+                batch = []
+        if batch:
+            cache.delete_many(batch)
+    except RedisError as e:
+        logger.warning("Could not clear the unread notification counts: %s", e)
+
+# Real-time push of new notifications (see NotificationConsumer in elearning_platform/consumers.py).
+
+USER_GROUP = "notifications_user_{user_id}"
+COURSE_GROUP = "notifications_course_{course_id}"
+
+# message sent to a notification group (exclude_user_id is not shown the notification, e.g. the poster)
+def notification_payload(message, notif_type, created_at, exclude_user_id=None):
+    return {
+        "type": "notification.new",
+        "message": message,
+        "notif_type": notif_type,
+        "created_at": created_at.isoformat(),
+        "exclude_user": exclude_user_id,
+    }
+
+# push a notification to the open pages of a user or course group
+# pushing is best-effort: users who are not connected (or miss it) see the notification when they next load a page
+def push_notification(group, payload):
+    try:
+        async_to_sync(get_channel_layer().group_send)(group, payload)
+    except (RedisError, OSError) as e:
+        logger.warning("Could not push a notification to %s: %s", group, e)
+
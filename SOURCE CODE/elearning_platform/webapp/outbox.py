@@ -0,0 +1,157 @@
+from django.conf import settings
+from django.core.exceptions import EmptyResultSet
+from django.db import connection, transaction
+from django.db.models import Value, CharField, DateTimeField, IntegerField
+from django.utils import timezone
+from datetime import timedelta
+from .mail import TransientEmailError
+from .models import EmailOutbox, UserInfo
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Transactional email outbox.
+# Emails are not sent (or enqueued as Celery tasks) by the views: they are written to the EmailOutbox table
+# in the same transaction as the change they are about, so an email is queued if and only if the change is saved,
+# even if the broker is unavailable.
+# The dispatcher task (dispatch_email_outbox_task, see tasks.py) sends them every EMAIL_OUTBOX_INTERVAL seconds,
+# at most EMAIL_OUTBOX_BATCHES_PER_RUN batches of EMAIL_OUTBOX_BATCH_SIZE emails per run.
+# Several dispatchers can run at once: each claims its batch with SELECT ... FOR UPDATE SKIP LOCKED (on PostgreSQL)
+# and leases it by moving its next_attempt_at EMAIL_OUTBOX_LEASE seconds ahead, then commits before sending,
+# so the rows are not locked while the emails are sent (and retried by the transport), and other dispatchers skip them.
+# The lease is renewed before each request once half of it has passed, so a slow batch keeps its emails,
+# and emails whose lease was lost anyway (e.g. the dispatcher was paused) are left to the dispatcher that took them.
+# If a dispatcher dies while sending, its emails are sent by another one once the lease expires.
+#
+# Emails are sent at least once, and deleted as soon as the request sending them succeeds.
+# Emails that could not be sent because of a temporary error (e.g. SendGrid being unavailable) are retried later,
+# waiting EMAIL_OUTBOX_RETRY_DELAY seconds and then twice as long after each failure,
+# and are dropped after EMAIL_OUTBOX_MAX_ATTEMPTS failures.
+# Emails refused with a permanent error (e.g. an invalid address) are dropped straight away.
+
+# queue an email to each of the given users who have email alerts on, with one INSERT ... SELECT statement
+# (should be called in the transaction of the change the email is about)
+# user_ids can be a list or a queryset of user ids
+# returns the number of emails queued
+def queue_emails(user_ids, subject, html_content):
+    if not settings.EMAIL_ALERTS_ENABLED:
+        return 0
+
+    # the rows are not created through the ORM, so the defaults are set here
+    now = timezone.now()
+    recipients = UserInfo.objects.filter(user_id__in=user_ids, email_alert=True).values_list(
+        'email',
+        Value(subject[:255], output_field=CharField()),
+        Value(html_content, output_field=CharField()),
+        Value(now, output_field=DateTimeField()),
+        Value(0, output_field=IntegerField()),
+        Value(now, output_field=DateTimeField()),
+    )
+    try:
+        sql, params = recipients.query.sql_with_params()
+    except EmptyResultSet: # no user ids
+        return 0
+
+    with connection.cursor() as cursor:
+        cursor.execute(f"INSERT INTO {EmailOutbox._meta.db_table} "
+                       f"(to_email, subject, html_content, created_at, attempts, next_attempt_at) {sql}", params)
+        return cursor.rowcount
+
+# send the emails due in the outbox, using send_many([(email, subject, html_content), ...], on_sent, on_failed, before_request)
+# (see BaseTransport.send_many in mail.py)
+# returns the number of emails sent
+def dispatch_outbox(send_many, batch_size=None, max_batches=None):
+    batch_size = batch_size or settings.EMAIL_OUTBOX_BATCH_SIZE
+    max_batches = max_batches or settings.EMAIL_OUTBOX_BATCHES_PER_RUN
+
+    sent = 0
+    for _ in range(max_batches):
+        batch, lease_until = _claim_batch(batch_size)
+        if not batch:
+            break
+        sent += _send_batch(send_many, batch, lease_until)
+
+    return sent
+
+# claim a batch of due emails, leasing them for EMAIL_OUTBOX_LEASE seconds
+# the transaction only lasts as long as the claim, not the sending
+# returns the batch and the end of its lease (the next_attempt_at of its rows, which identifies the lease)
+def _claim_batch(batch_size):
+    with transaction.atomic():
+        now = timezone.now()
+        batch = list(EmailOutbox.objects.select_for_update(skip_locked=True)
+                     .filter(next_attempt_at__lte=now).order_by('next_attempt_at', 'email_id')[:batch_size])
+        lease_until = now + timedelta(seconds=settings.EMAIL_OUTBOX_LEASE)
+        if batch:
+            EmailOutbox.objects.filter(email_id__in=[email.email_id for email in batch]).update(next_attempt_at=lease_until)
+        return batch, lease_until
+
+# send a claimed batch, deleting the emails of each request as soon as it succeeds
+# returns the number of emails sent
+def _send_batch(send_many, batch, lease_until):
+    # the emails of each (subject, content) not settled yet, by recipient (there can be several rows for the same email)
+    emails = {}
+    for email in batch:
+        emails.setdefault((email.subject, email.html_content), {}).setdefault(email.to_email, []).append(email)
+
+    def claimed(recipients, subject, html_content):
+        return [email for to_email in recipients for email in emails[(subject, html_content)].pop(to_email, [])]
+
+    # renew the lease of the emails not settled yet once half of it has passed
+    # emails no longer held (their next_attempt_at changed) are not sent
+    def before_request(recipients, subject, html_content):
+        nonlocal lease_until
+        now = timezone.now()
+        if now + timedelta(seconds=settings.EMAIL_OUTBOX_LEASE / 2) >= lease_until:
+            pending = [email.email_id for by_recipient in emails.values() for rows in by_recipient.values() for email in rows]
+            renewed_until = now + timedelta(seconds=settings.EMAIL_OUTBOX_LEASE)
+            renewed = EmailOutbox.objects.filter(email_id__in=pending, next_attempt_at=lease_until).update(next_attempt_at=renewed_until)
+            if renewed < len(pending):
+                held = set(EmailOutbox.objects.filter(email_id__in=pending, next_attempt_at=renewed_until)
+                           .values_list('email_id', flat=True))
+                logger.warning("Lost the lease of %s emails from the outbox, leaving them to another dispatcher", len(pending) - renewed)
+                for by_recipient in emails.values():
+                    for to_email in list(by_recipient):
+                        by_recipient[to_email] = [email for email in by_recipient[to_email] if email.email_id in held]
+                        if not by_recipient[to_email]:
+                            del by_recipient[to_email]
+            lease_until = renewed_until
+
+        return [email for email in recipients if email in emails[(subject, html_content)]]
+
+    sent = 0
+    def on_sent(recipients, subject, html_content):
+        nonlocal sent
+        sent_emails = claimed(recipients, subject, html_content)
+        EmailOutbox.objects.filter(email_id__in=[email.email_id for email in sent_emails]).delete()
+        sent += len(sent_emails)
+
+    def on_failed(recipients, subject, html_content, error):
+        failed = claimed(recipients, subject, html_content)
+        if isinstance(error, TransientEmailError):
+            logger.warning("Could not send %s emails from the outbox: %s", len(failed), error)
+            _retry_later(failed, lease_until)
+        else:
+            logger.error("Dropping %s emails from the outbox, which were refused: %s", len(failed), error)
+            EmailOutbox.objects.filter(email_id__in=[email.email_id for email in failed]).delete()
+
+    send_many([(email.to_email, email.subject, email.html_content) for email in batch],
+              on_sent=on_sent, on_failed=on_failed, before_request=before_request)
+    return sent
+
+# put back emails that could not be sent, to be retried with exponential backoff (or dropped after too many failures)
+# only the emails still held under the given lease are changed, so their attempts are up to date
+def _retry_later(emails, lease_until):
+    now = timezone.now()
+    by_attempts = {}
+    for email in emails:
+        by_attempts.setdefault(email.attempts + 1, []).append(email.email_id)
+
+    for attempts, email_ids in by_attempts.items():
+        failed = EmailOutbox.objects.filter(email_id__in=email_ids, next_attempt_at=lease_until)
+        if attempts >= settings.EMAIL_OUTBOX_MAX_ATTEMPTS:
+            logger.error("Dropping %s emails from the outbox after %s attempts", len(email_ids), attempts)
+            failed.delete()
+        else:
+            delay = timedelta(seconds=settings.EMAIL_OUTBOX_RETRY_DELAY * 2 ** (attempts - 1))
+            failed.update(attempts=attempts, next_attempt_at=now + delay)
@@ -0,0 +1,81 @@
+from django.conf import settings
+from django.core.cache import cache
+from redis.exceptions import RedisError
+from .dashboard import get_version, bump_version
+from .models import LessonDetails
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Cached outline of each course's content, shared by the student and teacher course pages.
+# The outline is a list of lessons, each with its materials and assignments, as plain dicts:
+#   {"lesson_id", "lesson_title", "lesson_description",
+#    "materials": [{"material_id", "name", "description", "file_url"}],
+#    "assignments": [{"assign_id", "name", "description", "file_url", "deadline"}]}
+# It is built once per course version; the signals in signals.py bump the version when the course's content changes.
+# Whether an assignment is still open is not stored, as it depends on the time the page is shown.
+
+OUTLINE_KEY = "outline:{course_id}:{version}"
+OUTLINE_VERSION_KEY = "outline:version:{course_id}"
+
+# url of an uploaded file ('' if there is none)
+def _file_url(file):
+    return file.url if file else ""
+
+# build the outline of a course from the database (three queries)
+def build_course_outline(course_id):
+    lessons = LessonDetails.objects.filter(course_id=course_id).prefetch_related('materialupload_set', 'assignments')
+
+    return [{
+        "lesson_id": lesson.lesson_id,
+        "lesson_title": lesson.lesson_title,
+        "lesson_description": lesson.lesson_description,
+        "materials": [{
+            "material_id": material.material_id,
+            "name": material.name,
+            "description": material.description,
+            "file_url": _file_url(material.upload_file),
+        } for material in lesson.materialupload_set.all()],
+        "assignments": [{
+            "assign_id": assignment.assign_id,
+            "name": assignment.name,
+            "description": assignment.description,
+            "file_url": _file_url(assignment.upload_file),
+            "deadline": assignment.deadline,
+        } for assignment in lesson.assignments.all()],
+    } for lesson in lessons]
+
+# get the outline of a course from the cache, building it if it is not cached
+def get_course_outline(course_id):
+    try:
+        key = OUTLINE_KEY.format(course_id=course_id, version=get_version(OUTLINE_VERSION_KEY.format(course_id=course_id)))
+        outline = cache.get(key)
+    except RedisError as e:
+        logger.warning("Could not read the course outline cache: %s", e)
+        return build_course_outline(course_id)
+
+    if outline is None:
+        outline = build_course_outline(course_id)
+        try:
+            cache.set(key, outline, settings.COURSE_OUTLINE_CACHE_TIMEOUT)
+        except RedisError as e:
+            logger.warning("Could not write the course outline cache: %s", e)
+
+    return outline
+
+# get a lesson of a course's outline (None if the lesson is not in the course)
+def get_outline_lesson(course_id, lesson_id):
+    if course_id is None:
+        return None
+
+    for lesson in get_course_outline(course_id):
+        if lesson["lesson_id"] == lesson_id:
+            return lesson
+    return None
+
+# invalidate the cached outline of a course
+def invalidate_course_outline(course_id):
+    try:
+        bump_version(OUTLINE_VERSION_KEY.format(course_id=course_id))
+    except RedisError as e:
+        logger.warning("Could not invalidate the course outline cache: %s", e)
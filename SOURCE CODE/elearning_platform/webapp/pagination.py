@@ -0,0 +1,141 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet, ValidationError
+from django.db.models import Q
+from redis.exceptions import RedisError
+import base64, binascii, datetime, hashlib, json, logging, math
+
+logger = logging.getLogger(__name__)
+
+# Keyset (cursor) pagination for list pages.
+# Instead of OFFSET, each page continues after the sort key of the last row of the previous page,
+# so every page is one indexed range scan no matter how deep it is.
+# The cursor is the last row's sort key, JSON-encoded in a url-safe base64 string
+# (datetimes are encoded as ISO 8601 strings, which the database compares with the column as datetimes).
+#
+# usage:
+#     page = keyset_paginate(request, courses, [('course_id', False)])
+#     page.items, page.next_query, page.first_query
+
+COUNT_KEY = "count:{digest}"
+
+# one page of results, with the query strings of the next and first pages
+class KeysetPage:
+    def __init__(self, items, next_query, first_query, is_first, next_cursor=None):
+        self.items = items
+        self.next_query = next_query # None on the last page
+        self.first_query = first_query
+        self.is_first = is_first
+        self.next_cursor = next_cursor # cursor of the next page (None on the last page)
+
+# encode sort key values that JSON does not support
+def _encode_value(value):
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    raise TypeError(f"Cannot encode {type(value).__name__} in a cursor")
+
+def encode_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values, default=_encode_value).encode()).decode()
+
+# decode a cursor, returning None if it is missing or invalid (which shows the first page)
+def decode_cursor(cursor, length):
+    if not cursor:
+        return None
+
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (binascii.Error, UnicodeError, ValueError):
+        return None
+
+    if not isinstance(values, list) or len(values) != length:
+        return None
+    return values
+
+# filter matching the rows after the given sort key, e.g. for [(a, desc), (b, asc)]:
+# a < x OR (a = x AND b > y)
+def keyset_after(ordering, values):
+    condition = Q()
+    equal = Q()
+
+    for (field, descending), value in zip(ordering, values):
+        condition |= equal & Q(**{f"{field}__{'lt' if descending else 'gt'}": value})
+        equal &= Q(**{field: value})
+
+    return condition
+
+# whether a cursor value can be a sort key value: a string or a number that fits in a 64-bit column
+# (cursors come from the request, so they may have been edited)
+def _is_key_value(value):
+    if isinstance(value, bool):
+        return False
+    if isinstance(value, int):
+        return -2 ** 63 <= value < 2 ** 63
+    if isinstance(value, float):
+        return math.isfinite(value)
+    return isinstance(value, str)
+
+# filter a queryset to the rows after the given sort key values
+# returns None if the values cannot be compared with their fields
+def filter_after(queryset, ordering, values):
+    if not all(_is_key_value(value) for value in values):
+        return None
+    try:
+        return queryset.filter(keyset_after(ordering, values))
+    except (ValidationError, ValueError, TypeError): # values of the wrong type for their fields
+        return None
+
+# get the page of a queryset after the request's 'cursor' parameter
+# ordering is a list of (field, descending) pairs, ending with a unique field (e.g. the primary key)
+def keyset_paginate(request, queryset, ordering, page_size=None):
+    page_size = page_size or settings.PAGE_SIZE
+    fields = [field for field, _ in ordering]
+    values = decode_cursor(request.GET.get('cursor'), len(ordering))
+
+    queryset = queryset.order_by(*[f"-{field}" if descending else field for field, descending in ordering])
+    if values is not None:
+        page = filter_after(queryset, ordering, values)
+        if page is None: # an invalid cursor shows the first page
+            values = None
+        else:
+            queryset = page
+
+    # one extra row is fetched to find out whether there is a next page
+    items = list(queryset[:page_size + 1])
+    has_next = len(items) > page_size
+    items = items[:page_size]
+
+    query = request.GET.copy()
+    query.pop('cursor', None)
+    first_query = query.urlencode()
+
+    next_query = next_cursor = None
+    if has_next:
+        last = items[-1]
+        next_cursor = query['cursor'] = encode_cursor([getattr(last, field) for field in fields])
+        next_query = query.urlencode()
+
+    return KeysetPage(items, next_query, first_query, values is None, next_cursor)
+
+# count the rows of a queryset, caching the result for COUNT_CACHE_TIMEOUT seconds
+# (so the total shown may be slightly out of date, but paging through results does not count them again)
+def cached_count(queryset):
+    try:
+        sql, params = queryset.query.sql_with_params()
+    except EmptyResultSet: # e.g. queryset.none()
+        return 0
+    key = COUNT_KEY.format(digest=hashlib.md5(f"{sql}{params}".encode()).hexdigest())
+
+    try:
+        count = cache.get(key)
+    except RedisError as e:
+        logger.warning("Could not read the cached count: %s", e)
+        return queryset.count()
+
+    if count is None:
+        count = queryset.count()
+        try:
+            cache.set(key, count, settings.COUNT_CACHE_TIMEOUT)
+        except RedisError as e:
+            logger.warning("Could not cache the count: %s", e)
+
+    return count
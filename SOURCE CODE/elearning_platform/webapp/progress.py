@@ -0,0 +1,92 @@
+from django.db import transaction
+from django.db.models import Count, Exists, F, OuterRef
+from .models import AssignmentUpload, AssignmentSubmission, CourseEnrollments, CourseProgress
+
+# Per-student course progress, stored in the CourseProgress table.
+# The views update the counts as submissions, assignments and enrollments change,
+# and rebuild_course_progress recomputes them from scratch (e.g. for backfills or after deletions).
+
+# recompute the progress rows of the given courses (or all courses) from the submissions
+# if a student is given, only that student's rows are recomputed
+# the rows are upserted rather than deleted and recreated, so rows created meanwhile (by a concurrent rebuild,
+# e.g. of the same missing rows on two page loads) are overwritten instead of making the insert fail
+def rebuild_course_progress(course_ids=None, student=None):
+    enrollments = CourseEnrollments.objects.all()
+    assignments = AssignmentUpload.objects.all()
+    submissions = AssignmentSubmission.objects.filter(submission_status="submitted")
+    existing = CourseProgress.objects.all()
+
+    if course_ids is not None:
+        enrollments = enrollments.filter(course_id__in=course_ids)
+        assignments = assignments.filter(lesson__course_id__in=course_ids)
+        submissions = submissions.filter(assignment__lesson__course_id__in=course_ids)
+        existing = existing.filter(course_id__in=course_ids)
+
+    if student is not None:
+        enrollments = enrollments.filter(student=student)
+        submissions = submissions.filter(student=student)
+        existing = existing.filter(student=student)
+
+    # number of assignments per course
+    totals = dict(assignments.values('lesson__course').annotate(n=Count('assign_id'))
+                             .values_list('lesson__course', 'n'))
+
+    # number of submitted assignments per student and course
+    submitted = {(student_id, course_id): n for student_id, course_id, n in
+                 submissions.values('student', 'assignment__lesson__course').annotate(n=Count('upload_id'))
+                            .values_list('student', 'assignment__lesson__course', 'n')}
+
+    rows = [
+        CourseProgress(student_id=student_id, course_id=course_id,
+                       submitted=submitted.get((student_id, course_id), 0),
+                       total=totals.get(course_id, 0))
+        for student_id, course_id in enrollments.values_list('student', 'course').distinct().iterator()
+    ]
+
+    with transaction.atomic():
+        CourseProgress.objects.bulk_create(rows, batch_size=1000, update_conflicts=True,
+                                           unique_fields=['student', 'course'], update_fields=['submitted', 'total', 'updated_on'])
+        # rows of students who are no longer enrolled
+        existing.exclude(Exists(CourseEnrollments.objects.filter(student=OuterRef('student'), course=OuterRef('course')))).delete()
+
+    return len(rows)
+
+# create the progress row of a newly enrolled student
+def record_enrollment(student, course):
+    rebuild_course_progress([course.course_id], student=student)
+
+# remove the progress row of a student who has left a course
+def record_unenrollment(student, course_id):
+    CourseProgress.objects.filter(student=student, course_id=course_id).delete()
+
+# count a newly submitted assignment towards the student's progress
+def record_submission(student, course_id):
+    CourseProgress.objects.filter(student=student, course_id=course_id).update(submitted=F('submitted') + 1)
+
+# count a new assignment towards the total of every student in the course
+def record_assignment_added(course_id):
+    CourseProgress.objects.filter(course_id=course_id).update(total=F('total') + 1)
+
+# get the progress rows of a student's courses, keyed by course id
+# rows missing for any of the given courses (e.g. enrollments made before the table existed) are rebuilt first
+def get_student_progress(student, course_ids):
+    course_ids = list(course_ids)
+    progress = {p.course_id: p for p in CourseProgress.objects.filter(student=student, course_id__in=course_ids)}
+
+    missing = [course_id for course_id in course_ids if course_id not in progress]
+    if missing:
+        rebuild_course_progress(missing, student=student)
+        progress.update({p.course_id: p for p in CourseProgress.objects.filter(student=student, course_id__in=missing)})
+
+    return progress
+
+# get the progress rows of a course, keyed by student id
+# the course is rebuilt first if any of the given students is missing a row
+def get_course_progress(course_id, student_ids):
+    progress = {p.student_id: p for p in CourseProgress.objects.filter(course_id=course_id)}
+
+    if any(student_id not in progress for student_id in student_ids):
+        rebuild_course_progress([course_id])
+        progress = {p.student_id: p for p in CourseProgress.objects.filter(course_id=course_id)}
+
+    return progress
@@ -0,0 +1,12 @@
+from django.conf import settings
+import redis
+
+_client = None
+
+# shared Redis connection (connection pool) for the app, using settings.REDIS_URL
+# short timeouts so that callers can fall back quickly if Redis is unavailable
+def get_redis():
+    global _client
+    if _client is None:
+        _client = redis.Redis.from_url(settings.REDIS_URL, socket_connect_timeout=1, socket_timeout=2)
+    return _client
@@ -0,0 +1,229 @@
+from django.db import connection
+from django.db.models import Q, Value, FloatField, Count, Case, When
+from django.db.models.functions import Lower
+from django.db.models.expressions import RawSQL
+from .models import CourseDetails, UserInfo, NameGram
+import re
+
+# Search indexes for the course catalog and the people search.
+#
+# Course catalog: full-text search index.
+# Each course has one row in a side table holding its searchable text:
+#   - content: course name and description
+#   - instructor: the teacher's first, middle and last names
+# On SQLite the table is an FTS5 virtual table (keyed by rowid = course_id) ranked with bm25,
+# on PostgreSQL it holds tsvector columns with GIN indexes ranked with ts_rank.
+# The table is created by migration 0049 and kept up to date by the signals in signals.py.
+# Other databases fall back to icontains filters.
+#
+# search terms match words starting with them (e.g. 'alg' matches 'Algebra'),
+# and every term must match
+
+SEARCH_TABLE = "webapp_coursesearch"
+
+# text indexed for each course, selected from the course and teacher tables
+_SEARCH_TEXT_SQL = """
+    SELECT c.course_id,
+           c.course_name || ' ' || c.course_description,
+           COALESCE(u.first_name, '') || ' ' || COALESCE(u.middle_name, '') || ' ' || COALESCE(u.last_name, '')
+    FROM webapp_coursedetails c
+    LEFT JOIN webapp_userinfo u ON u.user_id = c.teacher_id
+"""
+
+# whether the database supports the search index
+def search_index_available():
+    return connection.vendor in ("sqlite", "postgresql")
+
+# split a search string into words, dropping any query syntax
+def _terms(text):
+    return re.findall(r"\w+", text or "")
+
+# FTS5 query matching every term as a word prefix within one column
+def _fts_query(column, terms):
+    return f"{column} : (" + " AND ".join(f'"{term}"*' for term in terms) + ")"
+
+# tsquery matching every term as a word prefix
+def _ts_query(terms):
+    return " & ".join(f"{term}:*" for term in terms)
+
+# add or update the index rows of the given courses
+def index_courses(course_ids):
+    course_ids = list(course_ids)
+    if not course_ids or not search_index_available():
+        return
+
+    placeholders = ", ".join(["%s"] * len(course_ids))
+    with connection.cursor() as cursor:
+        if connection.vendor == "sqlite":
+            cursor.execute(f"DELETE FROM {SEARCH_TABLE} WHERE rowid IN ({placeholders})", course_ids)
+            cursor.execute(f"INSERT INTO {SEARCH_TABLE} (rowid, content, instructor) "
+                           f"{_SEARCH_TEXT_SQL} WHERE c.course_id IN ({placeholders})", course_ids)
+        else:
+            cursor.execute(f"INSERT INTO {SEARCH_TABLE} (course_id, content, instructor) "
+                           f"SELECT course_id, to_tsvector('english', content), to_tsvector('simple', instructor) "
+                           f"FROM ({_SEARCH_TEXT_SQL} WHERE c.course_id IN ({placeholders})) AS t (course_id, content, instructor) "
+                           f"ON CONFLICT (course_id) DO UPDATE SET content = EXCLUDED.content, instructor = EXCLUDED.instructor",
+                           course_ids)
+
+# remove the index row of a deleted course
+def unindex_course(course_id):
+    if not search_index_available():
+        return
+
+    key = "rowid" if connection.vendor == "sqlite" else "course_id"
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {SEARCH_TABLE} WHERE {key} = %s", [course_id])
+
+# re-index every course of a teacher (e.g. when their name changes)
+def index_teacher_courses(teacher_id):
+    index_courses(CourseDetails.objects.filter(teacher_id=teacher_id).values_list('course_id', flat=True))
+
+# rebuild the whole index from the course and teacher tables, returning the number of courses indexed
+def rebuild_search_index():
+    if not search_index_available():
+        return 0
+
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {SEARCH_TABLE}")
+        if connection.vendor == "sqlite":
+            cursor.execute(f"INSERT INTO {SEARCH_TABLE} (rowid, content, instructor) {_SEARCH_TEXT_SQL}")
+        else:
+            cursor.execute(f"INSERT INTO {SEARCH_TABLE} (course_id, content, instructor) "
+                           f"SELECT course_id, to_tsvector('english', content), to_tsvector('simple', instructor) "
+                           f"FROM ({_SEARCH_TEXT_SQL}) AS t (course_id, content, instructor)")
+        return cursor.rowcount
+
+# filter a CourseDetails queryset to the courses matching the search terms
+# annotates 'search_rank' (higher is a better match) and orders the best matches first
+def search_courses(courses, descriptor="", instructor=""):
+    descriptor_terms, instructor_terms = _terms(descriptor), _terms(instructor)
+    if not descriptor_terms and not instructor_terms:
+        return courses.annotate(search_rank=Value(0.0, output_field=FloatField()))
+
+    if not search_index_available():
+        return _search_courses_without_index(courses, descriptor_terms, instructor_terms)
+
+    if connection.vendor == "sqlite":
+        query = " AND ".join(
+            [_fts_query("content", descriptor_terms)] * bool(descriptor_terms) +
+            [_fts_query("instructor", instructor_terms)] * bool(instructor_terms)
+        )
+        # matching courses are found with one full-text query, and each result's rank is then looked up by rowid
+        # (bm25 is negative, with the best matches lowest)
+        matches = RawSQL(f"SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s", [query])
+        rank = RawSQL(f"SELECT -bm25({SEARCH_TABLE}) FROM {SEARCH_TABLE} "
+                      f"WHERE {SEARCH_TABLE} MATCH %s AND rowid = webapp_coursedetails.course_id", [query],
+                      output_field=FloatField())
+    else:
+        conditions, params = [], []
+        for column, config, terms in (("content", "english", descriptor_terms), ("instructor", "simple", instructor_terms)):
+            if terms:
+                conditions.append((f"{column} @@ to_tsquery('{config}', %s)", f"ts_rank({column}, to_tsquery('{config}', %s))"))
+                params.append(_ts_query(terms))
+
+        where = " AND ".join(condition for condition, _ in conditions)
+        matches = RawSQL(f"SELECT course_id FROM {SEARCH_TABLE} WHERE {where}", params)
+        rank = RawSQL(f"SELECT {' + '.join(score for _, score in conditions)} FROM {SEARCH_TABLE} "
+                      f"WHERE course_id = webapp_coursedetails.course_id", params,
+                      output_field=FloatField())
+
+    return courses.filter(course_id__in=matches).annotate(search_rank=rank).order_by('-search_rank', 'course_id')
+
+# search with icontains filters (full table scans) on databases without a search index
+def _search_courses_without_index(courses, descriptor_terms, instructor_terms):
+    for term in descriptor_terms:
+        courses = courses.filter(Q(course_name__icontains=term) | Q(course_description__icontains=term))
+
+    for term in instructor_terms:
+        courses = courses.filter(Q(teacher__userinfo__first_name__icontains=term) |
+                                 Q(teacher__userinfo__middle_name__icontains=term) |
+                                 Q(teacher__userinfo__last_name__icontains=term))
+
+    return courses.annotate(search_rank=Value(0.0, output_field=FloatField())).order_by('course_id')
+
+# People search: trigram index of names.
+# Each word of a user's first, middle, last and display names is lower-cased and padded
+# ('jane' -> '  jane ') and split into trigrams ('  j', ' ja', 'jan', 'ane', 'ne '), stored in the NameGram table.
+# A name contains a search term only if it has all of the term's trigrams,
+# so the index narrows a search down to a few candidates, which are then checked against the names themselves.
+# The index is kept up to date by the signals in signals.py.
+
+NAME_FIELDS = ("first_name", "middle_name", "last_name", "display_name")
+
+# trigrams of each word of a text
+# pad_start/pad_end add the padding at the start/end of each word (so that trigrams also match word boundaries)
+def name_grams(text, pad_start=True, pad_end=True):
+    grams = set()
+    for word in re.findall(r"\w+", (text or "").lower()):
+        padded = "  " * pad_start + word + " " * pad_end
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+# replace the trigrams of a user's names
+def index_user_names(user_info):
+    grams = set()
+    for field in NAME_FIELDS:
+        grams |= name_grams(getattr(user_info, field))
+
+    NameGram.objects.filter(user_info=user_info).delete()
+    NameGram.objects.bulk_create([NameGram(user_info=user_info, gram=gram, user_type=user_info.user_type) for gram in grams])
+
+# rebuild the trigrams of every user, returning the number of users indexed
+def rebuild_name_index():
+    NameGram.objects.all().delete()
+    count = 0
+    for user_info in UserInfo.objects.iterator():
+        index_user_names(user_info)
+        count += 1
+    return count
+
+# ids of the users whose names have all of the given trigrams (optionally of one user type)
+def _users_with_grams(grams, user_type=None):
+    index = NameGram.objects.filter(gram__in=grams)
+    if user_type:
+        index = index.filter(user_type=user_type)
+
+    return index.values('user_info').annotate(hits=Count('gram')).filter(hits=len(grams)).values('user_info')
+
+# filter a UserInfo queryset to the users with a name containing the search text (case-insensitive)
+def search_people(people, name):
+    # terms shorter than 3 characters have no trigrams without padding, so they are only checked against the names
+    grams = set()
+    for term in name.split():
+        grams |= name_grams(term, pad_start=False, pad_end=False)
+    if grams:
+        people = people.filter(id__in=_users_with_grams(grams))
+
+    return people.filter(Q(first_name__icontains=name) |
+                         Q(middle_name__icontains=name) |
+                         Q(last_name__icontains=name) |
+                         Q(display_name__icontains=name))
+
+# get the top matches for a partly typed name, for autocomplete
+# each word typed must be the start of a word of the user's names (e.g. 'ja do' matches 'Jane Doe')
+def autocomplete_people(query, user_type=None, limit=10):
+    terms = re.findall(r"\w+", query.lower())
+    if not terms:
+        return []
+
+    grams = set()
+    for term in terms:
+        grams |= name_grams(term, pad_end=False)
+
+    # candidates are ranked in the database (names starting with the query first, then alphabetically)
+    # and read in that order until there are enough matches, as some may have the trigrams without a matching word start
+    candidates = UserInfo.objects.filter(id__in=_users_with_grams(grams, user_type)).order_by(
+        Case(When(display_name__istartswith=query, then=Value(0)), default=Value(1)),
+        Lower('first_name'), Lower('last_name'), 'id',
+    )
+
+    matches = []
+    for person in candidates.iterator(chunk_size=limit * 3):
+        words = set()
+        for field in NAME_FIELDS:
+            words.update(re.findall(r"\w+", getattr(person, field).lower()))
+        if all(any(word.startswith(term) for word in words) for term in terms):
+            matches.append(person)
+            if len(matches) == limit:
+                break
+    return matches
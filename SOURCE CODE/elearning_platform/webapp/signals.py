@@ -0,0 +1,90 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .dashboard import invalidate_homepage, invalidate_course_homepages
+from .models import UserInfo, CourseDetails, LessonDetails, MaterialUpload, AssignmentUpload, CourseEnrollments, AssignmentSubmission, Notification
+from .notifications import increment_unread_count, invalidate_unread_counts, push_notification, notification_payload, USER_GROUP
+from .outline import invalidate_course_outline
+from .search import index_courses, unindex_course, index_teacher_courses, index_user_names
+
+# Signal handlers that keep caches and indexes in line with the rows they are built from.
+
+# Cached pages are invalidated when the rows shown on them change.
+# The cache is invalidated straight away and again once the transaction commits,
+# in case the page was cached again from the old data while the transaction was open.
+# Note that QuerySet.update() does not send signals, so views using it invalidate the cache themselves.
+
+# a student's enrollments and submissions are only shown on their own homepage
+@receiver([post_save, post_delete], sender=CourseEnrollments)
+@receiver([post_save, post_delete], sender=AssignmentSubmission)
+def student_data_changed(sender, instance, **kwargs):
+    invalidate_homepage(instance.student_id)
+    transaction.on_commit(lambda: invalidate_homepage(instance.student_id))
+
+# assignments and course details are shown to every student in the course
+# (a deleted course's students are invalidated when their enrollments are deleted along with it)
+@receiver([post_save, post_delete], sender=CourseDetails)
+@receiver(post_delete, sender=LessonDetails)
+def course_data_changed(sender, instance, **kwargs):
+    invalidate_course_homepages(instance.course_id)
+    transaction.on_commit(lambda: invalidate_course_homepages(instance.course_id))
+
+@receiver([post_save, post_delete], sender=AssignmentUpload)
+def assignment_changed(sender, instance, **kwargs):
+    if instance.lesson_id is None:
+        return
+    try:
+        course_id = instance.lesson.course_id
+    except LessonDetails.DoesNotExist:
+        return # the lesson has been deleted as well, which invalidates the homepages itself
+    invalidate_course_homepages(course_id)
+    transaction.on_commit(lambda: invalidate_course_homepages(course_id))
+
+# a course's outline holds its lessons, materials and assignments
+@receiver([post_save, post_delete], sender=LessonDetails)
+def lesson_changed(sender, instance, **kwargs):
+    invalidate_course_outline(instance.course_id)
+    transaction.on_commit(lambda: invalidate_course_outline(instance.course_id))
+
+@receiver([post_save, post_delete], sender=MaterialUpload)
+@receiver([post_save, post_delete], sender=AssignmentUpload)
+def lesson_item_changed(sender, instance, **kwargs):
+    try:
+        course_id = instance.lesson.course_id
+    except LessonDetails.DoesNotExist:
+        return # the lesson has been deleted as well, which invalidates the outline itself
+    invalidate_course_outline(course_id)
+    transaction.on_commit(lambda: invalidate_course_outline(course_id))
+
+# the course search index holds each course's name, description and teacher names
+@receiver(post_save, sender=CourseDetails)
+def course_saved(sender, instance, **kwargs):
+    index_courses([instance.course_id])
+
+@receiver(post_delete, sender=CourseDetails)
+def course_deleted(sender, instance, **kwargs):
+    unindex_course(instance.course_id)
+
+@receiver([post_save, post_delete], sender=UserInfo)
+def user_info_changed(sender, instance, **kwargs):
+    if instance.user_type == "teacher":
+        index_teacher_courses(instance.user_id)
+
+# the people search index holds the trigrams of each user's names
+@receiver(post_save, sender=UserInfo)
+def user_info_saved(sender, instance, **kwargs):
+    index_user_names(instance)
+
+# the cached unread counts of each user, and the pages they have open
+# (bulk inserts clear the counts and push the notifications themselves, see notifications.py)
+@receiver(post_save, sender=Notification)
+def notification_saved(sender, instance, created, **kwargs):
+    if created and not instance.is_read:
+        transaction.on_commit(lambda: increment_unread_count(instance.user_id, instance.notif_type))
+        transaction.on_commit(lambda: push_notification(USER_GROUP.format(user_id=instance.user_id),
+                                                        notification_payload(instance.message, instance.notif_type, instance.created_at)))
+
+@receiver(post_delete, sender=Notification)
+def notification_deleted(sender, instance, **kwargs):
+    if not instance.is_read:
+        transaction.on_commit(lambda: invalidate_unread_counts([instance.user_id]))
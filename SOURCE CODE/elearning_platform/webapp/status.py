@@ -0,0 +1,113 @@
+from datetime import timedelta
+from django.core.cache import cache
+from django.db.models import Min
+from django.utils import timezone
+from redis.exceptions import RedisError
+from .models import AssignmentUpload, AssignmentSubmission, MeetingDetails, meeting_end_expression
+import logging
+
+# Set-based status maintenance for assignments and meetings.
+# Each sweep issues a handful of UPDATE ... WHERE statements instead of
+# loading and saving rows one at a time, so it is cheap enough to run on a schedule.
+
+STATUS_SWEEP_JOB = "sweep-statuses" # name of the sweep's cluster-wide lease (see locks.py)
+NEXT_TRANSITION_CACHE_KEY = "status:next-transition"
+MAX_TRANSITION_WAIT = timedelta(hours=1) # re-check at least this often, in case of edits made outside the views
+
+logger = logging.getLogger(__name__)
+
+# close assignments whose deadline has passed and mark their pending submissions as overdue
+def sweep_assignments(now=None):
+    now = now or timezone.now()
+
+    closed = AssignmentUpload.objects.filter(assignment_status=True, deadline__lt=now) \
+                                     .update(assignment_status=False)
+
+    overdue = AssignmentSubmission.objects.filter(submission_status="due", assignment__deadline__lt=now) \
+                                          .update(submission_status="overdue")
+
+    return {"assignments_closed": closed, "submissions_overdue": overdue}
+
+# open meetings that have started and expire meetings that have run past their duration
+def sweep_meetings(now=None):
+    now = now or timezone.now()
+    meetings = MeetingDetails.objects.alias(end_datetime=meeting_end_expression())
+
+    # closed or open meetings whose end time has passed are expired
+    # (this also catches closed meetings that were never opened in time)
+    expired = meetings.filter(meeting_status__in=["closed", "open"], end_datetime__lt=now) \
+                      .update(meeting_status="expired")
+
+    # closed meetings that are currently within their scheduled window are opened
+    opened = meetings.filter(meeting_status="closed", start_datetime__lte=now, end_datetime__gte=now) \
+                     .update(meeting_status="open")
+
+    return {"meetings_opened": opened, "meetings_expired": expired}
+
+# open a single meeting if it is still closed and its scheduled window has started
+# start_datetime and duration_minutes are the values the transition was scheduled for,
+# so a meeting that has since been rescheduled, ended or expired is left untouched
+def open_meeting(meeting_id, start_datetime, duration_minutes, now=None):
+    now = now or timezone.now()
+    return MeetingDetails.objects.alias(end_datetime=meeting_end_expression()) \
+                                 .filter(meeting_id=meeting_id, meeting_status="closed",
+                                         start_datetime=start_datetime, duration_minutes=duration_minutes,
+                                         start_datetime__lte=now, end_datetime__gte=now) \
+                                 .update(meeting_status="open")
+
+# expire a single meeting once its scheduled window has ended (same rules as open_meeting)
+def expire_meeting(meeting_id, start_datetime, duration_minutes, now=None):
+    now = now or timezone.now()
+    return MeetingDetails.objects.alias(end_datetime=meeting_end_expression()) \
+                                 .filter(meeting_id=meeting_id, meeting_status__in=["closed", "open"],
+                                         start_datetime=start_datetime, duration_minutes=duration_minutes,
+                                         end_datetime__lte=now) \
+                                 .update(meeting_status="expired")
+
+# run every status sweep, returning the number of rows changed by each statement
+def sweep_statuses(now=None):
+    now = now or timezone.now()
+    return {**sweep_assignments(now), **sweep_meetings(now)}
+
+# earliest future time at which a sweep could change anything:
+# the next assignment deadline, meeting start time or meeting end time
+def next_transition_time(now=None):
+    now = now or timezone.now()
+
+    next_deadline = AssignmentUpload.objects.filter(deadline__gte=now).aggregate(t=Min('deadline'))['t']
+    next_start = MeetingDetails.objects.filter(meeting_status="closed", start_datetime__gte=now) \
+                                       .aggregate(t=Min('start_datetime'))['t']
+    next_end = MeetingDetails.objects.filter(meeting_status__in=["closed", "open"]) \
+                                     .annotate(end_datetime=meeting_end_expression()) \
+                                     .filter(end_datetime__gte=now) \
+                                     .aggregate(t=Min('end_datetime'))['t']
+
+    return min([t for t in (next_deadline, next_start, next_end) if t] + [now + MAX_TRANSITION_WAIT])
+
+# check whether the cached next transition time has been reached (no database access)
+# if the cache is unavailable the transition is treated as due
+def transition_due(now=None):
+    now = now or timezone.now()
+    try:
+        next_transition = cache.get(NEXT_TRANSITION_CACHE_KEY)
+    except RedisError as e:
+        logger.warning("Could not read the next transition time: %s", e)
+        return True
+    return next_transition is None or now >= next_transition
+
+# recompute and cache the next transition time
+def schedule_next_transition(now=None):
+    next_transition = next_transition_time(now)
+    try:
+        cache.set(NEXT_TRANSITION_CACHE_KEY, next_transition, timeout=None)
+    except RedisError as e:
+        logger.warning("Could not cache the next transition time: %s", e)
+    return next_transition
+
+# clear the cached next transition time
+# must be called whenever an assignment deadline or meeting time is created or changed
+def invalidate_next_transition():
+    try:
+        cache.delete(NEXT_TRANSITION_CACHE_KEY)
+    except RedisError as e:
+        logger.warning("Could not clear the next transition time: %s", e)
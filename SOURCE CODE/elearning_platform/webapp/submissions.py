@@ -0,0 +1,79 @@
+from django.conf import settings
+from django.core.cache import cache
+from redis.exceptions import RedisError
+from .dashboard import invalidate_homepage
+from .models import AssignmentSubmission, CourseEnrollments
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Submission rows of a new assignment, one per student of its course (with the default 'due' status).
+# They are created with bulk_create in batches of SUBMISSION_BATCH_SIZE, reading the students' ids one batch at a time.
+# Courses with more than SUBMISSION_TASK_THRESHOLD students have them created by a background task
+# (create_submissions_task, see tasks.py), which records its progress in the cache for the teacher's course page:
+#   {"created": number of rows created so far, "total": number of rows to create, "done": whether it has finished}
+
+PROGRESS_KEY = "submissions:progress:{assign_id}"
+
+# ids of the assignment's course's students who do not have a submission row for it yet
+def missing_students(assignment):
+    return (CourseEnrollments.objects.filter(course_id=assignment.lesson.course_id)
+            .exclude(student_id__in=AssignmentSubmission.objects.filter(assignment=assignment).values('student_id'))
+            .values_list('student_id', flat=True).distinct().order_by('student_id'))
+
+# number of students of the assignment's course (who each need a submission row)
+def count_course_students(assignment):
+    return CourseEnrollments.objects.filter(course_id=assignment.lesson.course_id).values('student_id').distinct().count()
+
+# split an ordered queryset of student ids into lists of batch_size ids
+# each batch continues after the last id of the previous one, so rows created in between do not shift the batches
+def _batches(student_ids, batch_size):
+    last_id = None
+    while True:
+        batch = list((student_ids if last_id is None else student_ids.filter(student_id__gt=last_id))[:batch_size])
+        if not batch:
+            return
+        yield batch
+        last_id = batch[-1]
+
+# create the missing submission rows of an assignment, returning the number created
+# safe to run again (e.g. if a task is retried), as students who already have a row are skipped
+# if track_progress is True, the progress is recorded in the cache after each batch
+def create_assignment_submissions(assignment, batch_size=None, track_progress=False):
+    batch_size = batch_size or settings.SUBMISSION_BATCH_SIZE
+    student_ids = missing_students(assignment)
+    total = student_ids.count() if track_progress else None
+
+    created = 0
+    for batch in _batches(student_ids, batch_size):
+        AssignmentSubmission.objects.bulk_create([AssignmentSubmission(assignment=assignment, student_id=student_id)
+                                                  for student_id in batch])
+        created += len(batch)
+        # bulk_create does not send signals, so the students' homepages are invalidated here
+        invalidate_homepage(*batch)
+        if track_progress:
+            set_submission_progress(assignment.assign_id, created, max(created, total))
+
+    if track_progress:
+        set_submission_progress(assignment.assign_id, created, max(created, total), done=True)
+
+    return created
+
+# record the progress of an assignment's submission rows being created
+# a finished record is never replaced by an unfinished one (e.g. a late write of the starting progress)
+def set_submission_progress(assign_id, created, total, done=False):
+    try:
+        if not done and (get_submission_progress(assign_id) or {}).get("done"):
+            return
+        cache.set(PROGRESS_KEY.format(assign_id=assign_id), {"created": created, "total": total, "done": done},
+                  settings.SUBMISSION_PROGRESS_TIMEOUT)
+    except RedisError as e:
+        logger.warning("Could not record the submission progress: %s", e)
+
+# get the progress of an assignment's submission rows being created (None if unknown, e.g. expired)
+def get_submission_progress(assign_id):
+    try:
+        return cache.get(PROGRESS_KEY.format(assign_id=assign_id))
+    except RedisError as e:
+        logger.warning("Could not read the submission progress: %s", e)
+        return None
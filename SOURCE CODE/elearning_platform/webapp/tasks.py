@@ -1,12 +1,24 @@
 from celery import Celery, shared_task
 from celery.utils.log import get_task_logger
+from datetime import timedelta
+from kombu.exceptions import OperationalError
 import os, django
-import sendgrid
-from sendgrid.helpers.mail import Mail
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "elearning_platform.settings")
 django.setup()
 
+from django.conf import settings
+from django.db import transaction
+from django.utils.dateparse import parse_datetime
+from .digests import EMAIL_DIGEST_JOB, queue_email_digests
+from .locks import maintenance_lease
+from .mail import get_transport
+from .models import AssignmentUpload
+from .notifications import COURSE_MEMBER_STATUSES, NOTIFICATION_ARCHIVE_JOB, notify_course, archive_old_notifications
+from .outbox import dispatch_outbox
+from .status import STATUS_SWEEP_JOB, sweep_statuses, open_meeting, expire_meeting
+from .submissions import create_assignment_submissions, set_submission_progress
+
 # initialize celery
 celery_app = Celery("webapp")
 celery_app.config_from_object("django.conf:settings", namespace="CELERY")
@@ -14,26 +26,117 @@ celery_app.config_from_object("django.conf:settings", namespace="CELERY")
 logger = get_task_logger(__name__)
 logger.info("This is a Celery task log")
 
-# asynchronous task to send an email
-@shared_task(max_retries=0)
-def async_send_email(customer_email, email_subject, statement):
-    
-    # create the email message using SendGrid's Mail object
-    message = Mail(from_email='charu.sgp@gmail.com',
-                   to_emails='charu.sgp@gmail.com', # customer_email not used due to Sendgrid's rules
-                   subject=email_subject,
-                   html_content=statement)
-    
+# periodic task to queue one email for each user with their pending email alerts (see digests.py)
+# skipped if another process has already queued the digests in this interval
+@shared_task(ignore_result=True)
+def send_email_digests_task():
+    with maintenance_lease(EMAIL_DIGEST_JOB, settings.EMAIL_DIGEST_INTERVAL) as acquired:
+        if not acquired:
+            return None
+
+        count = queue_email_digests()
+        logger.info("Queued %s email digests", count)
+        return count
+
+# periodic task to send the emails in the email outbox (see outbox.py)
+# several workers can run it at once, as each claims different emails
+@shared_task(ignore_result=True)
+def dispatch_email_outbox_task():
+    count = dispatch_outbox(get_transport().send_many)
+    if count:
+        logger.info("Sent %s emails from the outbox", count)
+    return count
+
+# periodic task to move overdue assignments and open/expired meetings to their new status
+# skipped if another process has already run the sweep in this interval
+@shared_task(ignore_result=True)
+def sweep_statuses_task():
+    with maintenance_lease(STATUS_SWEEP_JOB, settings.STATUS_SWEEP_INTERVAL) as acquired:
+        if not acquired:
+            return None
+
+        changes = sweep_statuses()
+        logger.info("Status sweep: %s", changes)
+        return changes
+
+# periodic task to move old notifications to the archive table
+# skipped if another process has already run it in this interval
+@shared_task(ignore_result=True)
+def archive_notifications_task():
+    with maintenance_lease(NOTIFICATION_ARCHIVE_JOB, settings.NOTIFICATION_ARCHIVE_INTERVAL) as acquired:
+        if not acquired:
+            return None
+
+        count = archive_old_notifications()
+        logger.info("Archived %s notifications", count)
+        return count
+
+# task to open a meeting at its start time (scheduled with an ETA)
+@shared_task(ignore_result=True)
+def open_meeting_task(meeting_id, start_datetime, duration_minutes):
+    return open_meeting(meeting_id, parse_datetime(start_datetime), duration_minutes)
+
+# task to expire a meeting at its end time (scheduled with an ETA)
+@shared_task(ignore_result=True)
+def expire_meeting_task(meeting_id, start_datetime, duration_minutes):
+    return expire_meeting(meeting_id, parse_datetime(start_datetime), duration_minutes)
+
+# schedule the open and expire tasks of a meeting for its exact start and end times
+# both tasks check the meeting's current status and times, so it is safe to call again after rescheduling
+# if the broker is unavailable, the periodic status sweep still updates the meeting
+def schedule_meeting_status_tasks(meeting):
+    args = [meeting.meeting_id, meeting.start_datetime.isoformat(), meeting.duration_minutes]
+    end_datetime = meeting.start_datetime + timedelta(minutes=meeting.duration_minutes)
+
+    try:
+        open_meeting_task.apply_async(args=args, eta=meeting.start_datetime)
+        expire_meeting_task.apply_async(args=args, eta=end_datetime)
+    except OperationalError as e:
+        logger.warning("Could not schedule status tasks for meeting %s: %s", meeting.meeting_id, e)
+
+# task to send a notification to every student of a course (see notifications.py)
+@shared_task(ignore_result=True)
+def fanout_course_notification(course_id, message, notif_type, exclude_user=None, statuses=COURSE_MEMBER_STATUSES):
+    count = notify_course(course_id, message, notif_type, exclude_user, statuses)
+    logger.info("Created %s '%s' notifications or events for course %s", count, notif_type, course_id)
+    return count
+
+# enqueue fanout_course_notification once the current transaction commits (so the task sees the new rows)
+# if the broker is unavailable, the notifications are sent straight away instead
+def enqueue_course_notification(course_id, message, notif_type, exclude_user=None, statuses=COURSE_MEMBER_STATUSES):
+    def enqueue():
+        try:
+            fanout_course_notification.delay(course_id, message, notif_type, exclude_user, statuses)
+        except OperationalError as e:
+            logger.warning("Could not enqueue notifications for course %s, sending them now: %s", course_id, e)
+            notify_course(course_id, message, notif_type, exclude_user, statuses)
+
+    transaction.on_commit(enqueue)
+
+# task to create the submission rows of a new assignment in a large course (see submissions.py)
+@shared_task(ignore_result=True)
+def create_submissions_task(assign_id):
     try:
-        # initialise the SendGrid client with the API key
-        sg = sendgrid.SendGridAPIClient(api_key='SENDGRID_API_KEY_HERE')
-        
-        # send the email message using SendGrid's send method
-        response = sg.send(message)
-
-        print(response.status_code, response.body, response.headers)
-    
-    # catch any exceptions and print the error message
-    except Exception as e:
-        print(str(e))
-        
\ No newline at end of file
+        assignment = AssignmentUpload.objects.select_related('lesson').get(assign_id=assign_id)
+    except AssignmentUpload.DoesNotExist: # deleted before the task ran
+        set_submission_progress(assign_id, 0, 0, done=True)
+        return 0
+
+    count = create_assignment_submissions(assignment, track_progress=True)
+    logger.info("Created %s submissions for assignment %s", count, assign_id)
+    return count
+
+# enqueue create_submissions_task once the current transaction commits (so the task sees the new assignment)
+# if the broker is unavailable, the rows are created straight away instead
+# the starting progress (none of total rows created) is recorded first, so it never replaces the task's own progress
+def enqueue_assignment_submissions(assignment, total):
+    set_submission_progress(assignment.assign_id, 0, total)
+
+    def enqueue():
+        try:
+            create_submissions_task.delay(assignment.assign_id)
+        except OperationalError as e:
+            logger.warning("Could not enqueue submissions for assignment %s, creating them now: %s", assignment.assign_id, e)
+            create_assignment_submissions(assignment, track_progress=True)
+
+    transaction.on_commit(enqueue)
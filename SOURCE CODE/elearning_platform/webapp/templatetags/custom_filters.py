@@ -43,10 +43,3 @@ def get_s(submissions, key):
         return submissions.get(key, None)  # returns None if the key doesn't exist
     return None
 
-# filter to check if a deadline is still in the future
-@register.filter(name='get_time')
-def get_time(deadline):
-    if deadline > timezone.now():
-        return True
-    else:
-        return False
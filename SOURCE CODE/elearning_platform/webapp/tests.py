@@ -1,18 +1,54 @@
-from django.test import TestCase
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
+from django.core.cache import cache
+from unittest import mock
+from redis.exceptions import RedisError
+from kombu.exceptions import OperationalError
 from django.db import IntegrityError
 from django.urls import reverse
-from django.contrib.auth.models import User
+from django.http import QueryDict
+from django.contrib.auth.models import User, AnonymousUser
+from asgiref.sync import async_to_sync
+from channels.db import database_sync_to_async
+from channels.testing import WebsocketCommunicator
+from elearning_platform.consumers import NotificationConsumer
 from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+import io, json, re, requests, shutil, tempfile
 from .forms import *
 from .models import * 
+from .status import *
+from .dashboard import *
+from .deadlines import *
+from .search import *
+from .pagination import *
+from .outline import *
+from .progress import *
+from .notifications import *
+from .digests import *
+from .mail import *
+from .outbox import *
+from .submissions import *
+from .tasks import *
 
 # Create your tests here.
 
+# makes the deadline index (in Redis) unavailable for the rest of a test, without trying to connect to a server,
+# so the views fall back to the database as they do when Redis is down (without logging a warning each time)
+def without_deadline_index(test_case):
+    for patcher in (mock.patch('webapp.deadlines.get_redis', side_effect=RedisError("Redis is not available in tests")),
+                    mock.patch('webapp.deadlines.logger')):
+        patcher.start()
+        test_case.addCleanup(patcher.stop)
+
 ################# UNIT TESTS FOR DECORATORS & AUTHENTICATION #################
 class DecoratorTests(TestCase):
     
     # set up 2 test users (1 student and teacher)
     def setUp(self):
+        without_deadline_index(self)
         self.student_user = User.objects.create_user(username='student', password='password')
         self.student_info = UserInfo.objects.create(user=self.student_user,
                                                     user_type='student',
@@ -671,3 +707,1959 @@ class DeclineMeetingReqTest(TestCase):
     def test_invalid_decline_meeting_req_form(self):
         form = DeclineMeetingReq(data={'description': ''})
         self.assertFalse(form.is_valid())
+
+
+################# UNIT TESTS FOR STATUS UPDATES #################
+
+# test the scheduled assignment and meeting status sweep
+class StatusSweepTests(TestCase):
+
+    # set up dummy data
+    def setUp(self):
+        self.teacher = User.objects.create_user(username='teacher', password='password')
+        UserInfo.objects.create(user=self.teacher, user_type='teacher', first_name='Jane', last_name='Doe', email='janedoe@gmail.com')
+        self.student = User.objects.create_user(username='student', password='password')
+        UserInfo.objects.create(user=self.student, user_type='student', first_name='John', last_name='Doe', email='johndoe@gmail.com')
+
+        course = CourseDetails.objects.create(teacher=self.teacher, course_name="Math 101", course_description="Introduction to Mathematics")
+        lesson = LessonDetails.objects.create(course=course, lesson_title="Algebra", lesson_description="Basic Algebra")
+        self.assignment = AssignmentUpload.objects.create(lesson=lesson, name="Assignment 1", deadline=timezone.now() + timezone.timedelta(days=1))
+        self.submission = AssignmentSubmission.objects.create(assignment=self.assignment, student=self.student)
+
+        self.request_meeting = RequestMeeting.objects.create(student=self.student, teacher=self.teacher, status="accepted")
+        self.meeting = MeetingDetails.objects.create(request=self.request_meeting,
+                                                     start_datetime=timezone.now() + timezone.timedelta(days=1),
+                                                     duration_minutes=30)
+
+    # test that nothing changes before any deadline or meeting time is reached
+    def test_sweep_before_transitions(self):
+        changes = sweep_statuses()
+        self.assertEqual(sum(changes.values()), 0)
+        self.meeting.refresh_from_db()
+        self.assertEqual(self.meeting.meeting_status, "closed")
+
+    # test that assignments past their deadline are closed and pending submissions marked overdue
+    def test_sweep_overdue_assignments(self):
+        AssignmentUpload.objects.filter(pk=self.assignment.pk).update(deadline=timezone.now() - timezone.timedelta(hours=1))
+        sweep_statuses()
+
+        self.assignment.refresh_from_db()
+        self.submission.refresh_from_db()
+        self.assertFalse(self.assignment.assignment_status)
+        self.assertEqual(self.submission.submission_status, "overdue")
+
+    # test that submitted assignments are not marked overdue
+    def test_sweep_keeps_submitted_assignments(self):
+        AssignmentSubmission.objects.filter(pk=self.submission.pk).update(submission_status="submitted")
+        AssignmentUpload.objects.filter(pk=self.assignment.pk).update(deadline=timezone.now() - timezone.timedelta(hours=1))
+        sweep_statuses()
+
+        self.submission.refresh_from_db()
+        self.assertEqual(self.submission.submission_status, "submitted")
+
+    # test that meetings are opened during their scheduled window
+    def test_sweep_opens_meeting(self):
+        MeetingDetails.objects.filter(pk=self.meeting.pk).update(start_datetime=timezone.now() - timezone.timedelta(minutes=10))
+        sweep_statuses()
+
+        self.meeting.refresh_from_db()
+        self.assertEqual(self.meeting.meeting_status, "open")
+
+    # test that open and never-opened meetings are expired after their duration
+    def test_sweep_expires_meetings(self):
+        MeetingDetails.objects.filter(pk=self.meeting.pk).update(start_datetime=timezone.now() - timezone.timedelta(hours=1))
+        sweep_statuses()
+
+        self.meeting.refresh_from_db()
+        self.assertEqual(self.meeting.meeting_status, "expired")
+
+# test the cached "next transition time" gate used by the status middleware
+class TransitionGateTests(TestCase):
+
+    # set up dummy data
+    def setUp(self):
+        cache.clear()
+        teacher = User.objects.create_user(username='teacher', password='password')
+        UserInfo.objects.create(user=teacher, user_type='teacher', first_name='Jane', last_name='Doe', email='janedoe@gmail.com')
+        student = User.objects.create_user(username='student', password='password')
+        UserInfo.objects.create(user=student, user_type='student', first_name='John', last_name='Doe', email='johndoe@gmail.com')
+
+        course = CourseDetails.objects.create(teacher=teacher, course_name="Math 101", course_description="Introduction to Mathematics")
+        self.lesson = LessonDetails.objects.create(course=course, lesson_title="Algebra", lesson_description="Basic Algebra")
+        self.deadline = timezone.now() + timezone.timedelta(minutes=30)
+        AssignmentUpload.objects.create(lesson=self.lesson, name="Assignment 1", deadline=self.deadline)
+
+        request_meeting = RequestMeeting.objects.create(student=student, teacher=teacher, status="accepted")
+        self.meeting_start = timezone.now() + timezone.timedelta(minutes=10)
+        MeetingDetails.objects.create(request=request_meeting, start_datetime=self.meeting_start, duration_minutes=30)
+
+    # test that the earliest deadline, meeting start or meeting end is chosen
+    def test_next_transition_time(self):
+        self.assertEqual(next_transition_time(), self.meeting_start)
+
+        MeetingDetails.objects.update(meeting_status="open")
+        self.assertEqual(next_transition_time(), self.deadline)
+
+    # test that checks before the next transition do not touch the database
+    def test_gate_skips_until_transition(self):
+        self.assertTrue(transition_due())
+        schedule_next_transition()
+
+        with self.assertNumQueries(0):
+            self.assertFalse(transition_due())
+
+        self.assertTrue(transition_due(now=self.meeting_start))
+
+    # test that invalidating the cached time forces a new check
+    def test_invalidate_next_transition(self):
+        schedule_next_transition()
+        invalidate_next_transition()
+        self.assertTrue(transition_due())
+
+    # test that the middleware only sweeps when a transition is due
+    @override_settings(STATUS_SWEEP_ON_REQUEST=True)
+    def test_middleware_uses_gate(self):
+        with mock.patch('webapp.locks.get_redis', return_value=mock.MagicMock()):
+            self.client.get(reverse('login'))
+        self.assertEqual(cache.get(NEXT_TRANSITION_CACHE_KEY), self.meeting_start)
+
+        with self.assertNumQueries(0):
+            self.client.get(reverse('login'))
+
+    # test that a process that does not get the lease waits before asking for it again
+    @override_settings(STATUS_SWEEP_ON_REQUEST=True, STATUS_SWEEP_RETRY_DELAY=5)
+    def test_middleware_backs_off_without_lease(self):
+        lease = mock.MagicMock()
+        lease.return_value.__enter__.return_value = False
+        with mock.patch('webapp.middleware.maintenance_lease', lease):
+            self.client.get(reverse('login'))
+            self.client.get(reverse('login'))
+            self.assertEqual(lease.call_count, 1)
+
+            with mock.patch('webapp.middleware.timezone.now', return_value=timezone.now() + timezone.timedelta(seconds=6)):
+                self.client.get(reverse('login'))
+            self.assertEqual(lease.call_count, 2)
+        self.assertIsNone(cache.get(NEXT_TRANSITION_CACHE_KEY)) # still due, as no sweep has run
+
+# test the per-meeting open/expire tasks scheduled when a meeting is accepted
+class MeetingStatusTaskTests(TestCase):
+
+    # set up dummy data
+    def setUp(self):
+        self.teacher = User.objects.create_user(username='teacher', password='password')
+        UserInfo.objects.create(user=self.teacher, user_type='teacher', first_name='Jane', last_name='Doe', email='janedoe@gmail.com')
+        student = User.objects.create_user(username='student', password='password')
+        UserInfo.objects.create(user=student, user_type='student', first_name='John', last_name='Doe', email='johndoe@gmail.com')
+
+        self.request_meeting = RequestMeeting.objects.create(student=student, teacher=self.teacher, req_description="Help")
+        self.start = timezone.now() + timezone.timedelta(hours=1)
+        self.end = self.start + timezone.timedelta(minutes=30)
+        self.meeting = MeetingDetails.objects.create(request=self.request_meeting, start_datetime=self.start, duration_minutes=30)
+
+    # test that a meeting is only opened once its start time is reached
+    def test_open_meeting(self):
+        self.assertEqual(open_meeting(self.meeting.meeting_id, self.start, 30), 0)
+        self.assertEqual(open_meeting(self.meeting.meeting_id, self.start, 30, now=self.start), 1)
+        self.assertEqual(open_meeting(self.meeting.meeting_id, self.start, 30, now=self.start), 0)  # idempotent
+
+        self.meeting.refresh_from_db()
+        self.assertEqual(self.meeting.meeting_status, "open")
+
+    # test that a meeting is expired once its end time is reached
+    def test_expire_meeting(self):
+        self.assertEqual(expire_meeting(self.meeting.meeting_id, self.start, 30, now=self.start), 0)
+        self.assertEqual(expire_meeting(self.meeting.meeting_id, self.start, 30, now=self.end), 1)
+
+        self.meeting.refresh_from_db()
+        self.assertEqual(self.meeting.meeting_status, "expired")
+
+    # test that tasks scheduled for an old start time do nothing after the meeting is rescheduled
+    def test_rescheduled_meeting_ignored(self):
+        new_start = self.start + timezone.timedelta(days=1)
+        MeetingDetails.objects.filter(pk=self.meeting.pk).update(start_datetime=new_start)
+
+        self.assertEqual(open_meeting(self.meeting.meeting_id, self.start, 30, now=self.start), 0)
+        self.assertEqual(expire_meeting(self.meeting.meeting_id, self.start, 30, now=self.end), 0)
+
+    # test that a meeting ended manually is not re-opened
+    def test_ended_meeting_not_reopened(self):
+        MeetingDetails.objects.filter(pk=self.meeting.pk).update(meeting_status="expired")
+        self.assertEqual(open_meeting(self.meeting.meeting_id, self.start, 30, now=self.start), 0)
+
+    # test that accepting a request schedules both tasks at the meeting's start and end times
+    def test_accept_schedules_tasks(self):
+        self.client.login(username='teacher', password='password')
+        start = (timezone.now() + timezone.timedelta(days=2)).replace(second=0, microsecond=0)
+
+        with mock.patch.object(open_meeting_task, 'apply_async') as open_task, \
+             mock.patch.object(expire_meeting_task, 'apply_async') as expire_task, \
+             self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('teacher-manage-meetings'), {'request_id': self.request_meeting.request_id,
+                                                                  'action': 'Accept',
+                                                                  'start_datetime': start.strftime('%Y-%m-%dT%H:%M'),
+                                                                  'duration_minutes': 20})
+
+        meeting = MeetingDetails.objects.get(request=self.request_meeting, start_datetime=start)
+        self.assertEqual(open_task.call_args.kwargs['eta'], start)
+        self.assertEqual(expire_task.call_args.kwargs['eta'], start + timezone.timedelta(minutes=20))
+        self.assertEqual(open_task.call_args.kwargs['args'], [meeting.meeting_id, start.isoformat(), 20])
+
+# test the statuses computed at query time
+class ComputedStatusTests(TestCase):
+
+    # set up dummy data
+    def setUp(self):
+        without_deadline_index(self)
+        cache.clear()
+        teacher = User.objects.create_user(username='teacher', password='password')
+        UserInfo.objects.create(user=teacher, user_type='teacher', first_name='Jane', last_name='Doe', email='janedoe@gmail.com')
+        self.student = User.objects.create_user(username='student', password='password')
+        UserInfo.objects.create(user=self.student, user_type='student', first_name='John', last_name='Doe', email='johndoe@gmail.com')
+
+        self.course = CourseDetails.objects.create(teacher=teacher, course_name="Math 101", course_description="Introduction to Mathematics")
+        CourseEnrollments.objects.create(course=self.course, student=self.student, enrollment_status="enrolled")
+        lesson = LessonDetails.objects.create(course=self.course, lesson_title="Algebra", lesson_description="Basic Algebra")
+        self.assignment = AssignmentUpload.objects.create(lesson=lesson, name="Assignment 1", deadline=timezone.now() + timezone.timedelta(days=1))
+        self.submission = AssignmentSubmission.objects.create(assignment=self.assignment, student=self.student)
+
+        request_meeting = RequestMeeting.objects.create(student=self.student, teacher=teacher, status="accepted")
+        self.start = timezone.now() + timezone.timedelta(hours=1)
+        self.meeting = MeetingDetails.objects.create(request=request_meeting, start_datetime=self.start, duration_minutes=30)
+
+    # test the computed status of an assignment and its submission around the deadline
+    def test_assignment_status(self):
+        after_deadline = self.assignment.deadline + timezone.timedelta(minutes=1)
+
+        self.assertTrue(AssignmentUpload.objects.with_status().get().is_open)
+        self.assertFalse(AssignmentUpload.objects.with_status(now=after_deadline).get().is_open)
+        self.assertEqual(AssignmentSubmission.objects.with_status().get().effective_status, "due")
+        self.assertEqual(AssignmentSubmission.objects.with_status(now=after_deadline).get().effective_status, "overdue")
+
+        AssignmentSubmission.objects.update(submission_status="submitted")
+        self.assertEqual(AssignmentSubmission.objects.with_status(now=after_deadline).get().effective_status, "submitted")
+
+    # test the computed status of a meeting before, during and after its scheduled time
+    def test_meeting_status(self):
+        meetings = MeetingDetails.objects
+        self.assertEqual(meetings.with_status().get().effective_status, "closed")
+        self.assertEqual(meetings.with_status(now=self.start).get().effective_status, "open")
+        self.assertEqual(meetings.with_status(now=self.start + timezone.timedelta(minutes=31)).get().effective_status, "expired")
+
+        # meetings ended manually stay expired
+        MeetingDetails.objects.update(meeting_status="expired")
+        self.assertEqual(meetings.with_status(now=self.start).get().effective_status, "expired")
+
+    # test that views show the computed status without the stored status being updated
+    def test_views_use_computed_status(self):
+        self.client.login(username='student', password='password')
+        response = self.client.get(reverse('student-course-view'), {'course_id': self.course.course_id})
+        self.assertEqual(response.context['open_assignment_ids'], {self.assignment.assign_id})
+        self.assertContains(response, 'name="upload_file"')
+
+        MeetingDetails.objects.filter(pk=self.meeting.pk).update(start_datetime=timezone.now() - timezone.timedelta(minutes=5))
+        AssignmentUpload.objects.filter(pk=self.assignment.pk).update(deadline=timezone.now() - timezone.timedelta(minutes=5))
+        self.client.login(username='student', password='password')
+
+        response = self.client.get(reverse('student-request-meeting'))
+        meeting = response.context['accepted_requests'][0].meeting_details.all()[0]
+        self.assertEqual(meeting.effective_status, "open")
+
+        response = self.client.get(reverse('student-home'))
+        self.assertEqual(len(response.context['assignments']), 0)
+
+        response = self.client.get(reverse('student-course-view'), {'course_id': self.course.course_id})
+        self.assertEqual(response.context['open_assignment_ids'], set())
+        self.assertNotContains(response, 'name="upload_file"') # the upload form is only shown for open assignments
+
+# test the cluster-wide lease that stops several processes running the status sweep at once
+class MaintenanceLeaseTests(TestCase):
+
+    def setUp(self):
+        self.client_mock = mock.MagicMock()
+        self.client_mock.hget.return_value = None
+        patcher = mock.patch('webapp.locks.get_redis', return_value=self.client_mock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    # test that the sweep runs and records its hold time when the lease is acquired
+    def test_runs_when_lease_acquired(self):
+        self.client_mock.set.return_value = True
+        self.assertIsNotNone(sweep_statuses_task())
+
+        self.client_mock.set.assert_called_with("maintenance:lock:sweep-statuses", mock.ANY, nx=True, px=54000)
+        self.client_mock.pipeline.return_value.hincrby.assert_called_with("maintenance:metrics:sweep-statuses", "runs", 1)
+
+    # test that the sweep is skipped and counted when another process holds the lease
+    def test_skipped_when_lease_held(self):
+        self.client_mock.set.return_value = None
+        self.assertIsNone(sweep_statuses_task())
+
+        self.client_mock.pipeline.return_value.hincrby.assert_called_with("maintenance:metrics:sweep-statuses", "skipped", 1)
+
+    # test that the sweep still runs when Redis is unavailable
+    def test_runs_without_redis(self):
+        self.client_mock.set.side_effect = RedisError("connection refused")
+        with self.assertLogs('webapp.locks', 'WARNING'):
+            self.assertIsNotNone(sweep_statuses_task())
+
+################# UNIT TESTS FOR VIEW QUERIES #################
+
+# test that the student homepage loads progress for all courses without a query per course
+class StudentHomepageQueryTests(TestCase):
+
+    # set up dummy data
+    def setUp(self):
+        without_deadline_index(self)
+        self.teacher = User.objects.create_user(username='teacher', password='password')
+        UserInfo.objects.create(user=self.teacher, user_type='teacher', first_name='Jane', last_name='Doe', email='janedoe@gmail.com')
+        self.student = User.objects.create_user(username='student', password='password')
+        UserInfo.objects.create(user=self.student, user_type='student', first_name='John', last_name='Doe', email='johndoe@gmail.com')
+        self.other = User.objects.create_user(username='other', password='password')
+        UserInfo.objects.create(user=self.other, user_type='student', first_name='Jim', last_name='Doe', email='jimdoe@gmail.com')
+        self.client.login(username='student', password='password')
+        cache.clear()
+
+    # creates a course the student is enrolled in, with two assignments and one of them submitted
+    def add_course(self, name):
+        course = CourseDetails.objects.create(teacher=self.teacher, course_name=name, course_description="Description")
+        CourseEnrollments.objects.create(course=course, student=self.student, enrollment_status="enrolled")
+        CourseEnrollments.objects.create(course=course, student=self.other, enrollment_status="enrolled")
+        lesson = LessonDetails.objects.create(course=course, lesson_title="Lesson", lesson_description="Description")
+
+        for i in range(2):
+            assignment = AssignmentUpload.objects.create(lesson=lesson, name=f"Assignment {i}", deadline=timezone.now() + timezone.timedelta(days=1))
+            AssignmentSubmission.objects.create(assignment=assignment, student=self.student, submission_status="submitted" if i == 0 else "due")
+            AssignmentSubmission.objects.create(assignment=assignment, student=self.other, submission_status="submitted")
+        return course
+
+    # loads the homepage, returning the response and the number of queries it ran
+    def get_homepage(self):
+        get_unread_counts(self.student) # the header's unread counts are cached, so they are not part of the measured queries
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('student-home'))
+        return response, len(queries)
+
+    # test that progress only counts the student's own submissions
+    def test_progress_values(self):
+        course = self.add_course("Math 101")
+        empty = CourseDetails.objects.create(teacher=self.teacher, course_name="Empty", course_description="Description")
+        CourseEnrollments.objects.create(course=empty, student=self.student, enrollment_status="enrolled")
+
+        response, _ = self.get_homepage()
+        progress = response.context['dict']
+        self.assertEqual((progress[course.course_id]['submitted'], progress[course.course_id]['total']), (1, 2))
+        self.assertEqual((progress[empty.course_id]['submitted'], progress[empty.course_id]['total']), (0, 0))
+
+    # test that the number of queries does not grow with the number of enrolled courses
+    def test_constant_queries(self):
+        self.add_course("Math 101")
+        rebuild_course_progress()
+        _, single_course = self.get_homepage()
+
+        for i in range(4):
+            self.add_course(f"Course {i}")
+        rebuild_course_progress()
+        response, many_courses = self.get_homepage()
+
+        self.assertEqual(len(response.context['courses_enrolled']), 5)
+        self.assertEqual(single_course, many_courses)
+
+
+# test that the course detail page runs the same number of queries whatever the size of the course
+class CourseDetailQueryTests(TestCase):
+
+    # set up dummy data
+    def setUp(self):
+        cache.clear()
+        self.teacher = User.objects.create_user(username='teacher', password='password')
+        UserInfo.objects.create(user=self.teacher, user_type='teacher', first_name='Jane', last_name='Doe', email='janedoe@gmail.com')
+        self.student = User.objects.create_user(username='student', password='password')
+        UserInfo.objects.create(user=self.student, user_type='student', first_name='John', last_name='Doe', email='johndoe@gmail.com')
+        self.client.login(username='student', password='password')
+
+    # creates an enrolled course with the given number of lessons,
+    # each with a material, two assignments (one submitted) and a forum post
+    def add_course(self, name, lesson_count):
+        course = CourseDetails.objects.create(teacher=self.teacher, course_name=name, course_description="Description")
+        CourseEnrollments.objects.create(course=course, student=self.student, enrollment_status="enrolled")
+
+        for i in range(lesson_count):
+            lesson = LessonDetails.objects.create(course=course, lesson_title=f"Lesson {i}", lesson_description="Description")
+            MaterialUpload.objects.create(lesson=lesson, name=f"Material {i}", description="Description")
+            for j in range(2):
+                assignment = AssignmentUpload.objects.create(lesson=lesson, name=f"Assignment {i}.{j}", deadline=timezone.now() + timezone.timedelta(days=1))
+                AssignmentSubmission.objects.create(assignment=assignment, student=self.student, submission_status="submitted" if j == 0 else "due")
+            FeedbackForum.objects.create(user=self.student if i % 2 else self.teacher, course=course, feedback=f"Post {i}")
+        return course
+
+    # loads the course page, returning the response and the number of queries it ran
+    def get_course(self, course):
+        get_unread_counts(self.student) # the header's unread counts are cached, so they are not part of the measured queries
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('student-course-view'), {'course_id': course.course_id})
+        return response, len(queries)
+
+    # test that the page shows each assignment's submission
+    def test_submissions_shown(self):
+        course = self.add_course("Math 101", 2)
+        response, _ = self.get_course(course)
+
+        statuses = {AssignmentUpload.objects.get(assign_id=assign_id).name: submission.submission_status
+                    for assign_id, submission in response.context['user_submissions'].items()}
+        self.assertEqual(statuses, {"Assignment 0.0": "submitted", "Assignment 0.1": "due",
+                                    "Assignment 1.0": "submitted", "Assignment 1.1": "due"})
+
+    # test that the number of queries does not grow with the number of lessons, assignments and posts
+    def test_constant_queries(self):
+        _, small_course = self.get_course(self.add_course("Small", 1))
+        _, large_course = self.get_course(self.add_course("Large", 6))
+
+        self.assertEqual(small_course, large_course)
+
+
+################# UNIT TESTS FOR COURSE PROGRESS #################
+
+# test that the stored course progress is kept up to date by the views
+class CourseProgressTests(TestCase):
+
+    # set up dummy data
+    def setUp(self):
+        without_deadline_index(self)
+        self.teacher = User.objects.create_user(username='teacher', password='password')
+        UserInfo.objects.create(user=self.teacher, user_type='teacher', first_name='Jane', last_name='Doe', email='janedoe@gmail.com')
+        self.student = User.objects.create_user(username='student', password='password')
+        UserInfo.objects.create(user=self.student, user_type='student', first_name='John', last_name='Doe', email='johndoe@gmail.com')
+
+        self.course = CourseDetails.objects.create(teacher=self.teacher, course_name="Math 101", course_description="Introduction to Mathematics")
+        self.lesson = LessonDetails.objects.create(course=self.course, lesson_title="Algebra", lesson_description="Basic Algebra")
+        self.due = AssignmentUpload.objects.create(lesson=self.lesson, name="Assignment 1", deadline=timezone.now() + timezone.timedelta(days=1))
+        self.passed = AssignmentUpload.objects.create(lesson=self.lesson, name="Assignment 2", deadline=timezone.now() - timezone.timedelta(days=1))
+
+        # uploaded files are written to a temporary media folder
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    # url of the course page
+    def course_url(self):
+        return reverse('student-course-view') + f"?course_id={self.course.course_id}"
+
+    # stored (submitted, total) of the student in the course
+    def get_progress(self):
+        progress = CourseProgress.objects.get(student=self.student, course=self.course)
+        return progress.submitted, progress.total
+
+    # enrolls the student through the course page
+    def enroll(self):
+        self.client.login(username='student', password='password')
+        self.client.post(self.course_url(), {'action': 'Enroll'})
+
+    # test that enrolling stores the starting progress (passed assignments count as submitted)
+    def test_enroll(self):
+        self.enroll()
+        self.assertEqual(self.get_progress(), (1, 2))
+
+    # test that submitting an assignment counts once, and resubmitting does not count again
+    def test_submit(self):
+        self.enroll()
+        for action, field in [('upload', 'upload_file'), ('upload', 'upload_file'), ('reupload', 'reupload_file')]:
+            self.client.post(self.course_url(), {'action': action, 'assignment_id': self.due.assign_id,
+                                                 field: SimpleUploadedFile("answer.txt", b"answer")})
+        self.assertEqual(self.get_progress(), (2, 2))
+
+    # test that unenrolling removes the student's progress
+    def test_unenroll(self):
+        self.enroll()
+        self.client.post(self.course_url(), {'action': 'Unenroll'})
+        self.assertFalse(CourseProgress.objects.exists())
+
+    # test that adding and deleting assignments updates every student's total
+    def test_assignments_added_and_deleted(self):
+        self.enroll()
+        record_assignment_added(self.course.course_id)
+        self.assertEqual(self.get_progress(), (1, 3))
+
+        self.client.login(username='teacher', password='password')
+        session = self.client.session
+        session['course_id'] = self.course.course_id
+        session.save()
+        self.client.post(reverse('teacher-delete-items'), {'action': 'Delete Assignment', 'name': self.passed.assign_id})
+        self.assertEqual(self.get_progress(), (0, 1))
+
+    # test that the teacher's enrolment page reads the stored progress
+    def test_teacher_view_enrolments(self):
+        self.enroll()
+        self.client.login(username='teacher', password='password')
+        session = self.client.session
+        session['course_id'] = self.course.course_id
+        session.save()
+
+        response = self.client.get(reverse('teacher-view-enrolments'))
+        self.assertEqual(response.context['progress_data'][self.student.id]['progress'], 50)
+
+    # test that a missing row created by another request while it is rebuilt is overwritten rather than failing
+    def test_rebuild_missing_row_concurrently(self):
+        CourseEnrollments.objects.create(course=self.course, student=self.student, enrollment_status="enrolled")
+        AssignmentSubmission.objects.create(assignment=self.passed, student=self.student, submission_status="submitted")
+
+        inserted = []
+        def insert_first(execute, sql, params, many, context): # the other request's row is inserted just before the rebuild's
+            if not inserted and sql.startswith(f'INSERT INTO "{CourseProgress._meta.db_table}"'):
+                inserted.append(sql)
+                CourseProgress.objects.create(student=self.student, course=self.course)
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(insert_first):
+            progress = get_student_progress(self.student, [self.course.course_id])
+        self.assertTrue(inserted)
+        self.assertEqual((progress[self.course.course_id].submitted, progress[self.course.course_id].total), (1, 2))
+        self.assertEqual(self.get_progress(), (1, 2))
+
+    # test that rebuilding removes the rows of students who are no longer enrolled
+    def test_rebuild_removes_stale_rows(self):
+        CourseProgress.objects.create(student=self.student, course=self.course, submitted=1, total=2)
+        rebuild_course_progress([self.course.course_id])
+        self.assertFalse(CourseProgress.objects.exists())
+
+    # test that the rebuild command backfills missing rows
+    def test_rebuild_command(self):
+        CourseEnrollments.objects.create(course=self.course, student=self.student, enrollment_status="enrolled")
+        AssignmentSubmission.objects.create(assignment=self.passed, student=self.student, submission_status="submitted")
+
+        call_command('rebuild_course_progress', stdout=io.StringIO())
+        self.assertEqual(self.get_progress(), (1, 2))
+
+
+################# UNIT TESTS FOR PAGE CACHING #################
+
+# test that the student homepage is cached and invalidated when the data shown on it changes
+class HomepageCacheTests(TestCase):
+
+    # set up dummy data
+    def setUp(self):
+        without_deadline_index(self)
+        cache.clear()
+        teacher = User.objects.create_user(username='teacher', password='password')
+        UserInfo.objects.create(user=teacher, user_type='teacher', first_name='Jane', last_name='Doe', email='janedoe@gmail.com')
+        self.student = User.objects.create_user(username='student', password='password')
+        UserInfo.objects.create(user=self.student, user_type='student', first_name='John', last_name='Doe', email='johndoe@gmail.com')
+
+        self.course = CourseDetails.objects.create(teacher=teacher, course_name="Math 101", course_description="Introduction to Mathematics")
+        CourseEnrollments.objects.create(course=self.course, student=self.student, enrollment_status="enrolled")
+        self.lesson = LessonDetails.objects.create(course=self.course, lesson_title="Algebra", lesson_description="Basic Algebra")
+        self.assignment = AssignmentUpload.objects.create(lesson=self.lesson, name="Assignment 1", deadline=timezone.now() + timezone.timedelta(days=1))
+        self.submission = AssignmentSubmission.objects.create(assignment=self.assignment, student=self.student)
+        self.client.login(username='student', password='password')
+
+    # loads the homepage, returning the response and the number of queries it ran
+    def get_homepage(self):
+        get_unread_counts(self.student) # the header's unread counts are cached, so they are not part of the measured queries
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('student-home'))
+        return response, len(queries)
+
+    # test that a repeated page load is served from the cache
+    def test_cache_hit(self):
+        first, first_queries = self.get_homepage()
+        second, second_queries = self.get_homepage()
+
+        self.assertLess(second_queries, first_queries)
+        self.assertEqual(second.context['assignments'], first.context['assignments'])
+        self.assertEqual(second.content, first.content)
+
+    # test that saving a submission invalidates the student's cached page
+    def test_submission_invalidates(self):
+        self.get_homepage()
+        self.submission.submission_status = "submitted"
+        self.submission.save()
+        record_submission(self.student, self.course.course_id)
+
+        response, _ = self.get_homepage()
+        self.assertEqual(response.context['dict'][self.course.course_id]['submitted'], 1)
+
+    # test that adding an assignment invalidates the cached page of every student
+    def test_assignment_invalidates(self):
+        self.get_homepage()
+        AssignmentUpload.objects.create(lesson=self.lesson, name="Assignment 2", deadline=timezone.now() + timezone.timedelta(days=2))
+        record_assignment_added(self.course.course_id)
+
+        response, _ = self.get_homepage()
+        self.assertEqual(len(response.context['assignments']), 1) # no submission was created for the new assignment
+        self.assertEqual(response.context['dict'][self.course.course_id]['total'], 2)
+
+    # test that changes to a course the student is not in do not invalidate their cached page
+    def test_other_course_keeps_cache(self):
+        _, first_queries = self.get_homepage()
+        other_course = CourseDetails.objects.create(teacher=self.course.teacher, course_name="Physics 101", course_description="Introduction to Physics")
+        other_lesson = LessonDetails.objects.create(course=other_course, lesson_title="Motion", lesson_description="Basic Motion")
+        AssignmentUpload.objects.create(lesson=other_lesson, name="Assignment 1", deadline=timezone.now() + timezone.timedelta(days=1))
+
+        _, second_queries = self.get_homepage()
+        self.assertLess(second_queries, first_queries)
+
+    # test that discontinuing a course (a queryset update, which sends no signals) invalidates the cached page
+    def test_discontinue_invalidates(self):
+        self.get_homepage()
+        self.client.post(reverse('student-course-view') + f"?course_id={self.course.course_id}", {'action': 'Discontinue Course'})
+
+        response, _ = self.get_homepage()
+        self.assertEqual(len(response.context['courses_enrolled']), 0)
+
+    # test that the page is cached no longer than until the next deadline shown on it
+    @override_settings(HOMEPAGE_CACHE_TIMEOUT=300)
+    def test_timeout_capped_at_deadline(self):
+        with mock.patch('webapp.dashboard.cache.set') as cache_set:
+            cache_homepage("key", {}, expires=timezone.now() + timezone.timedelta(seconds=60))
+            self.assertLessEqual(cache_set.call_args.args[2], 60)
+
+            cache_set.reset_mock()
+            cache_homepage("key", {}, expires=timezone.now() - timezone.timedelta(seconds=1))
+            cache_set.assert_not_called()
+
+    # test that the page is still shown when the cache is unavailable
+    def test_cache_unavailable(self):
+        with mock.patch('webapp.dashboard.get_version', side_effect=RedisError("connection refused")), \
+             self.assertLogs('webapp.dashboard', 'WARNING'):
+            response, _ = self.get_homepage()
+        self.assertEqual(len(response.context['assignments']), 1)
+
+# test that the course outline is cached and invalidated when the course's content changes
+class CourseOutlineTests(TestCase):
+
+    # set up dummy data
+    def setUp(self):
+        cache.clear()
+        teacher = User.objects.create_user(username='teacher', password='password')
+        UserInfo.objects.create(user=teacher, user_type='teacher', first_name='Jane', last_name='Doe', email='janedoe@gmail.com')
+        self.student = User.objects.create_user(username='student', password='password')
+        UserInfo.objects.create(user=self.student, user_type='student', first_name='John', last_name='Doe', email='johndoe@gmail.com')
+
+        self.course = CourseDetails.objects.create(teacher=teacher, course_name="Math 101", course_description="Introduction to Mathematics")
+        CourseEnrollments.objects.create(course=self.course, student=self.student, enrollment_status="enrolled")
+        self.lesson = LessonDetails.objects.create(course=self.course, lesson_title="Algebra", lesson_description="Basic Algebra")
+        self.material = MaterialUpload.objects.create(lesson=self.lesson, name="Notes", description="Lecture notes")
+        self.assignment = AssignmentUpload.objects.create(lesson=self.lesson, name="Assignment 1", deadline=timezone.now() + timezone.timedelta(days=1))
+
+    # names of the assignments in the cached outline
+    def assignment_names(self):
+        return [a['name'] for lesson in get_course_outline(self.course.course_id) for a in lesson['assignments']]
+
+    # test that the outline is only built from the database once
+    def test_cache_hit(self):
+        with CaptureQueriesContext(connection) as first:
+            outline = get_course_outline(self.course.course_id)
+        with CaptureQueriesContext(connection) as second:
+            self.assertEqual(get_course_outline(self.course.course_id), outline)
+
+        self.assertEqual(len(first), 3)
+        self.assertEqual(len(second), 0)
+        self.assertEqual(outline[0]['materials'][0]['name'], "Notes")
+        self.assertEqual(outline[0]['assignments'][0]['deadline'], self.assignment.deadline)
+
+    # test that adding, changing and deleting course items invalidates the outline
+    def test_changes_invalidate(self):
+        self.assertEqual(self.assignment_names(), ["Assignment 1"])
+
+        assignment = AssignmentUpload.objects.create(lesson=self.lesson, name="Assignment 2", deadline=timezone.now() + timezone.timedelta(days=2))
+        self.assertEqual(self.assignment_names(), ["Assignment 1", "Assignment 2"])
+
+        assignment.name = "Assignment 3"
+        assignment.save()
+        self.assertEqual(self.assignment_names(), ["Assignment 1", "Assignment 3"])
+
+        self.material.delete()
+        self.assertEqual(get_course_outline(self.course.course_id)[0]['materials'], [])
+
+        self.lesson.delete()
+        self.assertEqual(get_course_outline(self.course.course_id), [])
+
+    # test that the student and teacher course pages show the outline
+    def test_course_pages(self):
+        self.client.login(username='student', password='password')
+        response = self.client.get(reverse('student-course-view'), {'course_id': self.course.course_id})
+        self.assertContains(response, "Assignment 1")
+        self.assertContains(response, 'name="upload_file"') # the assignment is still open
+
+        self.client.login(username='teacher', password='password')
+        self.client.get(reverse('teacher-course-setting'), {'course_id': self.course.course_id})
+        response = self.client.get(reverse('teacher-view-course'))
+        self.assertContains(response, "Assignment 1")
+        self.assertContains(response, "Notes")
+
+    # test that the lesson item lists of the teacher's forms are read from the outline
+    def test_lesson_items(self):
+        self.client.login(username='teacher', password='password')
+        self.client.get(reverse('teacher-course-setting'), {'course_id': self.course.course_id})
+        get_course_outline(self.course.course_id)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('get-materials', args=[self.lesson.lesson_id]))
+        self.assertEqual(response.json(), {'materials': [{'material_id': self.material.material_id, 'name': "Notes"}]})
+        self.assertFalse(any("webapp_materialupload" in query['sql'] for query in queries))
+
+        response = self.client.get(reverse('get_assignments', args=[self.lesson.lesson_id]))
+        self.assertEqual(response.json(), {'assignments': [{'assign_id': self.assignment.assign_id, 'name': "Assignment 1"}]})
+
+    # test that the outline is still built when the cache is unavailable
+    def test_cache_unavailable(self):
+        with mock.patch('webapp.outline.cache.get', side_effect=RedisError("connection refused")), \
+             self.assertLogs('webapp.outline', 'WARNING'):
+            self.assertEqual(self.assignment_names(), ["Assignment 1"])
+
+
+################# UNIT TESTS FOR DEADLINE INDEX #################
+
+# test the per-student upcoming-deadline index kept in Redis
+class DeadlineIndexTests(TestCase):
+
+    # set up dummy data and a mock Redis client
+    def setUp(self):
+        cache.clear()
+        teacher = User.objects.create_user(username='teacher', password='password')
+        UserInfo.objects.create(user=teacher, user_type='teacher', first_name='Jane', last_name='Doe', email='janedoe@gmail.com')
+        self.student = User.objects.create_user(username='student', password='password')
+        UserInfo.objects.create(user=self.student, user_type='student', first_name='John', last_name='Doe', email='johndoe@gmail.com')
+
+        self.course = CourseDetails.objects.create(teacher=teacher, course_name="Math 101", course_description="Introduction to Mathematics")
+        lesson = LessonDetails.objects.create(course=self.course, lesson_title="Algebra", lesson_description="Basic Algebra")
+        self.later = AssignmentUpload.objects.create(lesson=lesson, name="Assignment 1", deadline=timezone.now() + timezone.timedelta(days=2))
+        self.sooner = AssignmentUpload.objects.create(lesson=lesson, name="Assignment 2", deadline=timezone.now() + timezone.timedelta(days=1))
+        self.client.login(username='student', password='password')
+
+        self.redis = mock.MagicMock()
+        patcher = mock.patch('webapp.deadlines.get_redis', return_value=self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    # url of the course page
+    def course_url(self):
+        return reverse('student-course-view') + f"?course_id={self.course.course_id}"
+
+    # test that enrolling adds the course's upcoming assignments to the student's index, only if it has been built
+    def test_enroll_indexes_course(self):
+        self.client.post(self.course_url(), {'action': 'Enroll'})
+
+        self.redis.zadd.assert_not_called()
+        self.redis.pipeline.return_value.eval.assert_called_once_with(
+            ZADD_IF_BUILT_SCRIPT, 1, f"deadlines:{self.student.id}", mock.ANY, mock.ANY, mock.ANY, mock.ANY)
+        args = self.redis.pipeline.return_value.eval.call_args.args[3:]
+        self.assertEqual(dict(zip(args[1::2], args[::2])), {
+            str(self.later.assign_id): self.later.deadline.timestamp(),
+            str(self.sooner.assign_id): self.sooner.deadline.timestamp(),
+        })
+
+    # test that an index that was never built is built from all of the student's courses when read,
+    # and marked as built even if the student has no upcoming deadlines
+    def test_index_built_on_first_read(self):
+        self.redis.exists.return_value = 0
+        self.redis.pipeline.return_value.execute.return_value = [0, []]
+        self.assertEqual(get_upcoming_deadlines(self.student.id, 10), [])
+
+        pipe = self.redis.pipeline.return_value
+        pipe.delete.assert_called_with(f"deadlines:{self.student.id}")
+        pipe.zadd.assert_called_once_with(f"deadlines:{self.student.id}", {BUILT_MEMBER: float("inf")}) # only the marker
+        pipe.zrangebyscore.assert_called_with(f"deadlines:{self.student.id}", mock.ANY, "(+inf", start=0, num=10)
+
+        # once built, reads do not rebuild it
+        self.redis.exists.return_value = 1
+        pipe.reset_mock()
+        get_upcoming_deadlines(self.student.id, 10)
+        pipe.zadd.assert_not_called()
+
+    # test that an assignment created while an index is rebuilt, and so not indexed by the view, is added by the rebuild
+    def test_rebuild_adds_assignment_created_meanwhile(self):
+        CourseEnrollments.objects.create(course=self.course, student=self.student, enrollment_status="enrolled")
+        pipe = self.redis.pipeline.return_value
+        created = []
+        def create_assignment(**kwargs): # after the rebuild has read the database, before it writes the index
+            if not created:
+                created.append(AssignmentUpload.objects.create(lesson=self.later.lesson, name="Assignment 3",
+                                                               deadline=timezone.now() + timezone.timedelta(days=3)))
+            return pipe
+
+        self.redis.pipeline.side_effect = create_assignment
+        rebuild_deadline_index([self.student.id])
+
+        pipe.zadd.assert_called_once_with(f"deadlines:{self.student.id}", {BUILT_MEMBER: float("inf")})
+        added = {assign_id for call in pipe.eval.call_args_list for assign_id in call.args[4::2]}
+        self.assertIn(str(created[0].assign_id), added)
+
+    # test that discontinuing a course removes its assignments from the student's index
+    def test_discontinue_unindexes_course(self):
+        self.client.post(self.course_url(), {'action': 'Enroll'})
+        self.client.post(self.course_url(), {'action': 'Discontinue Course'})
+
+        self.redis.zrem.assert_called_once_with(f"deadlines:{self.student.id}", mock.ANY, mock.ANY)
+        self.assertEqual(set(self.redis.zrem.call_args.args[1:]), {str(self.later.assign_id), str(self.sooner.assign_id)})
+
+    # test that the homepage shows the assignments read from the index, and drops deleted ones from it
+    def test_homepage_reads_index(self):
+        self.client.post(self.course_url(), {'action': 'Enroll'})
+        self.redis.pipeline.return_value.execute.return_value = [0, [str(self.sooner.assign_id).encode(), b"999"]]
+
+        response = self.client.get(reverse('student-home'))
+        self.assertEqual([a.assignment for a in response.context['assignments']], [self.sooner])
+        self.redis.zrem.assert_called_with(f"deadlines:{self.student.id}", "999")
+
+    # test that the homepage falls back to the database when Redis is unavailable
+    def test_homepage_without_redis(self):
+        self.client.post(self.course_url(), {'action': 'Enroll'})
+        self.redis.exists.side_effect = RedisError("connection refused")
+
+        with self.assertLogs('webapp.deadlines', 'WARNING'):
+            response = self.client.get(reverse('student-home'))
+        self.assertEqual([a.assignment for a in response.context['assignments']], [self.sooner, self.later])
+
+    # test that the checker reports entries missing from or not expected in the index
+    def test_check_deadline_index(self):
+        CourseEnrollments.objects.create(course=self.course, student=self.student, enrollment_status="enrolled")
+        AssignmentSubmission.objects.create(assignment=self.later, student=self.student)
+        AssignmentSubmission.objects.create(assignment=self.sooner, student=self.student)
+
+        self.redis.scan_iter.return_value = [f"deadlines:{self.student.id}".encode()]
+        self.redis.zrangebyscore.return_value = [(str(self.later.assign_id).encode(), self.later.deadline.timestamp()),
+                                                 (b"999", self.later.deadline.timestamp())]
+
+        self.assertEqual(check_deadline_index(), {self.student.id: {"missing": [self.sooner.assign_id],
+                                                                    "unexpected": [999],
+                                                                    "wrong_deadline": []}})
+
+
+################# UNIT TESTS FOR COURSE SEARCH #################
+
+# test the full-text search index of the course catalog
+class CourseSearchTests(TestCase):
+
+    # set up dummy data
+    def setUp(self):
+        self.teacher = User.objects.create_user(username='teacher', password='password')
+        self.teacher_info = UserInfo.objects.create(user=self.teacher, user_type='teacher', first_name='Jane', last_name='Doe', email='janedoe@gmail.com')
+        other_teacher = User.objects.create_user(username='other', password='password')
+        UserInfo.objects.create(user=other_teacher, user_type='teacher', first_name='Alan', last_name='Smith', email='alansmith@gmail.com')
+        student = User.objects.create_user(username='student', password='password')
+        UserInfo.objects.create(user=student, user_type='student', first_name='John', last_name='Doe', email='johndoe@gmail.com')
+
+        self.algebra = CourseDetails.objects.create(teacher=self.teacher, course_name="Algebra", course_description="Algebra from the basics")
+        self.maths = CourseDetails.objects.create(teacher=other_teacher, course_name="Mathematics", course_description="Numbers, geometry and some algebra")
+        self.history = CourseDetails.objects.create(teacher=self.teacher, course_name="History", course_description="World history")
+        self.client.login(username='student', password='password')
+
+    # searches the catalog page, returning the courses found
+    def search(self, descriptor="", instructor=""):
+        response = self.client.get(reverse('student-courses-view'), {'action': 'Search', 'courseDescriptor': descriptor, 'instructor': instructor})
+        return list(response.context['courses'])
+
+    # test that matches are ranked, and that terms match the start of words
+    def test_ranked_prefix_search(self):
+        self.assertEqual(self.search(descriptor="alg"), [self.algebra, self.maths])
+        self.assertEqual(self.search(descriptor="world hist"), [self.history])
+        self.assertEqual(self.search(descriptor="chemistry"), [])
+
+    # test searching by instructor only, and by both course and instructor
+    def test_instructor_search(self):
+        self.assertEqual(set(self.search(instructor="doe")), {self.algebra, self.history})
+        self.assertEqual(self.search(descriptor="algebra", instructor="smith"), [self.maths])
+
+    # test that query syntax in the search terms is ignored
+    def test_query_syntax_ignored(self):
+        self.assertEqual(self.search(descriptor='"algebra" OR (history*'), [])
+        self.assertEqual(self.search(descriptor='algebra*'), [self.algebra, self.maths])
+
+    # test that the index follows changes to courses and teacher names
+    def test_index_updated(self):
+        self.history.course_name = "Geography"
+        self.history.save()
+        self.teacher_info.last_name = "Brown"
+        self.teacher_info.save()
+        self.maths.delete()
+
+        self.assertEqual(self.search(descriptor="geography"), [self.history])
+        self.assertEqual(self.search(instructor="doe"), [])
+        self.assertEqual(set(self.search(instructor="brown")), {self.algebra, self.history})
+        self.assertEqual(self.search(descriptor="numbers"), [])
+
+    # test that the rebuild command re-creates the index
+    def test_rebuild_command(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {SEARCH_TABLE}")
+        self.assertEqual(self.search(descriptor="algebra"), [])
+
+        call_command('rebuild_search_index', stdout=io.StringIO())
+        self.assertEqual(self.search(descriptor="algebra"), [self.algebra, self.maths])
+
+
+################# UNIT TESTS FOR PAGINATION #################
+
+# test the keyset pagination of the course catalog and people search pages
+@override_settings(PAGE_SIZE=2)
+class KeysetPaginationTests(TestCase):
+
+    # set up dummy data
+    def setUp(self):
+        cache.clear()
+        self.teacher = User.objects.create_user(username='teacher', password='password')
+        UserInfo.objects.create(user=self.teacher, user_type='teacher', first_name='Jane', last_name='Doe', email='janedoe@gmail.com')
+        student = User.objects.create_user(username='student', password='password')
+        UserInfo.objects.create(user=student, user_type='student', first_name='John', last_name='Doe', email='johndoe@gmail.com')
+
+        # courses with 1 to 5 mentions of 'algebra', so that each has a different search rank
+        self.courses = [CourseDetails.objects.create(teacher=self.teacher, course_name=f"Course {i}",
+                                                     course_description="algebra " * i + "and more")
+                        for i in range(1, 6)]
+
+    # follows the 'next page' links from the first page, returning the items of every page
+    def get_all_pages(self, url, params, items_key):
+        pages = []
+        query = params
+        while query is not None:
+            response = self.client.get(url, query)
+            pages.append(list(response.context[items_key]))
+            next_query = response.context['page'].next_query
+            query = QueryDict(next_query) if next_query else None
+        return pages, response
+
+    # test that the catalog is paged by course id
+    def test_catalog_pages(self):
+        self.client.login(username='student', password='password')
+        pages, response = self.get_all_pages(reverse('student-courses-view'), {}, 'courses')
+
+        self.assertEqual([len(page) for page in pages], [2, 2, 1])
+        self.assertEqual(sum(pages, []), self.courses)
+        self.assertEqual(response.context['result_message'], "Courses found: 5")
+
+    # test that search results are paged in rank order
+    def test_search_pages(self):
+        self.client.login(username='student', password='password')
+        pages, _ = self.get_all_pages(reverse('student-courses-view'), {'action': 'Search', 'courseDescriptor': 'algebra'}, 'courses')
+
+        self.assertEqual(sum(pages, []), self.courses[::-1]) # most mentions first
+
+    # test that the people search is paged by id
+    def test_people_pages(self):
+        for i in range(3):
+            user = User.objects.create_user(username=f'teacher{i}', password='password')
+            UserInfo.objects.create(user=user, user_type='teacher', first_name='Jane', last_name=f'Smith{i}', email=f'janesmith{i}@gmail.com')
+
+        self.client.login(username='teacher', password='password')
+        pages, response = self.get_all_pages(reverse('teacher-search-person'), {'action': 'Search', 'name': 'jane', 'type': ''}, 'people')
+
+        self.assertEqual([len(page) for page in pages], [2, 2])
+        self.assertEqual(sum(pages, []), list(UserInfo.objects.filter(first_name='Jane').order_by('id')))
+        self.assertEqual(response.context['matches'], 4)
+
+    # test that an invalid cursor shows the first page
+    def test_invalid_cursor(self):
+        self.client.login(username='student', password='password')
+        for cursor in ('not-a-cursor', encode_cursor(["x"]), encode_cursor([{"a": 1}]), encode_cursor([[1]]),
+                       encode_cursor([None]), encode_cursor([2 ** 70])):
+            response = self.client.get(reverse('student-courses-view'), {'cursor': cursor})
+
+            self.assertEqual(list(response.context['courses']), self.courses[:2])
+            self.assertTrue(response.context['page'].is_first)
+
+    # test that the total count is cached rather than counted on every page
+    def test_count_cached(self):
+        courses = CourseDetails.objects.all()
+        self.assertEqual(cached_count(courses), 5)
+
+        CourseDetails.objects.create(teacher=self.teacher, course_name="Course 6", course_description="More")
+        with self.assertNumQueries(0):
+            self.assertEqual(cached_count(courses), 5)
+
+
+# test that course forums show the newest posts and load older ones page by page
+@override_settings(FORUM_PAGE_SIZE=2)
+class ForumPaginationTests(TestCase):
+
+    # set up dummy data
+    def setUp(self):
+        teacher = User.objects.create_user(username='teacher', password='password')
+        UserInfo.objects.create(user=teacher, user_type='teacher', first_name='Jane', last_name='Doe', email='janedoe@gmail.com')
+        self.student = User.objects.create_user(username='student', password='password')
+        UserInfo.objects.create(user=self.student, user_type='student', first_name='John', last_name='Doe', email='johndoe@gmail.com')
+
+        self.course = CourseDetails.objects.create(teacher=teacher, course_name="Math 101", course_description="Introduction to Mathematics")
+        CourseEnrollments.objects.create(course=self.course, student=self.student, enrollment_status="enrolled")
+
+        # five posts, two of them posted at the same time
+        now = timezone.now()
+        self.posts = [FeedbackForum.objects.create(user=self.student if i % 2 else teacher, course=self.course, feedback=f"Post {i}")
+                      for i in range(5)]
+        for i, post in enumerate(self.posts):
+            FeedbackForum.objects.filter(pk=post.pk).update(created_at=now + timezone.timedelta(minutes=min(i, 3)))
+        self.client.login(username='student', password='password')
+
+    # test that the course page only shows the newest page of posts
+    def test_first_page(self):
+        response = self.client.get(reverse('student-course-view'), {'course_id': self.course.course_id})
+
+        self.assertEqual([post.feedback for post in response.context['feedbacks']], ["Post 4", "Post 3"])
+        self.assertNotContains(response, "Post 2")
+        self.assertContains(response, response.context['forum_next_cursor'])
+
+    # test that following the cursors loads every older post once, newest first
+    def test_older_pages(self):
+        response = self.client.get(reverse('student-course-view'), {'course_id': self.course.course_id})
+        cursor, pages = response.context['forum_next_cursor'], []
+
+        while cursor:
+            data = self.client.get(reverse('course-forum'), {'course_id': self.course.course_id, 'cursor': cursor}).json()
+            pages.append(re.findall(r"Post \d", data['html']))
+            cursor = data['next_cursor']
+
+        self.assertEqual(pages, [["Post 2", "Post 1"], ["Post 0"]])
+
+    # test that the number of queries does not grow with the number of posts shown
+    @override_settings(FORUM_PAGE_SIZE=5)
+    def test_constant_queries(self):
+        with CaptureQueriesContext(connection) as one_post:
+            self.client.get(reverse('course-forum'), {'course_id': self.course.course_id, 'cursor': encode_cursor([self.posts[1].created_at.isoformat(), self.posts[1].pk])})
+        with CaptureQueriesContext(connection) as all_posts:
+            self.client.get(reverse('course-forum'), {'course_id': self.course.course_id})
+
+        self.assertEqual(len(one_post), len(all_posts))
+
+    # test that the forum can only be read by the course's teacher and students
+    def test_access(self):
+        self.client.login(username='teacher', password='password')
+        self.assertEqual(self.client.get(reverse('course-forum'), {'course_id': self.course.course_id}).status_code, 200)
+        self.assertEqual(self.client.get(reverse('course-forum'), {'course_id': 'x'}).status_code, 404)
+
+        other_teacher = User.objects.create_user(username='other_teacher', password='password')
+        UserInfo.objects.create(user=other_teacher, user_type='teacher', first_name='Mary', last_name='Major', email='marymajor@gmail.com')
+        self.client.login(username='other_teacher', password='password')
+        self.assertEqual(self.client.get(reverse('course-forum'), {'course_id': self.course.course_id}).status_code, 403)
+
+        # students who are not in the course see the newest posts on its page, but cannot load older ones
+        other_student = User.objects.create_user(username='other_student', password='password')
+        UserInfo.objects.create(user=other_student, user_type='student', first_name='Richard', last_name='Roe', email='richardroe@gmail.com')
+        self.client.login(username='other_student', password='password')
+        self.assertEqual(self.client.get(reverse('course-forum'), {'course_id': self.course.course_id}).status_code, 403)
+        self.assertIsNone(self.client.get(reverse('student-course-view'), {'course_id': self.course.course_id}).context['forum_next_cursor'])
+
+        self.client.logout()
+        self.assertRedirects(self.client.get(reverse('course-forum'), {'course_id': self.course.course_id}), reverse('login'))
+
+    # test that a cursor with values of the wrong type shows the first page
+    def test_invalid_cursor(self):
+        for values in (["yesterday", 1], [5, 1], [[1], 1], [self.posts[1].created_at.isoformat(), {"a": 1}]):
+            data = self.client.get(reverse('course-forum'), {'course_id': self.course.course_id, 'cursor': encode_cursor(values)}).json()
+            self.assertEqual(re.findall(r"Post \d", data['html']), ["Post 4", "Post 3"])
+
+
+# test the name index and autocomplete of the people search
+class PeopleSearchTests(TestCase):
+
+    # set up dummy data
+    def setUp(self):
+        cache.clear()
+        self.teacher = User.objects.create_user(username='teacher', password='password')
+        self.teacher_info = UserInfo.objects.create(user=self.teacher, user_type='teacher', first_name='Jane', last_name='Doe', display_name='Miss Doe', email='janedoe@gmail.com')
+        self.students = []
+        for i, (first, last) in enumerate([('Janet', 'Smith'), ('John', 'Jansen'), ('Alice', 'Brown')]):
+            user = User.objects.create_user(username=f'student{i}', password='password')
+            self.students.append(UserInfo.objects.create(user=user, user_type='student', first_name=first, last_name=last, email=f'student{i}@gmail.com'))
+        self.client.login(username='teacher', password='password')
+
+    # gets the names suggested for the given query
+    def autocomplete(self, q, type=''):
+        response = self.client.get(reverse('teacher-search-autocomplete'), {'q': q, 'type': type})
+        return [person['name'] for person in response.json()['people']]
+
+    # test that the names of a user are split into padded trigrams
+    def test_name_grams(self):
+        self.assertEqual(name_grams("Jane"), {"  j", " ja", "jan", "ane", "ne "})
+        self.assertEqual(name_grams("Jane", pad_start=False, pad_end=False), {"jan", "ane"})
+        self.assertTrue(NameGram.objects.filter(user_info=self.teacher_info, gram="doe", user_type="teacher").exists())
+
+    # test that suggestions match the start of name words, optionally filtered by user type
+    def test_autocomplete(self):
+        self.assertEqual(self.autocomplete("jan"), ["Janet Smith", "Jane Doe", "John Jansen"]) # display name matches first
+        self.assertEqual(self.autocomplete("jan", type='student'), ["Janet Smith", "John Jansen"])
+        self.assertEqual(self.autocomplete("ja sm"), ["Janet Smith"])
+        self.assertEqual(self.autocomplete("ane"), []) # not the start of a word
+        self.assertEqual(self.autocomplete(""), [])
+
+    # test that the best matches are found among many candidates, however few suggestions are asked for
+    def test_autocomplete_ranked_before_limit(self):
+        for i in range(5):
+            user = User.objects.create_user(username=f'other{i}', password='password')
+            UserInfo.objects.create(user=user, user_type='student', first_name='Zoe', last_name='Jansen', email=f'other{i}@gmail.com')
+        user = User.objects.create_user(username='last', password='password')
+        UserInfo.objects.create(user=user, user_type='student', first_name='Jan', last_name='Zed', email='last@gmail.com')
+
+        self.assertEqual([p.first_name for p in autocomplete_people("jan", limit=2)], ["Jan", "Janet"])
+
+    # test that the index follows changes to names and user types
+    def test_index_updated(self):
+        self.students[2].last_name = "Janssen"
+        self.students[2].save()
+        self.assertIn("Alice Janssen", self.autocomplete("jan", type='student'))
+        self.assertFalse(NameGram.objects.filter(user_info=self.students[2], gram="bro").exists())
+
+        self.students[2].user_type = "teacher"
+        self.students[2].save()
+        self.assertNotIn("Alice Janssen", self.autocomplete("jan", type='student'))
+
+    # test that the people search still matches anywhere in a name
+    def test_search_people(self):
+        people = search_people(UserInfo.objects.all(), "ans")
+        self.assertEqual(list(people), [self.students[1]])
+
+        people = search_people(UserInfo.objects.all(), "jo") # too short for trigrams
+        self.assertEqual(list(people), [self.students[1]])
+
+        response = self.client.get(reverse('teacher-search-person'), {'action': 'Search', 'name': 'miss doe', 'type': 'teacher'})
+        self.assertEqual(list(response.context['people']), [self.teacher_info])
+
+    # test that the rebuild command re-creates the name index
+    def test_rebuild_command(self):
+        NameGram.objects.all().delete()
+        call_command('rebuild_search_index', stdout=io.StringIO())
+        self.assertEqual(self.autocomplete("jan", type='student'), ["Janet Smith", "John Jansen"])
+
+
+################# UNIT TESTS FOR NOTIFICATIONS #################
+
+# test that course-wide notifications are created by a background task with one query
+class NotificationFanoutTests(TestCase):
+
+    # set up dummy data
+    def setUp(self):
+        self.teacher = User.objects.create_user(username='teacher', password='password')
+        UserInfo.objects.create(user=self.teacher, user_type='teacher', first_name='Jane', last_name='Doe', email='janedoe@gmail.com')
+        self.course = CourseDetails.objects.create(teacher=self.teacher, course_name="Math 101", course_description="Introduction to Mathematics")
+
+        self.students = []
+        for i in range(5):
+            student = User.objects.create_user(username=f'student{i}', password='password')
+            UserInfo.objects.create(user=student, user_type='student', first_name='John', last_name=f'Doe{i}', email=f'johndoe{i}@gmail.com')
+            CourseEnrollments.objects.create(course=self.course, student=student, enrollment_status="enrolled")
+            self.students.append(student)
+
+    # test that every student but the excluded one is notified with a single statement
+    def test_fanout(self):
+        with self.assertNumQueries(1):
+            count = notify_course_students(self.course.course_id, "New post", 'forum', exclude_user_id=self.students[0].id)
+
+        self.assertEqual(count, 4)
+        self.assertEqual(set(Notification.objects.values_list('user', flat=True)), {s.id for s in self.students[1:]})
+
+        notification = Notification.objects.first()
+        self.assertEqual((notification.message, notification.notif_type), ("New post", 'forum'))
+        self.assertLess(timezone.now() - notification.created_at, timezone.timedelta(minutes=1))
+
+    # test that students removed from the course are not notified
+    def test_status_filter(self):
+        CourseEnrollments.objects.filter(student=self.students[0]).update(enrollment_status="removed")
+        CourseEnrollments.objects.filter(student=self.students[1]).update(enrollment_status="unenrolled")
+
+        self.assertEqual(fanout_course_notification(self.course.course_id, "New post", 'forum'), 4)
+        self.assertEqual(notify_course_students(self.course.course_id, "New post", 'forum', statuses=["removed"]), 1)
+        self.assertEqual(notify_course_students(self.course.course_id, "New post", 'forum', statuses=[]), 0)
+
+    # test that a forum post enqueues the task once the transaction commits, instead of notifying in the request
+    def test_post_enqueues_task(self):
+        self.client.login(username='student0', password='password')
+        with mock.patch.object(fanout_course_notification, 'delay') as delay, \
+             self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('student-course-view') + f"?course_id={self.course.course_id}", {'action': 'Post!', 'feedback': "Hello"})
+
+        delay.assert_called_once_with(self.course.course_id, mock.ANY, 'forum', self.students[0].id, COURSE_MEMBER_STATUSES)
+        self.assertEqual(list(Notification.objects.values_list('user', flat=True)), [self.teacher.id]) # only the teacher's
+
+    # test that the notifications are still sent when the broker is unavailable
+    def test_broker_unavailable(self):
+        with mock.patch.object(fanout_course_notification, 'delay', side_effect=OperationalError("connection refused")), \
+             self.captureOnCommitCallbacks(execute=True):
+            enqueue_course_notification(self.course.course_id, "New materials", 'materials')
+
+        self.assertEqual(Notification.objects.filter(notif_type='materials').count(), 5)
+
+# test that large courses store one course event per notification, which students read from their courses
+@override_settings(COURSE_EVENT_FANOUT_THRESHOLD=3)
+class CourseEventFeedTests(TestCase):
+
+    # set up dummy data
+    def setUp(self):
+        self.teacher = User.objects.create_user(username='teacher', password='password')
+        UserInfo.objects.create(user=self.teacher, user_type='teacher', first_name='Jane', last_name='Doe', email='janedoe@gmail.com')
+        self.course = CourseDetails.objects.create(teacher=self.teacher, course_name="Math 101", course_description="Introduction to Mathematics")
+
+        self.students = []
+        for i in range(4):
+            student = User.objects.create_user(username=f'student{i}', password='password')
+            UserInfo.objects.create(user=student, user_type='student', first_name='John', last_name=f'Doe{i}', email=f'johndoe{i}@gmail.com')
+            CourseEnrollments.objects.create(course=self.course, student=student, enrollment_status="enrolled")
+            self.students.append(student)
+
+    # messages of a tab of a student's notifications page
+    def get_notifications(self, student, tab):
+        self.client.force_login(student)
+        response = self.client.get(reverse('student-notifications'), {'tab': tab})
+        return [item.message for item in response.context['notifications']], response
+
+    # test that a course above the threshold gets one event instead of a notification per student
+    def test_event_above_threshold(self):
+        fanout_course_notification(self.course.course_id, "New post", 'forum', exclude_user=self.students[0].id)
+
+        self.assertEqual(CourseEvent.objects.count(), 1)
+        self.assertEqual(Notification.objects.count(), 0)
+
+        # the event is shown to every student except its poster
+        self.assertEqual(self.get_notifications(self.students[1], 'forum')[0], ["New post"])
+        self.assertEqual(self.get_notifications(self.students[0], 'forum')[0], [])
+
+    # test that small courses still get one notification per student
+    def test_notifications_below_threshold(self):
+        CourseEnrollments.objects.filter(student=self.students[3]).update(enrollment_status="removed")
+        fanout_course_notification(self.course.course_id, "New materials", 'materials')
+
+        self.assertEqual(CourseEvent.objects.count(), 0)
+        self.assertEqual(Notification.objects.count(), 3)
+
+    # test that events are merged with personal notifications, newest first
+    def test_merged_feed(self):
+        Notification.objects.create(user=self.students[1], message="Personal", notif_type='forum')
+        CourseEvent.objects.create(course=self.course, message="Course-wide", notif_type='forum')
+
+        self.assertEqual(self.get_notifications(self.students[1], 'forum')[0], ["Course-wide", "Personal"])
+
+    # test that students only see events posted while they were a member of the course
+    def test_enrollment_window(self):
+        CourseEvent.objects.create(course=self.course, message="Before", notif_type='materials')
+        CourseEvent.objects.filter(message="Before").update(created_at=timezone.now() - timezone.timedelta(days=1))
+        CourseEvent.objects.create(course=self.course, message="After", notif_type='materials')
+
+        self.assertEqual(self.get_notifications(self.students[1], 'materials')[0], ["After"])
+
+        CourseEnrollments.objects.filter(student=self.students[1]).update(enrollment_status="removed")
+        self.assertEqual(self.get_notifications(self.students[1], 'materials')[0], [])
+
+    # test that events are shown as new until the student marks everything as read
+    def test_watermark(self):
+        CourseEvent.objects.create(course=self.course, message="New post", notif_type='forum')
+
+        _, response = self.get_notifications(self.students[1], 'forum')
+        self.assertTrue(response.context['notifications'][0].unread)
+
+        self.client.post(reverse('student-notifications'), {'action': 'Mark all as read'})
+        _, response = self.get_notifications(self.students[1], 'forum')
+        self.assertFalse(response.context['notifications'][0].unread)
+        self.assertEqual(response.context['unread_total'], 0)
+
+# test the read state of notifications and the cached unread counts shown in the header
+class UnreadNotificationTests(TestCase):
+
+    # set up dummy data
+    def setUp(self):
+        without_deadline_index(self)
+        cache.clear()
+        self.teacher = User.objects.create_user(username='teacher', password='password')
+        UserInfo.objects.create(user=self.teacher, user_type='teacher', first_name='Jane', last_name='Doe', email='janedoe@gmail.com')
+        self.student = User.objects.create_user(username='student', password='password')
+        UserInfo.objects.create(user=self.student, user_type='student', first_name='John', last_name='Doe', email='johndoe@gmail.com')
+
+        self.course = CourseDetails.objects.create(teacher=self.teacher, course_name="Math 101", course_description="Introduction to Mathematics")
+        CourseEnrollments.objects.create(course=self.course, student=self.student, enrollment_status="enrolled")
+        Notification.objects.create(user=self.student, message="New post", notif_type='forum')
+        Notification.objects.create(user=self.student, message="Meeting accepted", notif_type='qna')
+        self.client.login(username='student', password='password')
+
+    # test that the header shows the unread counts, which are only counted once
+    def test_header_badge(self):
+        response = self.client.get(reverse('student-notifications'))
+        self.assertEqual(response.context['unread_total'], 2)
+        self.assertEqual(response.context['unread_counts']['forum'], 1)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('student-home'))
+        self.assertFalse(any("webapp_notification" in query['sql'] for query in queries))
+
+    # test that a new notification is added to the cached count once it is committed
+    def test_count_incremented(self):
+        get_unread_counts(self.student)
+        with self.captureOnCommitCallbacks(execute=True):
+            Notification.objects.create(user=self.student, message="Another post", notif_type='forum')
+
+        self.assertEqual(cache.get(UNREAD_KEY.format(user_id=self.student.id, notif_type='forum')), 2)
+
+    # test that a course-wide fan-out clears the counts of the students it notifies
+    def test_fanout_clears_counts(self):
+        get_unread_counts(self.student)
+        with self.captureOnCommitCallbacks(execute=True):
+            fanout_course_notification(self.course.course_id, "New materials", 'materials')
+
+        self.assertIsNone(cache.get(UNREAD_KEY.format(user_id=self.student.id, notif_type='materials')))
+        self.assertEqual(get_unread_counts(self.student)['materials'], 1)
+
+    # test that marking all notifications as read is a single UPDATE and resets the counts
+    def test_mark_all_read(self):
+        with CaptureQueriesContext(connection) as queries:
+            mark_all_read(self.student)
+
+        self.assertEqual(len([q for q in queries if q['sql'].startswith('UPDATE "webapp_notification"')]), 1)
+        self.assertFalse(Notification.objects.filter(is_read=False).exists())
+        self.assertEqual(sum(get_unread_counts(self.student).values()), 0)
+
+        response = self.client.get(reverse('student-notifications'))
+        self.assertFalse(response.context['notifications'][0].unread)
+
+    # test that the counts are still shown when the cache is unavailable
+    def test_cache_unavailable(self):
+        with mock.patch('webapp.notifications.cache.get_many', side_effect=RedisError("connection refused")), \
+             self.assertLogs('webapp.notifications', 'WARNING'):
+            self.assertEqual(get_unread_counts(self.student)['qna'], 1)
+
+# test the paginated notification tabs and the archiving of old notifications
+@override_settings(NOTIFICATION_PAGE_SIZE=2)
+class NotificationPageTests(TestCase):
+
+    # set up dummy data
+    def setUp(self):
+        cache.clear()
+        self.teacher = User.objects.create_user(username='teacher', password='password')
+        UserInfo.objects.create(user=self.teacher, user_type='teacher', first_name='Jane', last_name='Doe', email='janedoe@gmail.com')
+        self.student = User.objects.create_user(username='student', password='password')
+        UserInfo.objects.create(user=self.student, user_type='student', first_name='John', last_name='Doe', email='johndoe@gmail.com')
+
+        self.course = CourseDetails.objects.create(teacher=self.teacher, course_name="Math 101", course_description="Introduction to Mathematics")
+        enrollment = CourseEnrollments.objects.create(course=self.course, student=self.student, enrollment_status="enrolled")
+        CourseEnrollments.objects.filter(pk=enrollment.pk).update(created_at=timezone.now() - timezone.timedelta(days=1))
+        self.client.login(username='student', password='password')
+
+    # sets the creation time of the given notifications or events to the given number of minutes ago
+    def set_age(self, items, minutes):
+        type(items[0]).objects.filter(pk__in=[item.pk for item in items]).update(created_at=timezone.now() - timezone.timedelta(minutes=minutes))
+
+    # follows the 'older' links from the first page of a tab, returning the messages of every page
+    def get_all_pages(self, url, tab):
+        pages, query = [], {'tab': tab}
+        while query is not None:
+            response = self.client.get(url, query)
+            pages.append([item.message for item in response.context['notifications']])
+            next_query = response.context['page'].next_query
+            query = QueryDict(next_query) if next_query else None
+        return pages
+
+    # test that a tab pages through the student's notifications and course events together, newest first
+    def test_merged_pages(self):
+        for minutes, message in ((5, "Post 5"), (3, "Post 3"), (1, "Post 1")):
+            self.set_age([Notification.objects.create(user=self.student, message=message, notif_type='forum')], minutes)
+        for minutes, message in ((4, "Event 4"), (2, "Event 2")):
+            self.set_age([CourseEvent.objects.create(course=self.course, message=message, notif_type='forum')], minutes)
+        Notification.objects.create(user=self.student, message="Materials", notif_type='materials')
+
+        pages = self.get_all_pages(reverse('student-notifications'), 'forum')
+        self.assertEqual(pages, [["Post 1", "Event 2"], ["Post 3", "Event 4"], ["Post 5"]])
+        self.assertEqual(self.get_all_pages(reverse('student-notifications'), 'materials'), [["Materials"]])
+
+    # test that a position with values of the wrong type starts its list from the newest item
+    def test_invalid_cursor(self):
+        Notification.objects.create(user=self.student, message="Post", notif_type='forum')
+        CourseEvent.objects.create(course=self.course, message="Event", notif_type='forum')
+
+        for positions in ([["yesterday", 1], None], [[{"a": 1}, 1], None], [None, [[1], 2 ** 70]]):
+            response = self.client.get(reverse('student-notifications'), {'tab': 'forum', 'cursor': encode_cursor(positions)})
+            self.assertEqual(sorted(item.message for item in response.context['notifications']), ["Event", "Post"])
+
+    # test that the teacher's tabs show their own notifications of each type
+    def test_teacher_tabs(self):
+        Notification.objects.create(user=self.teacher, message="New enrollment", notif_type='enrollment')
+        Notification.objects.create(user=self.teacher, message="New post", notif_type='forum')
+        self.client.login(username='teacher', password='password')
+
+        self.assertEqual(self.get_all_pages(reverse('teacher-notifications'), 'enrollment'), [["New enrollment"]])
+        self.assertEqual(self.get_all_pages(reverse('teacher-notifications'), 'forum'), [["New post"]])
+
+    # test that notifications older than the retention period are moved to the archive in batches
+    @override_settings(NOTIFICATION_RETENTION_DAYS=30)
+    def test_archive(self):
+        old = [Notification.objects.create(user=self.student, message=f"Old {i}", notif_type='forum') for i in range(3)]
+        self.set_age(old, 31 * 24 * 60)
+        Notification.objects.create(user=self.student, message="Recent", notif_type='forum')
+        get_unread_counts(self.student)
+
+        self.assertEqual(archive_old_notifications(batch_size=2), 3)
+        self.assertEqual(list(Notification.objects.values_list('message', flat=True)), ["Recent"])
+        self.assertEqual(sorted(NotificationArchive.objects.values_list('notif_id', flat=True)), [n.pk for n in old])
+        self.assertEqual(get_unread_counts(self.student)['forum'], 1) # the archived notifications are no longer unread
+
+        self.assertEqual(archive_old_notifications(), 0)
+
+    # test that the archive task is skipped while another process holds its lease
+    def test_archive_task_lease(self):
+        with mock.patch('webapp.tasks.maintenance_lease') as lease:
+            lease.return_value.__enter__.return_value = False
+            self.assertIsNone(archive_notifications_task())
+
+# test that new notifications are pushed to the users' open pages
+class NotificationPushTests(TransactionTestCase):
+
+    # set up dummy data
+    def setUp(self):
+        cache.clear()
+        self.teacher = User.objects.create_user(username='teacher', password='password')
+        UserInfo.objects.create(user=self.teacher, user_type='teacher', first_name='Jane', last_name='Doe', email='janedoe@gmail.com')
+        self.student = User.objects.create_user(username='student', password='password')
+        UserInfo.objects.create(user=self.student, user_type='student', first_name='John', last_name='Doe', email='johndoe@gmail.com')
+
+        self.course = CourseDetails.objects.create(teacher=self.teacher, course_name="Math 101", course_description="Introduction to Mathematics")
+        CourseEnrollments.objects.create(course=self.course, student=self.student, enrollment_status="enrolled")
+
+    # opens a notification WebSocket as the given user
+    async def connect(self, user):
+        communicator = WebsocketCommunicator(NotificationConsumer.as_asgi(), "/ws/notifications/")
+        communicator.scope["user"] = user
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        return communicator
+
+    # test that a user's own notifications and their courses' notifications are pushed to them
+    def test_push(self):
+        async def run():
+            student = await self.connect(self.student)
+            teacher = await self.connect(self.teacher)
+
+            await database_sync_to_async(Notification.objects.create)(user=self.student, message="Meeting accepted", notif_type='qna')
+            self.assertEqual((await student.receive_json_from())['message'], "Meeting accepted")
+
+            await database_sync_to_async(fanout_course_notification)(self.course.course_id, "New materials", 'materials')
+            self.assertEqual((await student.receive_json_from())['notif_type'], 'materials')
+            self.assertTrue(await teacher.receive_nothing()) # the teacher is not a student of the course
+
+            await student.disconnect()
+            await teacher.disconnect()
+
+        async_to_sync(run)()
+
+    # test that course-wide notifications are not pushed to the user who caused them
+    def test_excluded_user(self):
+        async def run():
+            student = await self.connect(self.student)
+            await database_sync_to_async(fanout_course_notification)(self.course.course_id, "New post", 'forum', exclude_user=self.student.id)
+            self.assertTrue(await student.receive_nothing())
+            await student.disconnect()
+
+        async_to_sync(run)()
+
+    # test that a count shown while a course notification is being created is cleared once it is committed
+    def test_unread_count_shown_during_fanout(self):
+        notify = notify_course_students
+        def notify_after_count(*args, **kwargs):
+            self.assertEqual(get_unread_counts(self.student)['materials'], 0) # cached before the notification exists
+            return notify(*args, **kwargs)
+
+        with mock.patch('webapp.notifications.notify_course_students', side_effect=notify_after_count):
+            notify_course(self.course.course_id, "New materials", 'materials')
+        self.assertEqual(get_unread_counts(self.student)['materials'], 1)
+
+    # test that anonymous users cannot connect
+    def test_anonymous(self):
+        async def run():
+            communicator = WebsocketCommunicator(NotificationConsumer.as_asgi(), "/ws/notifications/")
+            communicator.scope["user"] = AnonymousUser()
+            connected, _ = await communicator.connect()
+            self.assertFalse(connected)
+
+        async_to_sync(run)()
+
+################# UNIT TESTS FOR EMAIL DIGESTS #################
+
+# test that email alerts are queued per user and sent as one digest email per user
+@override_settings(EMAIL_ALERTS_ENABLED=True)
+class EmailDigestTests(TestCase):
+
+    # set up dummy data
+    def setUp(self):
+        self.teacher = User.objects.create_user(username='teacher', password='password')
+        UserInfo.objects.create(user=self.teacher, user_type='teacher', first_name='Jane', last_name='Doe', email='janedoe@gmail.com', email_alert=True)
+        self.course = CourseDetails.objects.create(teacher=self.teacher, course_name="Math 101", course_description="Introduction to Mathematics")
+
+        # students 0-2 have email alerts on, students 3-4 do not
+        self.students = []
+        for i in range(5):
+            student = User.objects.create_user(username=f'student{i}', password='password')
+            UserInfo.objects.create(user=student, user_type='student', first_name='John', last_name=f'Doe{i}', email=f'johndoe{i}@gmail.com', email_alert=i < 3)
+            CourseEnrollments.objects.create(course=self.course, student=student, enrollment_status="enrolled")
+            self.students.append(student)
+
+    # test that a course notification queues an alert for each student with email alerts on, with a single statement
+    def test_queue_course_alerts(self):
+        student_ids = CourseEnrollments.objects.filter(course=self.course).exclude(student=self.students[0]).values_list('student_id', flat=True)
+        with self.assertNumQueries(1):
+            count = queue_email_alerts(student_ids, "New Course Comment", "New post")
+
+        self.assertEqual(count, 2)
+        self.assertEqual(set(EmailDigestEntry.objects.values_list('user', flat=True)), {self.students[1].id, self.students[2].id})
+
+        entry = EmailDigestEntry.objects.first()
+        self.assertEqual((entry.subject, entry.message), ("New Course Comment", "New post"))
+        self.assertLess(timezone.now() - entry.created_at, timezone.timedelta(minutes=1))
+
+    # test that a teacher's post queues the students' alerts in the post's transaction
+    def test_teacher_post_queues_alerts(self):
+        self.client.login(username='teacher', password='password')
+        session = self.client.session
+        session['course_id'] = self.course.course_id
+        session.save()
+
+        # the alerts are written by the request itself, not by the fan-out task
+        with mock.patch.object(fanout_course_notification, 'delay') as delay:
+            self.client.post(reverse('teacher-view-course'), {'action': 'Post!', 'feedback': "Hello"})
+        delay.assert_not_called() # only enqueued once the transaction commits
+        self.assertEqual(set(EmailDigestEntry.objects.values_list('user', flat=True)), {s.id for s in self.students[:3]})
+
+    # test that nothing is queued when email alerts are disabled
+    def test_alerts_disabled(self):
+        with override_settings(EMAIL_ALERTS_ENABLED=False), self.assertNumQueries(0):
+            self.assertEqual(queue_email_alert(self.teacher.id, "New Course Comment", "New post"), 0)
+        self.assertEqual(queue_email_alerts([], "New Course Comment", "New post"), 0)
+
+    # test that each user's pending alerts are queued as one email in the outbox, and deleted
+    def test_queue_digests(self):
+        queue_email_alert(self.students[0].id, "E-Meeting Request Accepted", "Your meeting request has been accepted")
+        queue_email_alert(self.students[0].id, "New Course Comment", "<b>New post</b>")
+        queue_email_alert(self.students[1].id, "New Course Comment", "New post")
+
+        self.assertEqual(queue_email_digests(batch_size=1), 2)
+
+        first, second = EmailOutbox.objects.order_by('email_id')
+        self.assertEqual((first.to_email, first.subject), ('johndoe0@gmail.com', "You have 2 new notifications on Voyage"))
+        self.assertIn("Your meeting request has been accepted", first.html_content)
+        self.assertIn("&lt;b&gt;New post&lt;/b&gt;", first.html_content) # messages are escaped
+        self.assertEqual((second.to_email, second.subject, second.html_content), ('johndoe1@gmail.com', "New Course Comment", "New post"))
+        self.assertFalse(EmailDigestEntry.objects.exists())
+
+        self.assertEqual(queue_email_digests(), 0)
+
+    # test that users who turned email alerts off after their alerts were queued are not sent them
+    def test_alerts_turned_off(self):
+        queue_email_alert(self.students[0].id, "New Course Comment", "New post")
+        UserInfo.objects.filter(user=self.students[0]).update(email_alert=False)
+
+        self.assertEqual(queue_email_digests(), 0)
+        self.assertFalse(EmailOutbox.objects.exists())
+        self.assertFalse(EmailDigestEntry.objects.exists())
+
+    # test that the views queue alerts for the users involved, in the same transaction as the post
+    def test_views_queue_alerts(self):
+        self.client.login(username='student0', password='password')
+        with mock.patch.object(fanout_course_notification, 'delay'), self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('student-course-view') + f"?course_id={self.course.course_id}", {'action': 'Post!', 'feedback': "Hello"})
+        self.assertEqual(sorted(EmailDigestEntry.objects.values_list('user', 'subject')),
+                         sorted([(self.teacher.id, "New Course Comment"), (self.students[1].id, "New Course Comment"),
+                                 (self.students[2].id, "New Course Comment")]))
+
+        # nothing is saved if the post fails
+        with mock.patch('webapp.views.Notification.objects.create', side_effect=IntegrityError), self.assertRaises(IntegrityError):
+            self.client.post(reverse('student-course-view') + f"?course_id={self.course.course_id}", {'action': 'Post!', 'feedback': "Again"})
+        self.assertEqual(EmailDigestEntry.objects.count(), 3)
+        self.assertEqual(FeedbackForum.objects.count(), 1)
+
+    # test that the periodic task queues the digests, and is skipped while another process holds its lease
+    def test_digest_task(self):
+        queue_email_alert(self.teacher.id, "New Course Comment", "New post")
+        with mock.patch('webapp.tasks.maintenance_lease') as lease:
+            lease.return_value.__enter__.return_value = True
+            self.assertEqual(send_email_digests_task(), 1)
+
+            lease.return_value.__enter__.return_value = False
+            self.assertIsNone(send_email_digests_task())
+        self.assertEqual(list(EmailOutbox.objects.values_list('to_email', 'subject')), [('janedoe@gmail.com', "New Course Comment")])
+
+################# UNIT TESTS FOR EMAIL TRANSPORTS #################
+
+# test the token bucket rate limiter with a fake clock
+class TokenBucketTests(TestCase):
+
+    # test that a full bucket allows a burst, then waits for each new token
+    def test_rate_limit(self):
+        now = [0.0]
+        def sleep(seconds):
+            now[0] += seconds
+        bucket = TokenBucket(rate=2, capacity=3, clock=lambda: now[0], sleep=sleep)
+
+        for _ in range(3):
+            bucket.acquire()
+        self.assertEqual(now[0], 0)
+
+        bucket.acquire()
+        self.assertAlmostEqual(now[0], 0.5)
+
+        now[0] += 10 # refilled up to the capacity only
+        for _ in range(4):
+            bucket.acquire()
+        self.assertAlmostEqual(now[0], 11)
+
+# test that the transports batch identical emails and retry failed requests
+@override_settings(EMAIL_RATE_LIMIT=1000, EMAIL_RATE_BURST=1000)
+class EmailTransportTests(TestCase):
+
+    # test that identical emails are sent together, in batches of batch_size recipients
+    def test_batches(self):
+        transport = LocMemTransport(batch_size=2)
+        messages = [(f"student{i}@gmail.com", "New Course Comment", "New post") for i in range(3)]
+        messages += [("teacher@gmail.com", "New Enrollment", "New student"), ("student0@gmail.com", "New Course Comment", "New post")]
+
+        self.assertEqual(transport.send_many(messages), 3)
+        self.assertEqual(sorted(transport.requests), [["student0@gmail.com", "student1@gmail.com"], ["student2@gmail.com"], ["teacher@gmail.com"]])
+        self.assertEqual(len(transport.outbox), 4) # the duplicate is only sent once
+
+    # test that transient errors are retried with exponential backoff, and permanent ones are not
+    def test_retries(self):
+        sleep = mock.Mock()
+        transport = LocMemTransport(max_attempts=3, backoff=1, sleep=sleep)
+        with mock.patch.object(transport, 'deliver', side_effect=[TransientEmailError("503"), TransientEmailError("429", retry_after=5), None]), \
+             self.assertLogs('webapp.mail', 'WARNING'):
+            transport.send("student@gmail.com", "Subject", "Content")
+        self.assertEqual([c.args[0] for c in sleep.call_args_list], [1, 5])
+
+        with mock.patch.object(transport, 'deliver', side_effect=TransientEmailError("503")) as failing, \
+             self.assertLogs('webapp.mail', 'WARNING'), self.assertRaises(TransientEmailError):
+            transport.send("student@gmail.com", "Subject", "Content")
+        self.assertEqual(failing.call_count, 3)
+
+        with mock.patch.object(transport, 'deliver', side_effect=EmailDeliveryError("400")) as failing, \
+             self.assertRaises(EmailDeliveryError):
+            transport.send("student@gmail.com", "Subject", "Content")
+        self.assertEqual(failing.call_count, 1)
+
+    # test that the wait asked for by the server is capped, so a request stays within the outbox's lease
+    @override_settings(EMAIL_MAX_RETRY_WAIT=10)
+    def test_retry_wait_is_capped(self):
+        sleep = mock.Mock()
+        transport = LocMemTransport(max_attempts=2, sleep=sleep)
+        with mock.patch.object(transport, 'deliver', side_effect=[TransientEmailError("429", retry_after=3600), None]), \
+             self.assertLogs('webapp.mail', 'WARNING'):
+            transport.send("student@gmail.com", "Subject", "Content")
+        sleep.assert_called_once_with(10)
+
+    # test that the shared rate limit waits as long as Redis says, and falls back to the process's own limit without Redis
+    def test_shared_rate_limit(self):
+        sleep = mock.Mock()
+        transport = LocMemTransport(shared_rate=True, sleep=sleep)
+        self.assertIsInstance(transport.bucket, SharedTokenBucket)
+        redis = mock.MagicMock()
+        redis.eval.side_effect = ["0.5", "0"]
+        with mock.patch('webapp.mail.get_redis', return_value=redis):
+            transport.send("student@gmail.com", "Subject", "Content")
+        sleep.assert_called_once_with(0.5)
+        self.assertEqual(redis.eval.call_args.args[1:], (1, SharedTokenBucket.KEY, transport.bucket.rate, transport.bucket.capacity))
+
+        with mock.patch('webapp.mail.get_redis', side_effect=RedisError("down")), self.assertLogs('webapp.mail', 'WARNING'):
+            transport.send("student@gmail.com", "Subject", "Content")
+        self.assertEqual(len(transport.outbox), 2)
+
+    # test that a transport has to implement deliver
+    def test_base_transport_is_abstract(self):
+        with self.assertRaises(TypeError):
+            BaseTransport()
+
+    # test that SendGrid requests have one personalization per recipient, and its errors are classified
+    def test_sendgrid(self):
+        transport = SendGridTransport(api_key="key", from_email="voyage@gmail.com", max_attempts=1)
+        response = mock.Mock(status_code=202, headers={})
+        with mock.patch.object(transport.session, 'post', return_value=response) as post:
+            transport.send_many([("a@gmail.com", "Subject", "Content"), ("b@gmail.com", "Subject", "Content")])
+
+        body = post.call_args.kwargs['json']
+        self.assertEqual(body['personalizations'], [{"to": [{"email": "a@gmail.com"}]}, {"to": [{"email": "b@gmail.com"}]}])
+        self.assertEqual((body['from'], body['subject']), ({"email": "voyage@gmail.com"}, "Subject"))
+        self.assertEqual(transport.session.headers['Authorization'], "Bearer key")
+
+        for status, error in ((429, TransientEmailError), (503, TransientEmailError), (401, EmailDeliveryError)):
+            response.status_code = status
+            with mock.patch.object(transport.session, 'post', return_value=response), self.assertRaises(error) as raised:
+                transport.send("a@gmail.com", "Subject", "Content")
+            self.assertEqual(isinstance(raised.exception, TransientEmailError), error is TransientEmailError)
+
+        with mock.patch.object(transport.session, 'post', side_effect=requests.ConnectionError("refused")), \
+             self.assertRaises(TransientEmailError):
+            transport.send("a@gmail.com", "Subject", "Content")
+
+    # test that the file transport appends one line per email
+    def test_file_transport(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        transport = FileTransport(path=f"{directory}/emails.jsonl")
+
+        transport.send_many([("a@gmail.com", "Subject", "Content"), ("b@gmail.com", "Subject", "Content")])
+        with open(f"{directory}/emails.jsonl") as file:
+            self.assertEqual([json.loads(line)["to"] for line in file], ["a@gmail.com", "b@gmail.com"])
+
+################# UNIT TESTS FOR EMAIL OUTBOX #################
+
+# test that emails are written to the outbox and sent in batches by the dispatcher
+@override_settings(EMAIL_ALERTS_ENABLED=True, EMAIL_OUTBOX_RETRY_DELAY=60, EMAIL_OUTBOX_MAX_ATTEMPTS=2)
+class EmailOutboxTests(TestCase):
+
+    # set up dummy data
+    def setUp(self):
+        self.teacher = User.objects.create_user(username='teacher', password='password')
+        UserInfo.objects.create(user=self.teacher, user_type='teacher', first_name='Jane', last_name='Doe', email='janedoe@gmail.com')
+        self.student = User.objects.create_user(username='student', password='password')
+        UserInfo.objects.create(user=self.student, user_type='student', first_name='John', last_name='Doe', email='johndoe@gmail.com', email_alert=True)
+
+    # test that emails are only queued for users with email alerts on, with a single statement
+    def test_queue_emails(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(queue_emails([self.teacher.id, self.student.id], "Subject", "Content"), 1)
+
+        email = EmailOutbox.objects.get()
+        self.assertEqual((email.to_email, email.subject, email.html_content, email.attempts), ('johndoe@gmail.com', "Subject", "Content", 0))
+        self.assertLessEqual(email.next_attempt_at, timezone.now())
+
+    # test that the dispatcher sends the due emails in batches, up to the number of batches per run
+    def test_dispatch(self):
+        for i in range(5):
+            EmailOutbox.objects.create(to_email=f"student{i}@gmail.com", subject="Subject", html_content="Content")
+        EmailOutbox.objects.create(to_email="later@gmail.com", subject="Subject", html_content="Content",
+                                   next_attempt_at=timezone.now() + timezone.timedelta(minutes=5))
+
+        transport = LocMemTransport()
+        self.assertEqual(dispatch_outbox(transport.send_many, batch_size=2, max_batches=2), 4)
+        self.assertEqual(len(transport.requests), 2)
+        self.assertEqual(dispatch_outbox(transport.send_many, batch_size=2, max_batches=2), 1)
+        self.assertEqual(list(EmailOutbox.objects.values_list('to_email', flat=True)), ["later@gmail.com"])
+
+    # test that the dispatcher claims its batch with SELECT ... FOR UPDATE SKIP LOCKED
+    def test_dispatch_skips_locked(self):
+        EmailOutbox.objects.create(to_email="student@gmail.com", subject="Subject", html_content="Content")
+        with mock.patch.object(EmailOutbox.objects, 'select_for_update', wraps=EmailOutbox.objects.select_for_update) as select:
+            dispatch_outbox(mock.Mock())
+        select.assert_called_with(skip_locked=True)
+
+    # test that emails that failed with a temporary error are retried later, and dropped after too many attempts
+    def test_dispatch_failure(self):
+        EmailOutbox.objects.create(to_email="student@gmail.com", subject="Subject", html_content="Content")
+        transport = LocMemTransport(max_attempts=1)
+
+        with mock.patch.object(transport, 'deliver', side_effect=TransientEmailError("503")) as failing, \
+             self.assertLogs('webapp.outbox', 'WARNING'):
+            self.assertEqual(dispatch_outbox(transport.send_many), 0)
+            email = EmailOutbox.objects.get()
+            self.assertEqual(email.attempts, 1)
+            self.assertGreater(email.next_attempt_at, timezone.now() + timezone.timedelta(seconds=50))
+
+            self.assertEqual(dispatch_outbox(transport.send_many), 0) # not due yet
+            self.assertEqual(failing.call_count, 1)
+
+            EmailOutbox.objects.update(next_attempt_at=timezone.now())
+            dispatch_outbox(transport.send_many)
+        self.assertFalse(EmailOutbox.objects.exists())
+
+    # test that each request's emails are deleted as soon as it succeeds, so a later failure does not send them again
+    def test_dispatch_deletes_sent_requests(self):
+        EmailOutbox.objects.create(to_email="a@gmail.com", subject="First", html_content="Content")
+        EmailOutbox.objects.create(to_email="b@gmail.com", subject="Second", html_content="Content")
+        transport = LocMemTransport(max_attempts=1)
+
+        with mock.patch.object(transport, 'deliver', side_effect=[None, TransientEmailError("503")]), \
+             self.assertLogs('webapp.outbox', 'WARNING'):
+            self.assertEqual(dispatch_outbox(transport.send_many), 1)
+        self.assertEqual(list(EmailOutbox.objects.values_list('to_email', 'attempts')), [("b@gmail.com", 1)])
+
+    # test that a request refused with a permanent error is sent one recipient at a time, and only the refused emails are dropped
+    def test_dispatch_drops_refused_emails(self):
+        for email in ("a@gmail.com", "bad@gmail.com", "c@gmail.com"):
+            EmailOutbox.objects.create(to_email=email, subject="Subject", html_content="Content")
+        transport = LocMemTransport(max_attempts=1)
+        deliver = transport.deliver
+        def refuse_bad(recipients, subject, html_content):
+            if "bad@gmail.com" in recipients:
+                raise EmailDeliveryError("SendGrid returned 400")
+            deliver(recipients, subject, html_content)
+
+        with mock.patch.object(transport, 'deliver', side_effect=refuse_bad), self.assertLogs('webapp', 'WARNING'):
+            self.assertEqual(dispatch_outbox(transport.send_many), 2)
+        self.assertEqual(sorted(email["to"] for email in transport.outbox), ["a@gmail.com", "c@gmail.com"])
+        self.assertFalse(EmailOutbox.objects.exists()) # not retried
+
+    # test that the batch is leased and committed before it is sent, so it is not locked while sending
+    def test_dispatch_leases_batch(self):
+        EmailOutbox.objects.create(to_email="student@gmail.com", subject="Subject", html_content="Content")
+        depth = len(connection.atomic_blocks)
+        def send_many(messages, on_sent, on_failed, before_request):
+            self.assertEqual(len(connection.atomic_blocks), depth) # the claim's transaction has ended
+            self.assertGreater(EmailOutbox.objects.get().next_attempt_at, timezone.now() + timezone.timedelta(minutes=4))
+            self.assertFalse(EmailOutbox.objects.filter(next_attempt_at__lte=timezone.now()).exists())
+
+        with override_settings(EMAIL_OUTBOX_LEASE=300):
+            self.assertEqual(dispatch_outbox(send_many), 0)
+        self.assertTrue(EmailOutbox.objects.exists()) # sent again once the lease expires
+
+    # test that the lease is renewed before a request once half of it has passed, and emails taken by another dispatcher are not sent
+    def test_dispatch_renews_lease(self):
+        EmailOutbox.objects.create(to_email="a@gmail.com", subject="First", html_content="Content")
+        EmailOutbox.objects.create(to_email="b@gmail.com", subject="Second", html_content="Content")
+        taken = EmailOutbox.objects.create(to_email="c@gmail.com", subject="Second", html_content="Content")
+        clock = [timezone.now()]
+        transport = LocMemTransport()
+        deliver = transport.deliver
+        def slow_deliver(recipients, subject, html_content):
+            deliver(recipients, subject, html_content)
+            if subject == "First":
+                clock[0] += timezone.timedelta(seconds=200)
+                # another dispatcher took the email after its lease expired
+                EmailOutbox.objects.filter(pk=taken.pk).update(next_attempt_at=clock[0] + timezone.timedelta(seconds=250))
+
+        with override_settings(EMAIL_OUTBOX_LEASE=300), mock.patch('django.utils.timezone.now', side_effect=lambda: clock[0]), \
+             mock.patch.object(transport, 'deliver', side_effect=slow_deliver), self.assertLogs('webapp.outbox', 'WARNING'):
+            self.assertEqual(dispatch_outbox(transport.send_many), 2)
+        self.assertEqual(transport.requests, [["a@gmail.com"], ["b@gmail.com"]])
+        self.assertEqual(list(EmailOutbox.objects.values_list('pk', flat=True)), [taken.pk]) # left to the other dispatcher
+
+    # test that accepting a meeting request queues the student's email straight away, with the meeting
+    def test_accept_meeting_queues_email(self):
+        request_meeting = RequestMeeting.objects.create(student=self.student, teacher=self.teacher, req_description="Help")
+        start = (timezone.now() + timezone.timedelta(days=2)).replace(second=0, microsecond=0)
+
+        self.client.login(username='teacher', password='password')
+        with mock.patch('webapp.views.schedule_meeting_status_tasks'):
+            self.client.post(reverse('teacher-manage-meetings'), {'request_id': request_meeting.request_id,
+                                                                  'action': 'Accept',
+                                                                  'start_datetime': start.strftime('%Y-%m-%dT%H:%M'),
+                                                                  'duration_minutes': 20})
+
+        self.assertEqual(list(EmailOutbox.objects.values_list('to_email', 'subject')), [('johndoe@gmail.com', "E-Meeting Request Accepted")])
+        self.assertFalse(EmailDigestEntry.objects.exists())
+
+    # test that the dispatcher task sends with the shared transport
+    def test_dispatch_task(self):
+        EmailOutbox.objects.create(to_email="student@gmail.com", subject="Subject", html_content="Content")
+        transport = LocMemTransport()
+        with mock.patch('webapp.tasks.get_transport', return_value=transport):
+            self.assertEqual(dispatch_email_outbox_task(), 1)
+        self.assertEqual(transport.outbox, [{"to": "student@gmail.com", "subject": "Subject", "html_content": "Content"}])
+
+################# UNIT TESTS FOR ASSIGNMENT SUBMISSIONS #################
+
+# test that the submission rows of a new assignment are created in batches, in the background for large courses
+@override_settings(SUBMISSION_TASK_THRESHOLD=3)
+class AssignmentSubmissionCreationTests(TestCase):
+
+    # set up dummy data
+    def setUp(self):
+        without_deadline_index(self)
+        cache.clear()
+        self.teacher = User.objects.create_user(username='teacher', password='password')
+        UserInfo.objects.create(user=self.teacher, user_type='teacher', first_name='Jane', last_name='Doe', email='janedoe@gmail.com')
+        self.course = CourseDetails.objects.create(teacher=self.teacher, course_name="Math 101", course_description="Introduction to Mathematics")
+        self.lesson = LessonDetails.objects.create(course=self.course, lesson_title="Algebra", lesson_description="Basic Algebra")
+
+        self.students = []
+        for i in range(5):
+            student = User.objects.create_user(username=f'student{i}', password='password')
+            UserInfo.objects.create(user=student, user_type='student', first_name='John', last_name=f'Doe{i}', email=f'johndoe{i}@gmail.com')
+            self.students.append(student)
+
+        # uploaded files are written to a temporary media folder
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.client.login(username='teacher', password='password')
+        session = self.client.session
+        session['course_id'] = self.course.course_id
+        session.save()
+
+    # enroll the first n students in the course
+    def enroll(self, n):
+        for student in self.students[:n]:
+            CourseEnrollments.objects.create(course=self.course, student=student, enrollment_status="enrolled")
+
+    # add an assignment through the teacher's page
+    def add_assignment(self):
+        deadline = (timezone.now() + timezone.timedelta(days=7)).strftime('%Y-%m-%dT%H:%M')
+        return self.client.post(reverse('teacher-add-items'), {'action': 'Add Assignment to Lesson', 'lesson': self.lesson.lesson_id,
+                                                                'name': "Assignment 1", 'description': "Exercises", 'deadline': deadline,
+                                                                'upload_file': SimpleUploadedFile("questions.txt", b"questions")})
+
+    # test that rows are created in batches of student ids, and only for students without one
+    def test_batches(self):
+        self.enroll(5)
+        assignment = AssignmentUpload.objects.create(lesson=self.lesson, name="Assignment 1", deadline=timezone.now() + timezone.timedelta(days=1))
+        AssignmentSubmission.objects.create(assignment=assignment, student=self.students[0])
+
+        # one select and one insert per batch, and a final select finding no more students
+        with self.assertNumQueries(5):
+            self.assertEqual(create_assignment_submissions(assignment, batch_size=2), 4)
+
+        self.assertEqual(sorted(AssignmentSubmission.objects.values_list('student', flat=True)), sorted(s.id for s in self.students))
+        self.assertEqual(create_assignment_submissions(assignment), 0)
+
+    # test that small courses get their rows in the request
+    def test_small_course(self):
+        self.enroll(3)
+        with mock.patch.object(create_submissions_task, 'delay') as delay:
+            response = self.add_assignment()
+
+        self.assertRedirects(response, reverse('teacher-view-course'))
+        delay.assert_not_called()
+        self.assertEqual(AssignmentSubmission.objects.filter(submission_status="due").count(), 3)
+
+    # test that large courses get their rows from a background task, with its progress shown on the course page
+    def test_large_course(self):
+        self.enroll(5)
+        with mock.patch.object(create_submissions_task, 'delay') as delay, self.captureOnCommitCallbacks(execute=True):
+            response = self.add_assignment()
+
+        self.assertRedirects(response, reverse('teacher-view-course'), fetch_redirect_response=False)
+        assignment = AssignmentUpload.objects.get()
+        delay.assert_called_once_with(assignment.assign_id)
+        self.assertFalse(AssignmentSubmission.objects.exists())
+
+        response = self.client.get(reverse('teacher-view-course'))
+        self.assertEqual(response.context['submission_jobs'], [{"assign_id": assignment.assign_id, "name": "Assignment 1", "created": 0, "total": 5, "done": False}])
+        self.assertContains(response, "Creating submissions for")
+
+        with override_settings(SUBMISSION_BATCH_SIZE=2):
+            self.assertEqual(create_submissions_task(assignment.assign_id), 5)
+        response = self.client.get(reverse('teacher-submission-progress') + f"?assign_id={assignment.assign_id}")
+        self.assertEqual(response.json(), {"created": 5, "total": 5, "done": True})
+
+        # finished jobs are no longer shown
+        self.assertEqual(self.client.get(reverse('teacher-view-course')).context['submission_jobs'], [])
+        self.assertEqual(self.client.session['submission_jobs'], [])
+
+    # test that the rows are still created when the broker is unavailable
+    def test_broker_unavailable(self):
+        self.enroll(5)
+        with mock.patch.object(create_submissions_task, 'delay', side_effect=OperationalError("connection refused")), \
+             self.captureOnCommitCallbacks(execute=True):
+            self.add_assignment()
+
+        self.assertEqual(AssignmentSubmission.objects.count(), 5)
+        self.assertEqual(get_submission_progress(AssignmentUpload.objects.get().assign_id), {"created": 5, "total": 5, "done": True})
+
+        # the finished job is not shown on the course page
+        self.assertEqual(self.client.get(reverse('teacher-view-course')).context['submission_jobs'], [])
+
+    # test that a finished progress record is not replaced by an unfinished one
+    def test_progress_not_reset(self):
+        set_submission_progress(1, 5, 5, done=True)
+        set_submission_progress(1, 0, 5)
+        self.assertEqual(get_submission_progress(1), {"created": 5, "total": 5, "done": True})
+
+    # test that the task does nothing for an assignment deleted before it ran
+    def test_deleted_assignment(self):
+        self.assertEqual(create_submissions_task(12345), 0)
+        self.assertEqual(self.client.get(reverse('teacher-submission-progress') + "?assign_id=12345").status_code, 404)
+        self.assertEqual(self.client.get(reverse('teacher-submission-progress') + "?assign_id=abc").status_code, 404)
+
+    # test that only the teacher of the assignment's course can see its progress
+    def test_progress_of_other_teachers_assignment(self):
+        assignment = AssignmentUpload.objects.create(lesson=self.lesson, name="Assignment 1", deadline=timezone.now() + timezone.timedelta(days=1))
+        set_submission_progress(assignment.assign_id, 2, 5)
+        url = reverse('teacher-submission-progress') + f"?assign_id={assignment.assign_id}"
+        self.assertEqual(self.client.get(url).json(), {"created": 2, "total": 5, "done": False})
+
+        other = User.objects.create_user(username='other', password='password')
+        UserInfo.objects.create(user=other, user_type='teacher', first_name='Alan', last_name='Smith', email='alansmith@gmail.com')
+        self.client.login(username='other', password='password')
+        self.assertEqual(self.client.get(url).status_code, 404)
@@ -61,6 +61,7 @@ urlpatterns = [
     path('teacher/courses/', teacher_course_setting, name='teacher-course-setting'),
     path('teacher/courses/view', teacher_view_course, name='teacher-view-course'),
     path('teacher/courses/add-items', teacher_add_course_items, name='teacher-add-items'),
+    path('teacher/courses/submission-progress', teacher_submission_progress, name='teacher-submission-progress'),
     path('get-materials/<int:lesson_id>/', get_materials, name='get-materials'),
     path('get-assignments/<int:lesson_id>/', get_assignments, name='get_assignments'),
     path('teacher/courses/delete-items', teacher_delete_course_items, name='teacher-delete-items'),
@@ -68,10 +69,14 @@ urlpatterns = [
     path('teacher/courses/enrolments', teacher_view_enrolments, name='teacher-view-enrolments'),
     path('teacher/meeting/manage', teacher_manage_meetings, name='teacher-manage-meetings'),
     path('teacher/search/', teacher_search_person, name='teacher-search-person'),
+    path('teacher/search/autocomplete', teacher_search_autocomplete, name='teacher-search-autocomplete'),
     path('teacher/notifications/', teacher_notifications, name='teacher-notifications'),
     path('teacher/profile/settings', teacher_profile, name='teacher-profile-settings'),
     path('teacher/profile/password', teacher_profile_password, name='teacher-profile-password'),
 
+    # Course forum (student & teacher)
+    path('courses/forum', course_forum, name='course-forum'),
+
     # E-meeting view
     path('join/meeting/', chat_meeting, name='join-meeting'),
 ]
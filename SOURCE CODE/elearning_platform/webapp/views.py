@@ -1,16 +1,30 @@
 from asgiref.sync import async_to_sync
+from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth import authenticate, login, logout, update_session_auth_hash
 from django.db import transaction
-from django.db.models import Q, Case, When, Value, IntegerField
-from django.http import HttpResponse, JsonResponse
+from django.db.models import Case, When, Value, IntegerField, Prefetch
+from django.http import HttpResponse, HttpResponseForbidden, JsonResponse
 from django.shortcuts import render, redirect, get_object_or_404
+from django.template.loader import render_to_string
 from django.utils import timezone
+from django.utils.html import escape
 from channels.layers import get_channel_layer
 from collections import defaultdict
+from .dashboard import get_cached_homepage, cache_homepage, invalidate_homepage
+from .deadlines import get_upcoming_deadlines, index_assignment, index_course_deadlines, unindex_course_deadlines, unindex_assignments
+from .digests import queue_email_alert, queue_email_alerts
 from .decorators import *
 from .forms import *
 from .models import *
+from .progress import *
+from .notifications import COURSE_MEMBER_STATUSES, course_enrollments, course_student_ids, paginate_notifications, get_watermark, mark_all_read
+from .outbox import queue_emails
+from .outline import get_course_outline, get_outline_lesson
+from .pagination import keyset_paginate, cached_count
+from .search import search_courses, search_people, autocomplete_people
+from .status import invalidate_next_transition
+from .submissions import count_course_students, create_assignment_submissions, get_submission_progress
 from .tasks import *
 import datetime
 
@@ -113,51 +127,64 @@ def user_logout(request):
 @student_login
 def student_homepage(request):
     student_profile = request.user # gets currently logged-in student's profile
-    # gets courses student is enrolled in
-    courses_enrolled = CourseEnrollments.objects.filter(student=student_profile, enrollment_status="enrolled").order_by('-created_at')
-
-    # gets all open assignments based on courses enrolled in
-    c = courses_enrolled.values_list("course", flat=True)
-    assignments = AssignmentSubmission.objects.filter(
-        Q(submission_status="due") | Q(submission_status="submitted"),
-        assignment__assignment_status=True,
-        assignment__lesson__course__in=c,
-        student=student_profile
-    ).order_by('assignment__deadline')
-
-    progress_data = {} # initialises an empty dictionary to store progress data
-
-    for enrolment in courses_enrolled:
-        course = enrolment.course  # get course info from enrolment
-
-        # get all assignments for the course
-        total_assignments = AssignmentUpload.objects.filter(lesson__course=course).count()
-
-        # get count of submitted assignments
-        submitted_count = AssignmentSubmission.objects.filter(
-            assignment__lesson__course=course, student=student_profile, submission_status="submitted"
-        ).count()
-    
-        # calculate progress as percentage
-        progress_percentage = (submitted_count / total_assignments) * 100 if total_assignments > 0 else 0
-
-        # store data in dictionary for each course
-        progress_data[course.course_id] = {
-            "course": course,
-            "submitted": submitted_count,
-            "total": total_assignments,
-            "progress": progress_percentage,
-        }
 
-    return render(request, "webapp/s_homepage.html", {'courses_enrolled': courses_enrolled,
-                                                      'student_profile': student_profile,
-                                                      'dict': progress_data,
-                                                      'assignments': assignments})
+    # uses the cached page data unless the student's courses, assignments or submissions have changed since
+    cache_key, context = get_cached_homepage(student_profile.id)
+
+    if context is None:
+        # gets courses student is enrolled in (with course and teacher info loaded in the same query)
+        courses_enrolled = CourseEnrollments.objects.filter(student=student_profile, enrollment_status="enrolled") \
+                                                    .select_related('course__teacher__userinfo') \
+                                                    .order_by('-created_at')
+
+        # gets the next open assignments of the courses enrolled in from the student's deadline index
+        # (status is computed from the deadline when the query runs)
+        assignments = AssignmentSubmission.objects.open().with_status().filter(student=student_profile) \
+                                                  .select_related('assignment__lesson__course__teacher__userinfo') \
+                                                  .order_by('assignment__deadline')
+        assign_ids = get_upcoming_deadlines(student_profile.id, settings.UPCOMING_DEADLINES_LIMIT)
+
+        if assign_ids is None:
+            # index unavailable, so look up the assignments through the courses enrolled in
+            c = courses_enrolled.values_list("course", flat=True)
+            assignments = list(assignments.filter(assignment__lesson__course__in=c)[:settings.UPCOMING_DEADLINES_LIMIT])
+        else:
+            assignments = list(assignments.filter(assignment_id__in=assign_ids))
+            # removes index entries of assignments that have since been deleted
+            unindex_assignments(student_profile.id, set(assign_ids) - {a.assignment_id for a in assignments})
+
+        # gets the stored progress of every enrolled course in one lookup
+        course_progress = get_student_progress(student_profile, [enrolment.course_id for enrolment in courses_enrolled])
+
+        progress_data = {} # initialises an empty dictionary to store progress data
+
+        for enrolment in courses_enrolled:
+            course = enrolment.course  # get course info from enrolment
+            progress = course_progress[course.course_id]
+
+            # store data in dictionary for each course
+            progress_data[course.course_id] = {
+                "course": course,
+                "submitted": progress.submitted,
+                "total": progress.total,
+                "progress": progress.progress,
+            }
+
+        context = {'courses_enrolled': list(courses_enrolled),
+                   'dict': progress_data,
+                   'assignments': assignments}
+
+        # cached until the next deadline at the latest, when that assignment is no longer open
+        next_deadline = context['assignments'][0].assignment.deadline if context['assignments'] else None
+        cache_homepage(cache_key, context, expires=next_deadline)
+
+    return render(request, "webapp/s_homepage.html", {**context, 'student_profile': student_profile})
 
 @student_login
 def student_view_courses(request):
-    # get all courses
-    courses = CourseDetails.objects.all()
+    # get all courses (with teacher info loaded in the same query)
+    courses = CourseDetails.objects.select_related('teacher__userinfo')
+    ordering = [('course_id', False)]
     # initialises empty form or with data for filtering through courses
     form = FilterCourseForm(request.GET or None)
 
@@ -172,27 +199,22 @@ def student_view_courses(request):
                 search_descriptor = request.GET.get('courseDescriptor', '')
                 search_instructor = request.GET.get('instructor', '')
 
-                # if filter includes course info
-                if search_descriptor:
-                    filtered_courses = courses.filter(Q(course_name__icontains=search_descriptor) |
-                                       Q(course_description__icontains=search_descriptor))
-                
-                # if filter includes teacher info
-                if search_instructor:
-                    filtered_courses = filtered_courses.filter(Q(teacher__userinfo__first_name__icontains=search_instructor) |
-                                       Q(teacher__userinfo__middle_name__icontains=search_instructor) |
-                                       Q(teacher__userinfo__last_name__icontains=search_instructor))
-                
-                # set courses as newly filtered list
-                courses = filtered_courses
+                # filter courses by course info and/or teacher info using the search index
+                # (best matches first)
+                courses = search_courses(courses, descriptor=search_descriptor, instructor=search_instructor)
+                ordering = [('search_rank', True), ('course_id', False)]
 
             # if the action is 'clear filter', clear form data
             elif action == 'Clear Filters':
                 form = FilterCourseForm()
     
-    # get count of total courses found
-    result_message = f"Courses found: {len(courses)}"
-    return render(request, "webapp/s_viewcourses.html", {"courses": courses,
+    # get count of total courses found (cached, so paging through results does not count them again)
+    result_message = f"Courses found: {cached_count(courses)}"
+
+    # get the requested page of courses
+    page = keyset_paginate(request, courses, ordering)
+    return render(request, "webapp/s_viewcourses.html", {"courses": page.items,
+                                                         "page": page,
                                                          "form": form,
                                                          "result_message": result_message})
 
@@ -203,26 +225,34 @@ def view_course_detail(request):
         return HttpResponse("Course ID is required", status=400)
     else:
         course_id = request.GET.get('course_id')
-        course_profile = get_object_or_404(CourseDetails, course_id=course_id)
+        course_profile = get_object_or_404(CourseDetails.objects.select_related('teacher__userinfo'), course_id=course_id)
 
     # gets lesson data if enrolled
     enroll_status = None
     lessons = []  # stores all lessons of this course
     user_submissions = {} # stores all assignment submissions relating to this course
+    open_assignment_ids = set() # assignments of this course whose deadline has not passed
     try:
         enroll_status = CourseEnrollments.objects.filter(student=request.user, course_id=course_profile.course_id).first().enrollment_status
         if enroll_status == 'enrolled' or enroll_status == 'unenrolled':
-            lessons = LessonDetails.objects.filter(course=course_profile) # get all lessons for this course
-
-            for lesson in lessons:
-                for assignment in lesson.assignments.all():
-                    submission = AssignmentSubmission.objects.filter(assignment=assignment, student=request.user).first()
-                    user_submissions[assignment.assign_id] = submission  # store the submission in the dictionary
+            # get all lessons for this course with their materials and assignments (from the cached course outline)
+            lessons = get_course_outline(course_profile.course_id)
+
+            # get all of the student's submissions for this course in one query, keyed by assignment
+            # (ordered so that the earliest submission is kept if there are several)
+            submissions = AssignmentSubmission.objects.filter(assignment__lesson__course=course_profile, student=request.user) \
+                                                      .order_by('-upload_id')
+            user_submissions = {submission.assignment_id: submission for submission in submissions}
+
+            # the outline is cached, so whether each assignment is still open is computed by the database when the page is shown
+            open_assignment_ids = set(AssignmentUpload.objects.filter(lesson__course=course_profile).with_status()
+                                                              .filter(is_open=True).values_list('assign_id', flat=True))
     except:
         pass
 
     form = AddFeedbackForm() # initialise feedback form
-    feedbacks = FeedbackForum.objects.filter(course=course_profile).order_by('-created_at') # get all feedbacks relating to this course
+    # get the newest feedbacks relating to this course (older ones are loaded by the page from course_forum)
+    forum_page = get_forum_page(request, course_profile.course_id)
 
     if request.method == "POST":
         # gets the 'action' parameter of the POST request
@@ -230,36 +260,26 @@ def view_course_detail(request):
         
         # if feedback is posted to forum
         if action_type == "Post!":
-            # saves new feedback to database
-            # and displays new comment at the top of the forum
-            FeedbackForum.objects.create(
-                feedback=request.POST.get('feedback'),
-                user=request.user,
-                course=course_profile
-            )
-
-            # sends in-app notification to teacher + all students enrolled in this course
             message = f"Student @{request.user.userinfo.display_name} posted a comment in the {course_profile.course_name} course."
-            enrolled_students = CourseEnrollments.objects.filter(course=course_profile) \
-                                                        .exclude(student=request.user)
-
-            notifications = []
-            for enrollment in enrolled_students:
-                student = enrollment.student
-                notifications.append(Notification(user_id=student.userinfo.user_id, message=message, notif_type='forum'))
-
-                # uncomment to send email notifications
-                # if student.userinfo.email_alert:
-                #     async_send_email.delay(student.userinfo.email, "New Course Comment", message)
-            
-            Notification.objects.bulk_create(notifications)
 
-            teacher = course_profile.teacher.userinfo
-            Notification.objects.create(user_id=teacher.user_id, message=message, notif_type='forum')
-            
-            # uncomment to send email notifications
-            # if teacher.email_alert:
-            #     async_send_email.delay(teacher.email, "New Course Comment", message)
+            # the post, notifications and email alerts are saved together
+            with transaction.atomic():
+                # saves new feedback to database
+                # and displays new comment at the top of the forum
+                FeedbackForum.objects.create(
+                    feedback=request.POST.get('feedback'),
+                    user=request.user,
+                    course=course_profile
+                )
+
+                # sends in-app notification to teacher + all students enrolled in this course
+                # (the students' notifications are created by a background task once the post is saved)
+                enqueue_course_notification(course_profile.course_id, message, 'forum', exclude_user=request.user.id)
+                Notification.objects.create(user_id=course_profile.teacher_id, message=message, notif_type='forum')
+
+                # email alerts for those who have them on, sent in their next email digest
+                queue_email_alerts(course_student_ids(course_profile.course_id, exclude_user_id=request.user.id), "New Course Comment", message)
+                queue_email_alert(course_profile.teacher_id, "New Course Comment", message)
 
             return redirect(f"/student/courses/?course_id={course_id}")
         
@@ -268,21 +288,24 @@ def view_course_detail(request):
             # deletes all related assignment submission and enrollment details
             AssignmentSubmission.objects.filter(assignment__lesson__course=course_profile, student=request.user).delete()
             CourseEnrollments.objects.filter(student=request.user, course=course_profile).delete()
+            record_unenrollment(request.user, course_profile.course_id)
+            unindex_course_deadlines(request.user.id, course_profile.course_id)
             return redirect(f"/student/courses/?course_id={course_id}") # redirects to page again (cannot view course materials now)
 
         # if student clicks on enroll
         elif action_type == 'Enroll':
-            # new enrollment instance created
-            CourseEnrollments.objects.create(course=course_profile,
-                                                student=request.user,
-                                                enrollment_status="enrolled")
-            
             # assignment submission instance for all assignments created
             today = timezone.now().date()
             assignments_due = AssignmentUpload.objects.filter(lesson__course=course_profile, deadline__gt=today)
             assignments_passed = AssignmentUpload.objects.filter(lesson__course=course_profile, deadline__lt=today)
+            message = f"@{request.user.userinfo.display_name} has enrolled into your {course_profile.course_name} course!"
 
             with transaction.atomic():
+                # new enrollment instance created
+                CourseEnrollments.objects.create(course=course_profile,
+                                                 student=request.user,
+                                                 enrollment_status="enrolled")
+
                 # create submissions for assignments that are due (without submission status)
                 AssignmentSubmission.objects.bulk_create([
                     AssignmentSubmission(
@@ -301,40 +324,47 @@ def view_course_detail(request):
                     )
                     for assignment in assignments_passed
                 ])
-            
-            # sends in-app notification to teacher about new enrollment
-            message = f"@{request.user.userinfo.display_name} has enrolled into your {course_profile.course_name} course!"
-            Notification.objects.create(user=course_profile.teacher,
-                                        message=message,
-                                        notif_type="enrollment"
-                                        )
-            
-            # uncomment to send email notification to teacher
-            # if course_profile.teacher.userinfo.email_alert:
-            #     async_send_email.delay(course_profile.teacher.userinfo.email, f"New Enrollment in {course_profile.course_name}", message)
+
+                # store the student's starting progress
+                record_enrollment(request.user, course_profile)
+
+                # sends in-app notification and email alert to teacher about new enrollment
+                Notification.objects.create(user=course_profile.teacher,
+                                            message=message,
+                                            notif_type="enrollment"
+                                            )
+                queue_email_alert(course_profile.teacher_id, f"New Enrollment in {course_profile.course_name}", message)
+
+            # bulk_create does not send signals, so the homepage cache is invalidated here
+            invalidate_homepage(request.user.id)
+            index_course_deadlines(request.user.id, course_profile.course_id)
             
             return redirect(f"/student/courses/?course_id={course_id}")
         
         # if student clicks on discontinue course
         elif action_type == 'Discontinue Course':
             CourseEnrollments.objects.filter(student=request.user, course=course_profile).update(enrollment_status="unenrolled")
+            invalidate_homepage(request.user.id)
+            unindex_course_deadlines(request.user.id, course_profile.course_id)
             return redirect(f"/student/courses/?course_id={course_id}")
         
         # if student clicks on continue course
         elif action_type == 'Continue Course':
             CourseEnrollments.objects.filter(student=request.user, course=course_profile).update(enrollment_status="enrolled")
+            invalidate_homepage(request.user.id)
+            index_course_deadlines(request.user.id, course_profile.course_id)
             return redirect(f"/student/courses/?course_id={course_id}")
         
         # if student submits an assignment
         elif action_type == 'upload' or action_type == 'reupload':
             # check if assignment exists
             try:
-                assignment = AssignmentUpload.objects.filter(assign_id=request.POST.get('assignment_id')).first()
+                assignment = AssignmentUpload.objects.with_status().filter(assign_id=request.POST.get('assignment_id')).first()
             except:
                 return HttpResponse("Assignment not found", status=404)
             
             # check that deadline is in the future
-            if assignment.deadline < timezone.now():
+            if not assignment.is_open:
                     return HttpResponse("Deadline has passed.")
             
             # get submission instance
@@ -343,9 +373,14 @@ def view_course_detail(request):
             # if its first submission
             if action_type == "upload" and 'upload_file' in request.FILES:
                     if submission:
+                        first_submission = submission.submission_status != "submitted"
                         submission.upload_file = request.FILES['upload_file']
                         submission.submission_status = "submitted"
-                        submission.save()
+
+                        with transaction.atomic():
+                            submission.save()
+                            if first_submission:
+                                record_submission(request.user, course_profile.course_id)
             
             # if re-submitting
             elif action_type == "reupload" and 'reupload_file' in request.FILES:
@@ -359,22 +394,31 @@ def view_course_detail(request):
                                                               "enroll_status": enroll_status,
                                                               "lessons": lessons,
                                                               "form": form,
-                                                              "feedbacks": feedbacks,
-                                                              "user_submissions": user_submissions})
+                                                              "feedbacks": forum_page.items,
+                                                              # older posts can only be loaded by the course's students
+                                                              "forum_next_cursor": forum_page.next_cursor if enroll_status in COURSE_MEMBER_STATUSES else None,
+                                                              "user_submissions": user_submissions,
+                                                              "open_assignment_ids": open_assignment_ids})
 
 @student_login
 def student_notifications(request):
-    # get all notifications for logged-in student
-    # ordered by newest first for display
-    notifications = Notification.objects.filter(user = request.user).order_by('-created_at')
-    
-    forum = notifications.filter(notif_type="forum")  # forum notifications
-    materials = notifications.filter(notif_type="materials")  # new course materials notifications
-    e_meetings = notifications.filter(notif_type="qna")  # QnA or e-meeting notifications
+    # marks all notifications as read
+    if request.method == 'POST' and request.POST.get('action') == 'Mark all as read':
+        mark_all_read(request.user)
+        return redirect('student-notifications')
 
-    return render(request, "webapp/s_notificationspage.html", {"forum": forum,
-                                                               "materials": materials,
-                                                               "e_meetings": e_meetings})
+    # tabs: forum replies, new course materials, and QnA or e-meeting updates
+    tabs = [("forum", "Forum Replies"), ("materials", "Materials"), ("qna", "E-meeting Updates")]
+    tab = request.GET.get('tab') if request.GET.get('tab') in dict(tabs) else "forum"
+
+    # get a page of the selected tab's notifications for logged-in student, with the events of their large courses
+    # ordered by newest first for display, with unread ones marked as new
+    page = paginate_notifications(request, request.user, tab, get_watermark(request.user))
+
+    return render(request, "webapp/s_notificationspage.html", {"tabs": tabs,
+                                                               "tab": tab,
+                                                               "notifications": page.items,
+                                                               "page": page})
 
 @student_login
 def student_profile(request):
@@ -436,14 +480,20 @@ def student_view_my_courses(request):
         # handling the respective course actions
         if action == 'Continue Course':
             CourseEnrollments.objects.filter(student=student_profile, course=course_id).update(enrollment_status="enrolled")
+            invalidate_homepage(student_profile.id)
+            index_course_deadlines(student_profile.id, course_id)
             return redirect('student-profile-courses')
 
         elif action == 'Discontinue Course':
             CourseEnrollments.objects.filter(student=student_profile, course=course_id).update(enrollment_status="unenrolled")
+            invalidate_homepage(student_profile.id)
+            unindex_course_deadlines(student_profile.id, course_id)
             return redirect('student-profile-courses')
 
         elif action == 'Remove Course':
             CourseEnrollments.objects.filter(student=student_profile, course=course_id).delete()
+            record_unenrollment(student_profile, course_id)
+            unindex_course_deadlines(student_profile.id, course_id)
             return redirect('student-profile-courses')
     
     # retrieve all courses the student is enrolled in
@@ -472,10 +522,7 @@ def student_request_meeting(request):
                 message = message,
                 notif_type = "qna"
             )
-
-            # uncomment to enable email alerts for teachers who have them enabled
-            # if teacher.userinfo.email_alert:
-            #         async_send_email.delay(teacher.userinfo.email, "New E-Meeting Request", message)
+            queue_email_alert(meeting_request.teacher_id, "New E-Meeting Request", message)
 
             messages.success(request, "Request sent successfully!")
             return redirect("student-request-meeting") # redirect to prevent duplicate form submission
@@ -487,13 +534,16 @@ def student_request_meeting(request):
     req = RequestMeeting.objects.filter(student=student_profile)
 
     # filter accepted meeting requests, prioritse open meetings and order by meeting with latest datetime
-    accepted_requests = req.filter(status="accepted").order_by(Case(
-        When(meeting_details__meeting_status="open", then=Value(0)),
+    # (meeting status is computed from the meeting times when the query runs)
+    accepted_requests = req.filter(status="accepted").alias(
+        current_meeting_status=meeting_status_expression('meeting_details__')
+    ).order_by(Case(
+        When(current_meeting_status="open", then=Value(0)),
         default=Value(1),
         output_field=IntegerField(),
     ),
     '-meeting_details__start_datetime'
-    )
+    ).prefetch_related(Prefetch('meeting_details', queryset=MeetingDetails.objects.with_status()))
 
     pending_requests = req.filter(status="pending") # get pending meeting requests
     declined_requests = req.filter(status="declined") # get declined meeting requests
@@ -568,41 +618,91 @@ def teacher_view_course(request):
     course_details = CourseDetails.objects.get(course_id=request.session.get('course_id')) # get course details
     form = AddFeedbackForm()
 
-    lessons = LessonDetails.objects.filter(course=course_details)  # get all lessons under this course
-    feedbacks = FeedbackForum.objects.filter(course=course_details).order_by('-created_at') # get all feedback under this course
+    lessons = get_course_outline(course_details.course_id)  # get all lessons under this course (from the cached course outline)
+    # get the newest feedback under this course (older posts are loaded by the page from course_forum)
+    forum_page = get_forum_page(request, course_details.course_id)
 
     if request.method == 'POST':
         action = request.POST.get('action')
 
         # if action is 'Post!'
         if action == "Post!":
-            # save feedback to db
-            FeedbackForum.objects.create(
-                feedback=request.POST.get('feedback'),
-                user=request.user,
-                course=course_details
-            )
-
-            # send in-app notification to all enrolled students
             message = f"Teacher @{request.user.userinfo.display_name} posted a comment in their {course_details.course_name} course."
-            enrolled_students = CourseEnrollments.objects.filter(course=course_details)#.values_list('student', flat=True)
-
-            notifications = []
-            for student in enrolled_students:
-                notifications.append(Notification(user=student.student, message=message, notif_type='forum'))
-
-                # uncomment to send email notification to students
-                # if student.student.userinfo.email_alert:
-                #         async_send_email.delay(student.student.userinfo.email, "New Course Comment", message)
 
-            Notification.objects.bulk_create(notifications)
+            # the post, notifications and email alerts are saved together
+            with transaction.atomic():
+                # save feedback to db
+                FeedbackForum.objects.create(
+                    feedback=request.POST.get('feedback'),
+                    user=request.user,
+                    course=course_details
+                )
+
+                # send in-app notification to all enrolled students (created by a background task once the post is saved)
+                # and an email alert to those who have them on
+                enqueue_course_notification(course_details.course_id, message, 'forum')
+                queue_email_alerts(course_student_ids(course_details.course_id), "New Course Comment", message)
             return redirect('teacher-view-course')
             
+    # progress of the assignments whose submission rows are still being created in the background
+    assignment_names = {a['assign_id']: a['name'] for lesson in lessons for a in lesson['assignments']}
+    submission_jobs = []
+    for assign_id in request.session.get('submission_jobs', []):
+        progress = get_submission_progress(assign_id)
+        if progress is not None and not progress['done'] and assign_id in assignment_names:
+            submission_jobs.append({"assign_id": assign_id, "name": assignment_names[assign_id], **progress})
+    if len(submission_jobs) != len(request.session.get('submission_jobs', [])):
+        request.session['submission_jobs'] = [job['assign_id'] for job in submission_jobs]
+
     return render(request, "webapp/t_viewcourse.html", {"course_details": course_details,
                                                         "lessons": lessons,
-                                                        "feedbacks": feedbacks,
+                                                        "feedbacks": forum_page.items,
+                                                        "forum_next_cursor": forum_page.next_cursor,
+                                                        "submission_jobs": submission_jobs,
                                                         "form": form})
 
+@teacher_login
+def teacher_submission_progress(request):
+    # progress of an assignment's submission rows being created, polled by the course page
+    # only the teacher of the assignment's course can see it (others get a 404, as for a deleted assignment)
+    try:
+        assign_id = int(request.GET.get('assign_id'))
+    except (TypeError, ValueError):
+        return HttpResponse("Assignment not found", status=404)
+    if not AssignmentUpload.objects.filter(assign_id=assign_id, lesson__course__teacher=request.user).exists():
+        return HttpResponse("Assignment not found", status=404)
+
+    return JsonResponse(get_submission_progress(assign_id) or {"done": True})
+
+# get a page of a course's feedback forum, newest posts first (after the request's 'cursor' parameter)
+# with each post's author and their info loaded in the same query
+def get_forum_page(request, course_id):
+    feedbacks = FeedbackForum.objects.filter(course_id=course_id).select_related('user__userinfo')
+    return keyset_paginate(request, feedbacks, [('created_at', True), ('feedback_id', True)], settings.FORUM_PAGE_SIZE)
+
+# whether a user can read the older posts of a course's forum:
+# its teacher, or a student who can see its content (see COURSE_MEMBER_STATUSES)
+def can_read_forum(user, course):
+    if user.userinfo.user_type == 'teacher':
+        return course.teacher_id == user.id
+    return course_enrollments(course.course_id).filter(student=user).exists()
+
+@any_user_login
+def course_forum(request):
+    # older posts of a course's feedback forum, loaded by the course pages
+    try:
+        course_details = CourseDetails.objects.get(course_id=request.GET.get('course_id'))
+    except (CourseDetails.DoesNotExist, ValueError):
+        return HttpResponse("Course not found", status=404)
+
+    # only the course's teacher and its students (as on the course pages) can read it
+    if not can_read_forum(request.user, course_details):
+        return HttpResponseForbidden("You are not authorized to view this page.")
+
+    forum_page = get_forum_page(request, course_details.course_id)
+    return JsonResponse({'html': render_to_string("webapp/forum_posts.html", {"feedbacks": forum_page.items}),
+                         'next_cursor': forum_page.next_cursor})
+
 @teacher_login
 def teacher_add_course_items(request):
     # get current course's details
@@ -636,21 +736,15 @@ def teacher_add_course_items(request):
             material_form.instance.lesson = lesson_instance
 
             if material_form.is_valid():
-                material_form.save()
-
-                # notify all students enrolled in the course
                 message = f"New materials have been added to the course {course_details.course_name}"
-                enrolled_students = CourseEnrollments.objects.filter(course=course_details)
 
-                notifications = []
-                for student in enrolled_students:
-                    notifications.append(Notification(user=student.student, message=message, notif_type='materials'))
+                with transaction.atomic():
+                    material_form.save()
 
-                    # Uncomment to send email notifications to students
-                    # if student.student.userinfo.email_alert:
-                    #         async_send_email.delay(student.student.userinfo.email, f"New Material added to {course_details.course_name}", message)
-
-                Notification.objects.bulk_create(notifications)
+                    # notify all students enrolled in the course (created by a background task once the material is saved)
+                    # and send an email alert to those who have them on
+                    enqueue_course_notification(course_details.course_id, message, 'materials')
+                    queue_email_alerts(course_student_ids(course_details.course_id), f"New Material added to {course_details.course_name}", message)
 
                 return redirect('teacher-view-course')
         
@@ -670,17 +764,28 @@ def teacher_add_course_items(request):
             assignment_form.instance.deadline = deadline
 
             if assignment_form.is_valid():
-                # save assignment instance to db
-                assignment = assignment_form.save()
-
-                # create assignment submission instances for all students in the course
-                # submission_status's default is 'due'
-                enrolments = CourseEnrollments.objects.filter(course = course_details)
-                for student in enrolments:
-                    AssignmentSubmission.objects.create(
-                        assignment = assignment,
-                        student = student.student
-                    )
+                with transaction.atomic():
+                    # save assignment instance to db
+                    assignment = assignment_form.save()
+
+                    # create assignment submission instances for all students in the course
+                    # submission_status's default is 'due'
+                    # (by a background task for large courses, whose progress is shown on the course page)
+                    student_count = count_course_students(assignment)
+                    in_background = student_count > settings.SUBMISSION_TASK_THRESHOLD
+                    if in_background:
+                        enqueue_assignment_submissions(assignment, student_count)
+                    else:
+                        create_assignment_submissions(assignment)
+
+                    # add the assignment to every student's progress total
+                    record_assignment_added(course_id)
+
+                if in_background:
+                    request.session['submission_jobs'] = request.session.get('submission_jobs', []) + [assignment.assign_id]
+
+                invalidate_next_transition() # new deadline for the status checks
+                index_assignment(assignment) # add to the enrolled students' upcoming deadlines
 
                 return redirect('teacher-view-course')
 
@@ -692,13 +797,23 @@ def teacher_add_course_items(request):
 @teacher_login
 def get_materials(request, lesson_id):
     # fetch materials related to the selected lesson
-    materials = MaterialUpload.objects.filter(lesson_id=lesson_id).values('material_id', 'name')
+    # (from the cached outline of the current course, or the database for lessons of other courses)
+    lesson = get_outline_lesson(request.session.get('course_id'), lesson_id)
+    if lesson is not None:
+        materials = [{'material_id': m['material_id'], 'name': m['name']} for m in lesson['materials']]
+    else:
+        materials = MaterialUpload.objects.filter(lesson_id=lesson_id).values('material_id', 'name')
     return JsonResponse({'materials': list(materials)})
 
 @teacher_login
 def get_assignments(request, lesson_id):
     # fetch assignments related to the selected lesson
-    assignments = AssignmentUpload.objects.filter(lesson_id=lesson_id).values('assign_id', 'name')
+    # (from the cached outline of the current course, or the database for lessons of other courses)
+    lesson = get_outline_lesson(request.session.get('course_id'), lesson_id)
+    if lesson is not None:
+        assignments = [{'assign_id': a['assign_id'], 'name': a['name']} for a in lesson['assignments']]
+    else:
+        assignments = AssignmentUpload.objects.filter(lesson_id=lesson_id).values('assign_id', 'name')
     return JsonResponse({'assignments': list(assignments)})
 
 @teacher_login
@@ -717,7 +832,9 @@ def teacher_delete_course_items(request):
         # deletes entire lesson (and associated materials and assignment)
         if action == 'Delete Lesson':
             try:
-                LessonDetails.objects.get(lesson_id=request.POST.get('lesson_title')).delete()
+                with transaction.atomic():
+                    LessonDetails.objects.get(lesson_id=request.POST.get('lesson_title')).delete()
+                    rebuild_course_progress([course_id]) # recount progress without the lesson's assignments
                 return redirect('teacher-view-course')
             
             except LessonDetails.DoesNotExist:
@@ -735,7 +852,9 @@ def teacher_delete_course_items(request):
         # deltes assignment
         elif action == 'Delete Assignment':
             try:
-                AssignmentUpload.objects.get(assign_id=request.POST.get('name')).delete()
+                with transaction.atomic():
+                    AssignmentUpload.objects.get(assign_id=request.POST.get('name')).delete()
+                    rebuild_course_progress([course_id]) # recount progress without the assignment
                 return redirect('teacher-view-course')
 
             except AssignmentUpload.DoesNotExist:
@@ -767,31 +886,24 @@ def teacher_view_enrolments(request):
     course_id = request.session.get('course_id')
     course_details = CourseDetails.objects.get(course_id=course_id)
 
-    # get all enrollments
-    enrolments = CourseEnrollments.objects.filter(course_id=course_id)
+    # get all enrollments (with student info loaded in the same query)
+    enrolments = CourseEnrollments.objects.filter(course_id=course_id).select_related('student__userinfo')
 
-    # get all assignments and its count relating to this course
-    lessons = LessonDetails.objects.filter(course_id=course_id)
-    assignments = AssignmentUpload.objects.filter(lesson__in=lessons)
-    total_assignments = assignments.count()
+    # gets the stored progress of every student in the course in one lookup
+    course_progress = get_course_progress(course_id, [enrolment.student_id for enrolment in enrolments])
 
     progress_data = {}
 
     # gets enrollment and progress data of each student
     for enrolment in enrolments:
         student = enrolment.student
-        submitted_count = AssignmentSubmission.objects.filter(
-            assignment__in=assignments, student=student, submission_status="submitted"
-        ).count()
-
-        # progress is calculated by getting percentage of assignments submitted
-        progress = (submitted_count / total_assignments) * 100 if total_assignments > 0 else 0
+        progress = course_progress[student.id]
 
         progress_data[student.id] = {
             "student": student,
-            "submitted": submitted_count,
-            "total": total_assignments,
-            "progress": progress,
+            "submitted": progress.submitted,
+            "total": progress.total,
+            "progress": progress.progress,
             "enrol_date": enrolment.created_at,
             "status": enrolment.enrollment_status
         }
@@ -804,11 +916,15 @@ def teacher_view_enrolments(request):
         if action == "REMOVE":
             # updates enrollment status to "removed"
             CourseEnrollments.objects.filter(student=student, course_id=course_id).update(enrollment_status='removed')
+            invalidate_homepage(student)
+            unindex_course_deadlines(student, course_id)
 
         # if action is ADD BACK
         elif action == "ADD BACK":
             # updates enrollment status to "enrolled"
             CourseEnrollments.objects.filter(student=student, course_id=course_id).update(enrollment_status='enrolled')
+            invalidate_homepage(student)
+            index_course_deadlines(student, course_id)
         
         redirect('teacher-view-enrolments')
 
@@ -817,17 +933,22 @@ def teacher_view_enrolments(request):
 
 @teacher_login
 def teacher_notifications(request):
-    # get all notifications associated with teacher
-    # group according to notification type
-    notifications = Notification.objects.filter(user=request.user).order_by('-created_at')
-    
-    forum_notif = notifications.filter(notif_type='forum')
-    enrol_notif = notifications.filter(notif_type='enrollment')
-    qna_notif = notifications.filter(notif_type='qna')
+    # marks all notifications as read
+    if request.method == 'POST' and request.POST.get('action') == 'Mark all as read':
+        mark_all_read(request.user)
+        return redirect('teacher-notifications')
+
+    # tabs: enrolments, forum replies, and QnA or e-meeting updates
+    tabs = [("enrollment", "Enrolments"), ("forum", "Forum Replies"), ("qna", "E-meeting Updates")]
+    tab = request.GET.get('tab') if request.GET.get('tab') in dict(tabs) else "enrollment"
 
-    return render(request, 'webapp/t_notificationspage.html', {"forum_notif": forum_notif,
-                                                               "enrol_notif": enrol_notif,
-                                                               "qna_notif": qna_notif})
+    # get a page of the selected tab's notifications associated with teacher, newest first
+    page = paginate_notifications(request, request.user, tab)
+
+    return render(request, 'webapp/t_notificationspage.html', {"tabs": tabs,
+                                                               "tab": tab,
+                                                               "notifications": page.items,
+                                                               "page": page})
 
 @teacher_login
 def teacher_search_person(request):
@@ -846,18 +967,11 @@ def teacher_search_person(request):
 
             # get relevant matches
             if name or type:
-                query = Q()
-
                 if name:
-                    query &= (Q(first_name__icontains=name) |
-                            Q(middle_name__icontains=name) |
-                            Q(last_name__icontains=name) | 
-                            Q(display_name__icontains=name))
+                    people = search_people(people, name) # narrowed down using the name index
                 
                 if type and type.lower() != "all": # skip user_type filtering if 'All' is selected
-                    query &= Q(user_type=type)
-                
-                people = people.filter(query)
+                    people = people.filter(user_type=type)
 
             else:
                 people = people.none()
@@ -866,9 +980,26 @@ def teacher_search_person(request):
         elif action_type == 'Clear Filters':
             form = SearchPeopleForm()
             
+    # get the requested page of people, and the (cached) count of all matches
+    page = keyset_paginate(request, people, [('id', False)])
     return render(request, "webapp/t_searchpage.html", {"form": form,
-                                                        "people": people,
-                                                        "matches": len(people)})
+                                                        "people": page.items,
+                                                        "page": page,
+                                                        "matches": cached_count(people)})
+
+@teacher_login
+def teacher_search_autocomplete(request):
+    # get the top matches for the name typed so far (optionally of one user type)
+    query = request.GET.get('q', '')
+    user_type = request.GET.get('type', '').lower()
+    people = autocomplete_people(query, user_type if user_type in ('student', 'teacher') else None,
+                                 limit=settings.AUTOCOMPLETE_LIMIT)
+
+    return JsonResponse({'people': [{'id': person.id,
+                                     'name': " ".join(filter(None, [person.first_name, person.middle_name, person.last_name])),
+                                     'display_name': person.display_name,
+                                     'user_type': person.user_type}
+                                    for person in people]})
 
 @teacher_login
 def teacher_profile(request):
@@ -917,13 +1048,16 @@ def teacher_manage_meetings(request):
 
     # get all meeting info and group by accepted & pending e-meets
     meetings = RequestMeeting.objects.filter(teacher=teacher_profile)
-    accepted = meetings.filter(status="accepted").order_by(
-        Case(When(meeting_details__meeting_status="open", then=Value(0)),
+    # (meeting status is computed from the meeting times when the query runs)
+    accepted = meetings.filter(status="accepted").alias(
+        current_meeting_status=meeting_status_expression('meeting_details__')
+    ).order_by(
+        Case(When(current_meeting_status="open", then=Value(0)),
              default=Value(1),
              output_field=IntegerField(),
              ),
         '-meeting_details__start_datetime'
-    )
+    ).prefetch_related(Prefetch('meeting_details', queryset=MeetingDetails.objects.with_status()))
     pending = meetings.filter(status="pending")
 
     # default forms for each e-meeting request (will be replaced if there's a POST error)
@@ -941,27 +1075,33 @@ def teacher_manage_meetings(request):
             if action_type == "Accept":
                 accept_form = AcceptMeetingReq(request.POST)
                 if accept_form.is_valid():
-                    # update e-meet instance
-                    meeting_request.status = "accepted"
-                    meeting_request.save()
-
-                    # save a new e-meeting instance to db
-                    meeting_details = accept_form.save(commit=False)
-                    meeting_details.request = meeting_request
-                    meeting_details.generate_password()
-                    meeting_details.save()
-
-                    message = f"Your meeting request with Teacher {meeting_details.request.teacher.userinfo.display_name} has been accepted. The scheduled date and time is: {meeting_details.start_datetime}"
-
-                    Notification.objects.create(
-                        user=meeting_request.student,
-                        message=message,
-                        notif_type="qna"
-                    )
+                    # the meeting, notification and email are saved together
+                    with transaction.atomic():
+                        # update e-meet instance
+                        meeting_request.status = "accepted"
+                        meeting_request.save()
+
+                        # save a new e-meeting instance to db
+                        meeting_details = accept_form.save(commit=False)
+                        meeting_details.request = meeting_request
+                        meeting_details.generate_password()
+                        meeting_details.save()
+
+                        # open and expire the meeting at its exact start and end times
+                        transaction.on_commit(lambda: schedule_meeting_status_tasks(meeting_details))
+
+                        message = f"Your meeting request with Teacher {meeting_details.request.teacher.userinfo.display_name} has been accepted. The scheduled date and time is: {meeting_details.start_datetime}"
 
-                    # Uncomment to send email alerts
-                    # if meeting_request.student.userinfo.email_alert:
-                    #     async_send_email.delay(meeting_request.student.userinfo.email, "E-Meeting Request Accepted", message)
+                        Notification.objects.create(
+                            user=meeting_request.student,
+                            message=message,
+                            notif_type="qna"
+                        )
+
+                        # emailed straight away rather than in the student's next digest
+                        queue_emails([meeting_request.student_id], "E-Meeting Request Accepted", escape(message))
+
+                    invalidate_next_transition() # new meeting times for the status checks
 
                     return redirect('teacher-manage-meetings')
                 
@@ -972,21 +1112,19 @@ def teacher_manage_meetings(request):
             elif action_type == "Decline":
                 decline_form = DeclineMeetingReq(request.POST)
                 if decline_form.is_valid():
-                    meeting_request.status = "declined"
-                    meeting_request.status_desc = decline_form.cleaned_data['description']
-                    meeting_request.save()
+                    message = f"Your meeting request has been declined: {decline_form.cleaned_data['description']}"
 
-                    message = f"Your meeting request has been declined: {meeting_request.status_desc}"
-
-                    Notification.objects.create(
-                        user=meeting_request.student,
-                        message=message,
-                        notif_type="qna"
-                    )
+                    with transaction.atomic():
+                        meeting_request.status = "declined"
+                        meeting_request.status_desc = decline_form.cleaned_data['description']
+                        meeting_request.save()
 
-                    # Uncomment to send email alerts
-                    # if meeting_request.student.userinfo.email_alert:
-                    #     async_send_email.delay(meeting_request.student.userinfo.email, "E-Meeting Request Accepted", message)
+                        Notification.objects.create(
+                            user=meeting_request.student,
+                            message=message,
+                            notif_type="qna"
+                        )
+                        queue_emails([meeting_request.student_id], "E-Meeting Request Declined", escape(message))
 
                     return redirect('teacher-manage-meetings')
                 
@@ -1005,11 +1143,11 @@ def teacher_manage_meetings(request):
 def chat_meeting(request):
     user = request.user # gets user's info (student or teacher)
     meeting_id = request.GET.get('meeting_id')
-    meeting_details = MeetingDetails.objects.get(meeting_id=meeting_id)
+    meeting_details = MeetingDetails.objects.with_status().get(meeting_id=meeting_id)
     is_authenticated = False
 
     # prevents login if meeting status is expired
-    if meeting_details.meeting_status == "expired":
+    if meeting_details.effective_status == "expired":
         return HttpResponse("This meeting has expired.")
 
     if request.method == "POST":
@@ -1023,7 +1161,9 @@ def chat_meeting(request):
                 {"type": "meeting_ended"}
             )
 
-            meeting_details.meeting_status = 'expired' # meeting status updated to 'expired'
+            # meeting status updated to 'expired'
+            # (the scheduled open/expire tasks leave expired meetings untouched)
+            meeting_details.meeting_status = 'expired'
             meeting_details.save()
 
         # checks password to allow/deny entry